@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from excel_modifier_simple import modify_excel_file
+
+"""
+
+批量处理（命令行，无界面）
+对一个目录或清单中的所有已填好的模板运行 modify_excel_file，多进程并行，
+每个任务在独立的临时目录中生成，成功后才移动到输出位置，最后写出每个文件的状态和耗时汇总
+
+用法:
+    python batch_process.py 项目目录 -o 输出目录 -j 8
+    python batch_process.py 清单.json -o 输出目录 --summary 汇总.json
+
+清单格式:
+    JSON: ["a.xlsm", {"input": "b.xlsm", "output": "输出/b_结果.xlsm"}, ...]
+    其他文本文件: 每行一个输入文件路径
+
+"""
+
+EXCEL_EXTENSIONS = (".xlsm", ".xlsx")
+OUTPUT_SUFFIX = "_处理结果"
+
+
+def default_output_path(input_path, output_dir):
+    """与界面默认的输出文件名一致：原文件名_处理结果.xlsm"""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{base_name}{OUTPUT_SUFFIX}.xlsm")
+
+
+def collect_jobs(source, output_dir=None):
+    """
+    把目录或清单展开成任务列表 [(输入路径, 输出路径), ...]
+    目录：处理其中（不含子目录）的 .xlsm/.xlsx，跳过 Excel 临时文件和已经生成的结果文件
+    清单中的相对路径相对清单所在目录
+    """
+    if os.path.isdir(source):
+        output_dir = output_dir or source
+        names = sorted(
+            name for name in os.listdir(source)
+            if name.lower().endswith(EXCEL_EXTENSIONS)
+            and not name.startswith("~$")
+            and not os.path.splitext(name)[0].endswith(OUTPUT_SUFFIX)
+        )
+        return [(os.path.join(source, name), default_output_path(name, output_dir)) for name in names]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    output_dir = output_dir or base_dir
+    if source.lower().endswith(".json"):
+        with open(source, encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        with open(source, encoding="utf-8") as f:
+            entries = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+    jobs = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            input_path = os.path.join(base_dir, entry["input"])
+            output_path = entry.get("output")
+            output_path = os.path.join(base_dir, output_path) if output_path else default_output_path(input_path, output_dir)
+        else:
+            input_path = os.path.join(base_dir, entry)
+            output_path = default_output_path(input_path, output_dir)
+        jobs.append((input_path, output_path))
+    return jobs
+
+
+def process_one(input_path, output_path, overwrite=False, quiet=False, use_snapshot=False, use_plan_cache=False):
+    """
+    处理单个文件：在独立的临时目录中生成，成功后移动到 output_path
+    quiet 为 True 时不输出各生成步骤的打印信息（多个进程的输出会交错在一起）
+    use_snapshot 为 True 时使用输入文件的解析快照（见 template_snapshot）
+    use_plan_cache 为 True 时结构相同的项目直接套用缓存的写入计划（见 plan_cache）
+    返回 {"input", "output", "status", "message", "seconds"}
+    """
+    start = time.time()
+    result = {"input": input_path, "output": output_path, "status": "failed", "message": "", "seconds": 0.0}
+    work_dir = None
+    try:
+        if not os.path.exists(input_path):
+            result["message"] = "输入文件不存在"
+            return result
+        if os.path.exists(output_path) and not overwrite:
+            result["status"] = "skipped"
+            result["message"] = "输出文件已存在"
+            return result
+
+        work_dir = tempfile.mkdtemp(prefix="batch_")
+        temp_output = os.path.join(work_dir, os.path.basename(output_path))
+        with open(os.devnull, "w", encoding="utf-8") as devnull, \
+                (contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext()):
+            success, message = modify_excel_file(input_path, temp_output, use_snapshot=use_snapshot,
+                                                 use_plan_cache=use_plan_cache)
+        result["message"] = message
+        if success:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            shutil.move(temp_output, output_path)
+            result["status"] = "ok"
+            result["message"] = f"处理完成，文件已保存至: {output_path}"
+    except Exception as e:
+        result["message"] = f"处理过程中发生错误: {str(e)}"
+    except SystemExit as e:
+        # 生成步骤中调用 exit() 不能结束整个批量任务，记为该文件失败
+        result["message"] = f"处理过程中退出: {e.code!r}"
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        result["seconds"] = round(time.time() - start, 3)
+    return result
+
+
+def run_batch(jobs, processes=None, overwrite=False, summary_path=None, quiet=False, use_snapshot=False,
+              use_plan_cache=False):
+    """
+    用进程池处理全部任务，返回汇总 {"started", "seconds", "total", "ok", "failed", "skipped", "jobs"}
+    summary_path 不为空时同时写出汇总 JSON
+    """
+    started = datetime.now()
+    start = time.time()
+    results = [None] * len(jobs)
+    print(f"共 {len(jobs)} 个文件，进程数: {processes or os.cpu_count()}")
+
+    # 每个进程处理一个文件后重启，避免各模块的缓存在长时间批量运行中累积
+    with ProcessPoolExecutor(max_workers=processes, max_tasks_per_child=1) as executor:
+        futures = {executor.submit(process_one, input_path, output_path, overwrite, quiet, use_snapshot,
+                                   use_plan_cache): index
+                   for index, (input_path, output_path) in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                result = future.result()
+            except (Exception, SystemExit) as e:
+                # 子进程异常退出（如内存不足）
+                input_path, output_path = jobs[index]
+                result = {"input": input_path, "output": output_path, "status": "failed",
+                          "message": f"进程异常退出: {str(e)}", "seconds": 0.0}
+            results[index] = result
+            print(f"[{done}/{len(jobs)}] {result['status']} {result['seconds']:.1f}s {os.path.basename(result['input'])}"
+                  + ("" if result["status"] == "ok" else f" - {result['message']}"))
+
+    summary = {
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round(time.time() - start, 3),
+        "total": len(results),
+        "ok": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "jobs": results,
+    }
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"汇总已保存: {summary_path}")
+    print(f"批量处理完成：成功 {summary['ok']} 个，失败 {summary['failed']} 个，跳过 {summary['skipped']} 个，"
+          f"用时 {summary['seconds']:.1f}s")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量生成财务分析报表（不打开界面）")
+    parser.add_argument("source", help="模板所在目录，或清单文件（.json 或每行一个路径的文本文件）")
+    parser.add_argument("-o", "--output-dir", help="输出目录，默认与输入文件相同")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--summary", help="汇总 JSON 路径，默认 输出目录/batch_summary.json")
+    parser.add_argument("--overwrite", action="store_true", help="覆盖已存在的输出文件")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出每个文件的处理结果")
+    parser.add_argument("--snapshot", action="store_true", help="保存/使用输入文件的解析快照，重复处理同一批文件时加快加载")
+    parser.add_argument("--plan-cache", action="store_true",
+                        help="缓存写入计划，模板、借款结构和年份范围相同的项目直接套用，不再重新生成公式")
+    args = parser.parse_args(argv)
+
+    jobs = collect_jobs(args.source, args.output_dir)
+    if not jobs:
+        print("没有找到需要处理的文件")
+        return 1
+    summary_dir = args.output_dir or (args.source if os.path.isdir(args.source)
+                                      else os.path.dirname(os.path.abspath(args.source)))
+    summary_path = args.summary or os.path.join(summary_dir, "batch_summary.json")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    summary = run_batch(jobs, args.jobs, args.overwrite, summary_path, args.quiet, args.snapshot,
+                        args.plan_cache)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
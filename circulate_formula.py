@@ -1,27 +1,65 @@
 import os
-import re
-from openpyxl_vba import load_workbook
+from functools import lru_cache
+from string import Formatter
+from openpyxl_vba import load_workbook, save_workbook, mark_modified
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from formula_translator import parse_cell, shift_reference, shift_reference_series, translate_formula
 
 #  根据输入的excel表，选定数据来源表A、B、C等，通过公式计算例如：AxB+C，将公式写入目标sheet选定的位置
 
 class ExcelFormulaGenerator:
-    def __init__(self, data_file, output_file):
+    def __init__(self, data_file, output_file=None, verbose=False, autosave=None, sheet_map=None):
         """
-        :param data_file: 包含所有数据的工作簿路径
-        :param output_file: 输出文件路径（与输入文件相同）
+        :param data_file: 包含所有数据的工作簿路径，也可以是 WorkbookSession 或已加载的 Workbook
+        :param output_file: 输出文件路径（与输入文件相同）；为 None 时使用 data_file
+        :param verbose: 是否逐条打印写入的公式
+        :param autosave: generate_formulas 结束后是否立即保存；为 False 时由调用方统一调用 save()。
+                         默认有保存路径时保存，传入已加载的 Workbook 且没有 output_file 时不保存
+        :param sheet_map: {目标表名: (实际写入的表名, 行偏移)}；写到这些表的公式改为写进实际表中下移 行偏移 的位置，
+                          公式中的相对引用同样下移（与把整张表复制粘贴过去的结果相同）
         """
         self.data_file = data_file
-        self.output_file = output_file
+        self.verbose = verbose
+        self.sheet_map = sheet_map or {}
 
-        # 加载工作簿（保留公式）
-        self.wb = load_workbook(data_file)
-        print(f"工作簿加载成功! 工作表: {', '.join(self.wb.sheetnames)}")
+        if isinstance(data_file, Workbook):
+            self.output_file = output_file
+        else:
+            self.output_file = output_file if output_file is not None else data_file
+
+        self.autosave = autosave if autosave is not None else self.output_file is not None
+        if self.autosave and self.output_file is None:
+            # 在写入任何公式之前报错，不留下写了一半、又无法保存的工作簿
+            raise ValueError("autosave=True 时必须指定 output_file")
+
+        if isinstance(data_file, Workbook):
+            # 直接使用调用方已加载的工作簿，不再重新解析文件
+            self.wb = data_file
+        else:
+            # 加载工作簿（保留公式）
+            self.wb = load_workbook(data_file)
+            print(f"工作簿加载成功! 工作表: {', '.join(self.wb.sheetnames)}")
+
+    def save(self, output_file=None):
+        """保存工作簿（WorkbookSession 只记录修改，由会话统一保存）"""
+        output_file = output_file if output_file is not None else self.output_file
+        if output_file is None:
+            raise ValueError("未指定输出文件，无法保存工作簿")
+        save_workbook(self.wb, output_file)
+        print(f"公式已生成并保存到: {output_file}")
+        return output_file
 
     def get_formula_reference(self, sheet_name, cell_ref):
         """生成工作表单元格的引用公式"""
+        return self._sheet_prefix(sheet_name) + cell_ref
+
+    @staticmethod
+    def _sheet_prefix(sheet_name):
+        """工作表引用前缀（如 "'C.1项目融资信息'!"），本表引用时为空字符串"""
         # 如果 sheet_name 为空字符串，说明是本表引用
         if not sheet_name or sheet_name == "":
-            return cell_ref
+            return ""
 
         # 检查工作表名称是否包含需要引号包裹的特殊字符
         # 包括: 空格、中文、括号、连字符等
@@ -30,8 +68,8 @@ class ExcelFormulaGenerator:
         if needs_quotes:
             # 如果工作表名称中包含单引号，需要转义
             escaped_sheet_name = sheet_name.replace("'", "''")
-            return f"'{escaped_sheet_name}'!{cell_ref}"
-        return f"{sheet_name}!{cell_ref}"
+            return f"'{escaped_sheet_name}'!"
+        return f"{sheet_name}!"
 
     def shift_cell(self, cell_ref, col_shift=0, row_shift=0):
         """将单元格引用向右/向下移动指定位置，支持区域引用"""
@@ -47,107 +85,32 @@ class ExcelFormulaGenerator:
 
     def _shift_single_cell(self, cell_ref, col_shift, row_shift):
         """处理单个单元格的偏移，支持绝对地址（$）"""
-
-        # 判断是否包含绝对引用符号 $
-        col_abs = '$' in cell_ref and cell_ref.startswith('$')
-        row_abs = '$' in cell_ref and cell_ref.rfind('$') != 0
-
-        # 去掉 $ 后再处理
-        ref = cell_ref.replace('$', '')
-
-        # 解析列和行
-        col_part = re.match(r'[A-Z]+', ref).group()
-        row_part = re.search(r'\d+', ref).group()
-
-        # 转换列字母为数字
-        col_num = 0
-        for char in col_part:
-            col_num = col_num * 26 + (ord(char) - ord('A') + 1)
-
-        # # 如果不是绝对列，则偏移
-        # if not col_abs:
-        #     col_num += col_shift
-        #
-        # # 如果不是绝对行，则偏移
-        # if not row_abs:
-        #     new_row_num = int(row_part) + row_shift
-        # else:
-        #     new_row_num = int(row_part)
-
-        col_num += col_shift
-        new_row_num = int(row_part) + row_shift
-
-        # 将列数字转换回字母
-        new_col_ref = ""
-        while col_num > 0:
-            col_num, remainder = divmod(col_num - 1, 26)
-            new_col_ref = chr(65 + remainder) + new_col_ref
-
-        # 加回绝对引用符号
-        col_prefix = '$' if col_abs else ''
-        row_prefix = '$' if row_abs else ''
-
-        return f"{col_prefix}{new_col_ref}{row_prefix}{new_row_num}"
+        # 带 $ 的行/列也按偏移量移动（保留 $ 符号），解析结果有缓存，循环中不再重复解析
+        return shift_reference(cell_ref, row_shift, col_shift, shift_absolute=True)
 
     def generate_formulas(self, operations):
         """在同一个工作簿中生成Excel公式"""
         # 确保所有工作表都存在
         for op in operations:
             target_sheet_name = op['target']['sheet']
-            if target_sheet_name not in self.wb.sheetnames:
+            if target_sheet_name not in self.wb.sheetnames and target_sheet_name not in self.sheet_map:
                 print(f"创建新工作表: {target_sheet_name}")
                 self.wb.create_sheet(title=target_sheet_name)
 
         # 执行所有公式生成操作
         for op in operations:
             # 获取目标工作表
-            target_sheet = self.wb[op['target']['sheet']]
+            target_sheet_name, row_offset = self.sheet_map.get(op['target']['sheet'], (op['target']['sheet'], 0))
+            target_sheet = self.wb[target_sheet_name]
 
             # 处理循环操作
             if 'loop' in op:
-                loop_count = op['loop']['count']
-                for i in range(loop_count):
-                    # 准备公式参数
-                    param_refs = {}
-                    for param_name, param_def in op['params'].items():
-                        # 获取该参数的偏移设置
-                        param_offset = op['loop'].get('param_offsets', {}).get(param_name, {})
-                        col_shift = param_offset.get('col_shift', 0) * i
-                        row_shift = param_offset.get('row_shift', 0) * i
-
-                        # 应用偏移
-                        shifted_cell = self.shift_cell(
-                            param_def['cell'],
-                            col_shift=col_shift,
-                            row_shift=row_shift
-                        )
-                        # 生成参数引用
-                        param_refs[param_name] = self.get_formula_reference(
-                            param_def['sheet'],
-                            shifted_cell
-                        )
-
-                    # 获取目标单元格的偏移设置
-                    target_offset = op['loop'].get('target_offset', {})
-                    target_col_shift = target_offset.get('col_shift', 0) * i
-                    target_row_shift = target_offset.get('row_shift', 0) * i
-
-                    # 计算目标单元格位置
-                    target_cell = self.shift_cell(
-                        op['target']['cell'],
-                        col_shift=target_col_shift,
-                        row_shift=target_row_shift
-                    )
-
-                    # 生成Excel公式（支持内置函数）
-                    formula = self.generate_excel_formula(op, param_refs)
-
-                    # 写入公式
-                    target_sheet[target_cell] = formula
-                    print(f"写入公式: {target_sheet.title}[{target_cell}] {formula}")
+                self._expand_loop(op, target_sheet, row_offset)
             else:
                 # 非循环操作处理
                 target_cell = op['target']['cell']
+                if row_offset:
+                    target_cell = shift_reference(target_cell, row_offset, 0, shift_absolute=True)
 
                 # 准备公式参数
                 param_refs = {}
@@ -158,16 +121,82 @@ class ExcelFormulaGenerator:
                     )
 
                 # 生成Excel公式（支持内置函数）
-                formula = self.generate_excel_formula(op, param_refs)
+                formula = _offset_formula(self.generate_excel_formula(op, param_refs), row_offset)
 
                 # 写入公式
                 target_sheet[target_cell] = formula
-                print(f"写入公式: {target_sheet.title}[{target_cell}] = {formula}")
+                if self.verbose:
+                    print(f"写入公式: {target_sheet.title}[{target_cell}] = {formula}")
 
-        # 保存工作簿
-        self.wb.save(self.output_file)
-        print(f"公式已生成并保存到: {self.output_file}")
+        # 保存工作簿；不保存时记录会话中的工作表已改写
+        if self.autosave:
+            return self.save()
+        mark_modified(self.data_file)
         return self.output_file
+
+    def _expand_loop(self, op, target_sheet, row_offset=0):
+        """
+        展开循环操作：每个参数和目标单元格只解析一次，按循环次数预先算出全部偏移后的地址，
+        批量生成公式并写入目标工作表（row_offset 见 sheet_map）
+        """
+        loop = op['loop']
+        loop_count = loop['count']
+
+        # 参数地址序列（带 $ 的行/列同样按偏移量移动，与 shift_cell 一致）
+        param_series = {}
+        for param_name, param_def in op['params'].items():
+            # 获取该参数的偏移设置
+            param_offset = loop.get('param_offsets', {}).get(param_name, {})
+            prefix = self._sheet_prefix(param_def['sheet'])
+            param_series[param_name] = [
+                prefix + ref for ref in shift_reference_series(
+                    param_def['cell'],
+                    param_offset.get('row_shift', 0),
+                    param_offset.get('col_shift', 0),
+                    loop_count,
+                    shift_absolute=True
+                )
+            ]
+
+        # 批量生成公式（custom 模板预先拆分，只做字符串拼接）
+        param_names = list(param_series)
+        if param_names:
+            param_rows = [dict(zip(param_names, refs)) for refs in zip(*param_series.values())]
+        else:
+            param_rows = [{} for _ in range(loop_count)]
+        template = _compile_template(op['formula_template']) if op['operation'] == 'custom' else None
+        if template is not None:
+            formulas = [_render_template(template, param_refs) for param_refs in param_rows]
+        else:
+            formulas = [self.generate_excel_formula(op, param_refs) for param_refs in param_rows]
+        if row_offset:
+            formulas = [_offset_formula(formula, row_offset) for formula in formulas]
+
+        # 目标单元格的行号、列号序列，按行列号批量写入
+        target_offset = loop.get('target_offset', {})
+        target_row_shift = target_offset.get('row_shift', 0)
+        target_col_shift = target_offset.get('col_shift', 0)
+        target_cell = op['target']['cell']
+        if row_offset:
+            target_cell = shift_reference(target_cell, row_offset, 0, shift_absolute=True)
+        target = parse_cell(target_cell)
+        if target is not None:
+            for i, formula in enumerate(formulas):
+                row = max(1, target.row + target_row_shift * i)
+                col = max(1, target.col + target_col_shift * i)
+                target_sheet.cell(row=row, column=col).value = formula
+                if self.verbose:
+                    print(f"写入公式: {target_sheet.title}[{get_column_letter(col)}{row}] {formula}")
+        else:
+            # 区域等特殊目标地址按字符串写入
+            target_cells = shift_reference_series(
+                target_cell, target_row_shift, target_col_shift, loop_count, shift_absolute=True
+            )
+            for target_cell, formula in zip(target_cells, formulas):
+                target_sheet[target_cell] = formula
+                if self.verbose:
+                    print(f"写入公式: {target_sheet.title}[{target_cell}] {formula}")
+
     def generate_excel_formula(self, operation, param_refs):
         """根据操作类型生成Excel公式，支持内置函数"""
         op_type = operation['operation']
@@ -219,6 +248,37 @@ class ExcelFormulaGenerator:
             raise ValueError(f"未知的操作类型: {op_type}")
 
 
+def _offset_formula(formula, row_offset):
+    """公式整体下移 row_offset 行（带 $ 的行不变），不是公式时原样返回"""
+    if row_offset and isinstance(formula, str) and formula.startswith("="):
+        return translate_formula(formula, row_offset, 0)
+    return formula
+
+
+@lru_cache(maxsize=256)
+def _compile_template(formula_template):
+    """
+    把 custom 公式模板拆成 [(文字, 参数名), ...]，只解析一次；
+    模板中带格式说明或转换符（如 {x:>5}、{x!r}）时返回 None，交给 str.format 处理
+    """
+    template = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(formula_template):
+        if format_spec or conversion:
+            return None
+        template.append((literal, field_name))
+    return tuple(template)
+
+
+def _render_template(template, param_refs):
+    """按拆分好的模板拼接公式，结果与 formula_template.format(**param_refs) 相同"""
+    parts = []
+    for literal, field_name in template:
+        parts.append(literal)
+        if field_name is not None:
+            parts.append(param_refs[field_name])
+    return "".join(parts)
+
+
 # 使用示例 =============================================
 if __name__ == "__main__":
     # 初始化公式生成器（输入输出为同一个文件）
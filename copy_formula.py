@@ -3,11 +3,13 @@ import os
 import openpyxl
 from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.styles import PatternFill, Font, Border, Side, Alignment, Protection
-from findAndSet import find_cell, find_all_cells
+from findAndSet import find_cell, get_year_axis, update_year_axis, get_sheet_bounds
 from circulate_formula import ExcelFormulaGenerator
-from loan_assignment import down_n_cells, struct_years
+from formula_translator import translate_formula, to_r1c1, render_r1c1
+from loan_assignment import down_n_cells
 import datetime
-from openpyxl_vba import load_workbook
+from openpyxl_vba import load_workbook, save_workbook, mark_modified
+from table_spec import fill_table
 
 # ====================== 公式处理工具 ======================
 def column_to_index(col_letters):
@@ -51,92 +53,11 @@ def update_formula(formula: str, row_offset: int, col_offset: int,
       - 支持跨工作表（含中文、点号、空格）
       - 支持区域引用 A1:B2
       - 绝对引用 $A$1 保持不变
+      - 函数名（如 LOG10）和字符串常量中的内容不会被当作引用
+    公式的词法解析和平移结果都有缓存，同一个公式只解析一次
     """
-    # 改进的正则表达式：更精确地匹配工作表名
-    pattern = re.compile(
-        r"""
-        (?:  # 匹配工作表前缀（可选）
-            '([^']+)'  # 1. 带引号的工作表名（单引号内任何字符）
-            |           # 或
-            ([a-zA-Z\u4e00-\u9fa5][\w\u4e00-\u9fa5\.]*)  # 2. 不带引号的工作表名（字母/中文开头，可含点号）
-        )
-        !    # 工作表名后的感叹号
-        (    # 3. 单元格或区域引用
-            (\$?[A-Z]+\$?\d+)       # 起始单元格
-            (?:
-                :(\$?[A-Z]+\$?\d+)  # 区域结束单元格（可选）
-            )?
-        )
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
-    def shift(cell_ref: str) -> str:
-        """偏移单个单元格地址"""
-        parsed = parse_cell_reference(cell_ref)
-        if not parsed:
-            return cell_ref
-        r, c, r_abs, c_abs = parsed
-        new_r = (r if r_abs else r + row_offset)
-        new_c = (c if c_abs else c + col_offset)
-        return format_cell_reference(max(1, new_r), max(1, new_c), r_abs, c_abs)
-
-    def repl(match):
-        # 获取工作表名（带引号或不带引号的匹配组）
-        sheet_name = match.group(1) or match.group(2)
-        ref_full = match.group(3)  # 完整的引用部分
-        start_ref = match.group(4)  # 起始单元格
-        end_ref = match.group(5)  # 结束单元格（如果是区域）
-
-        # 处理单元格引用部分
-        if end_ref:  # 区域引用
-            new_start = shift(start_ref)
-            new_end = shift(end_ref)
-            new_ref = f"{new_start}:{new_end}"
-        else:  # 单格引用
-            new_ref = shift(start_ref)
-
-        # 重新组装引用（包含括号的工作表名也需要加单引号）
-        # 注意：无论是否有特殊字符，都使用单引号格式
-        return f"'{sheet_name}'!{new_ref}"
-
-    # 处理所有工作表引用格式
-    new_formula = pattern.sub(repl, formula)
-
-    # 处理当前工作表的引用（无工作表前缀）
-    current_sheet_pattern = re.compile(
-        r"""
-        (^|[(,=+*/-])  # 确保是公式中的独立引用（前面是运算符或开始）
-        (               # 单元格或区域引用
-            (\$?[A-Z]+\$?\d+)       # 起始单元格
-            (?:
-                :(\$?[A-Z]+\$?\d+)  # 区域结束单元格（可选）
-            )?
-        )
-        (?=[),+*/-]|$)  # 后面是运算符或结束
-        """,
-        re.IGNORECASE | re.VERBOSE,
-    )
-
-    def repl_current(match):
-        prefix = match.group(1)  # 前面的运算符
-        ref_full = match.group(2)  # 完整的引用部分
-        start_ref = match.group(3)  # 起始单元格
-        end_ref = match.group(4)  # 结束单元格（如果是区域）
-
-        # 处理单元格引用部分
-        if end_ref:  # 区域引用
-            new_start = shift(start_ref)
-            new_end = shift(end_ref)
-            new_ref = f"{new_start}:{new_end}"
-        else:  # 单格引用
-            new_ref = shift(start_ref)
-
-        return prefix + new_ref
-
-    new_formula = current_sheet_pattern.sub(repl_current, new_formula)
-
-    return new_formula
+    # 工作表名统一使用单引号格式
+    return translate_formula(formula, row_offset, col_offset, quote_sheets=True)
 
 
 # def copy_cell_style(source_cell, target_cell):
@@ -276,6 +197,20 @@ class ExcelAutoFiller:
                     f"源区域({src_rows}×{src_cols})与目标区域({tgt_rows}×{tgt_cols})形状不一致"
                 )
 
+        # 源公式的偏移基准
+        src_base_row = src_start_ref[0] if ':' in source_range else cell_ref[0]
+        src_base_col = src_start_ref[1] if ':' in source_range else cell_ref[1]
+
+        # 每个源公式只转换一次 R1C1 相对形式，广播到各目标单元格时直接拼出 A1 文本
+        for row_data in src_data:
+            for src_cell_data in row_data:
+                formula = src_cell_data['formula']
+                if formula:
+                    if formula.startswith('='):
+                        formula = formula[1:]
+                    # 工作表名统一使用单引号格式（与 update_formula 一致）
+                    src_cell_data['r1c1'] = to_r1c1(formula, src_base_row, src_base_col, quote_sheets=True)
+
         # 批量处理目标区域
         for row_idx in range(tgt_rows):
             for col_idx in range(tgt_cols):
@@ -290,22 +225,7 @@ class ExcelAutoFiller:
 
                 # 处理公式
                 if src_cell_data['formula']:
-                    formula = src_cell_data['formula']
-                    if formula.startswith('='):
-                        formula = formula[1:]
-
-                    # 计算行和列偏移量
-                    src_base_row = src_start_ref[0] if ':' in source_range else cell_ref[0]
-                    src_base_col = src_start_ref[1] if ':' in source_range else cell_ref[1]
-                    row_delta = tgt_row - src_base_row
-                    col_delta = tgt_col - src_base_col
-
-                    new_formula = update_formula(
-                        formula,
-                        row_delta,
-                        col_delta,
-                        current_sheet_name=self.sheet.title
-                    )
+                    new_formula = render_r1c1(src_cell_data['r1c1'], tgt_row, tgt_col)
                     tgt_cell.value = f"={new_formula}"
                 else:
                     # 非公式单元格：直接复制值
@@ -315,6 +235,8 @@ class ExcelAutoFiller:
                 if copy_style and src_cell_data['style']:
                     tgt_cell._style = src_cell_data['style']
 
+        # 不保存时也要让会话知道工作表已改写，随后的 find_cell 等查找不会用到旧的索引
+        mark_modified(self.file_path)
         if save:
             self.save()
 
@@ -400,10 +322,26 @@ class ExcelAutoFiller:
     #     if save:
     #         self.save()
 
+    def fill_rows(self, source_col, target_start_col, target_end_col, start_row, end_row, save=True, copy_style=True):
+        """
+        按行批量横向填充：第 start_row 到 end_row - 1 行，把 source_col 列的公式/值广播到
+        target_start_col:target_end_col，全部在内存中完成，最后只保存一次
+        """
+        for row in range(start_row, end_row):
+            self.auto_fill(
+                f"{source_col}{row}",
+                f"{target_start_col}{row}:{target_end_col}{row}",
+                save=False,
+                copy_style=copy_style
+            )
+
+        if save:
+            self.save()
+
     # ----------------------------------------------------------
     def save(self, new_file_path=None):
         save_path = new_file_path or self.file_path
-        self.wb.save(save_path)
+        save_workbook(self.wb, save_path)
         print(f"文件已保存: {save_path}")
 
     def _cell_offset(self, cell_address, row_offset, col_offset):
@@ -628,25 +566,8 @@ def find_last_used_column(excel_file_path, sheet_name=0):
     str: 最后一列的字母表示（如"A", "B", "C"）
     """
     try:
-        # 使用openpyxl直接加载工作簿以获得更精确的单元格信息
-        wb = load_workbook(excel_file_path, data_only=True)
-
-        # 根据sheet_name参数选择工作表
-        if isinstance(sheet_name, int):
-            sheet = wb.worksheets[sheet_name]
-        else:
-            sheet = wb[sheet_name]
-
-        # 初始化最后一列为0
-        last_column = 0
-
-        # 遍历每一行，查找有数据的最后一列
-        for row in sheet.iter_rows():
-            for cell in reversed(row):  # 从右向左检查以提高效率
-                if cell.value is not None and str(cell.value).strip() != '':
-                    if cell.column > last_column:
-                        last_column = cell.column
-                    break  # 找到该行最后一个有数据的单元格后跳出内层循环
+        # 已用区域按工作表缓存，同一个工作表不再重复加载和逐格扫描
+        last_column = get_sheet_bounds(excel_file_path, sheet_name).last_column
 
         # 将列索引转换为字母表示
         column_letter = openpyxl.utils.get_column_letter(last_column)
@@ -670,27 +591,8 @@ def find_last_used_row(excel_file_path, sheet_name=0):
     int: 最后一行的索引（从1开始）
     """
     try:
-        # 使用openpyxl直接加载工作簿以获得更精确的单元格信息
-        wb = load_workbook(excel_file_path, data_only=True)
-
-        # 根据sheet_name参数选择工作表
-        if isinstance(sheet_name, int):
-            sheet = wb.worksheets[sheet_name]
-        else:
-            sheet = wb[sheet_name]
-
-        # 初始化最后一行为0
-        last_row = 0
-
-        # 遍历每一列，查找有数据的最后一行
-        for col in sheet.iter_cols():
-            for cell in reversed(col):  # 从下向上检查以提高效率
-                if cell.value is not None and str(cell.value).strip() != '':
-                    if cell.row > last_row:
-                        last_row = cell.row
-                    break  # 找到该列最后一个有数据的单元格后跳出内层循环
-
-        return last_row
+        # 已用区域按工作表缓存，同一个工作表不再重复加载和逐格扫描
+        return get_sheet_bounds(excel_file_path, sheet_name).last_row
 
     except Exception as e:
         print(f"处理Excel文件时出错: {e}")
@@ -739,17 +641,23 @@ def expand_excel_header(input_file, sheet_name, output_file, target_year, header
 
     # 扩展年份到目标年份
     print("正在扩展年份并复制格式...")
+    added_columns = []
     for year in range(current_year + 1, target_year + 1):
         current_col += 1
         new_cell = ws.cell(row=header_row, column=current_col, value=year)
 
         # 复制源单元格的样式
         copy_cell_style(source_cell, new_cell)
+        added_columns.append((year, current_col))
 
         print(f"添加年份: {year} 到列 {get_column_letter(current_col)} (已复制格式)")
 
     # 保存结果
-    wb.save(output_file)
+    save_workbook(wb, output_file)
+
+    # 同步年份轴，后续按年份查列不需要重新扫描表头
+    for year, col in added_columns:
+        update_year_axis(output_file, sheet_name, header_row, year, col)
     print(f"\n扩展完成! 文件已保存至: {os.path.abspath(output_file)}")
     print(f"共添加了 {target_year - current_year} 个年份")
 
@@ -785,7 +693,7 @@ def just_copy(input_path, target_year):
             print(f"\n错误: {str(e)}")
             print("操作未完成，请检查输入参数是否正确")
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
@@ -795,8 +703,7 @@ def just_copy(input_path, target_year):
         else:
             last_row = find_last_used_row(input_path, sheet_name) + 1
 
-        for i in range(r + 1, last_row):
-            filler.auto_fill(f"{start_col}{i}", f"{start_col_plus}{i}:{c}{i}")
+        filler.fill_rows(start_col, start_col_plus, c, r + 1, last_row)
 
         # 填充合计
         summary(input_path, sheet_name, last_row, c)
@@ -870,7 +777,7 @@ def special_copy(input_path, target_year):
             print(f"\n错误: {str(e)}")
             print("操作未完成，请检查输入参数是否正确")
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
@@ -881,14 +788,13 @@ def special_copy(input_path, target_year):
             last_row = find_last_used_row(input_path, sheet_name)
 
         # 横向复制公式
-        for i in range(r + 1, last_row):
-            filler.auto_fill(f"{start_col_minus}{i}", f"{start_col}{i}:{c}{i}")
+        filler.fill_rows(start_col_minus, start_col, c, r + 1, last_row)
 
         # 填写最后一列的特殊项
         wb = load_workbook(input_path)
         ws = wb[sheet_name]
         # 找到扩展后的最后一年的列序号
-        _, c = find_cell(input_path, target_year, sheet_name)
+        _, c = get_year_axis(input_path, sheet_name).locate(target_year)
         value1_address = c + str(r1)
         value2_address = c + str(r2)
         table_D4_sheet = "D.4流动资金估算表"
@@ -901,7 +807,7 @@ def special_copy(input_path, target_year):
         ws[value1_address].value = value1_formula
         # ws[value2_address].value = value2_formula
         ws[value2_address].value = f"={table_D4_sheet}!{address_D4}"
-        wb.save(input_path)
+        save_workbook(wb, input_path)
         wb.close()
 
         # 填充合计
@@ -958,895 +864,139 @@ def summary(file_path, sheet_name, last_row, last_col):
         formula_generator.generate_formulas(config)
 
 
-def table_b(file_path, sheet_name, last_col):
-    value = "当期还本付息"
-    table_c_sheet = "c借款还本付息计划表"
-    address = find_all_cells(file_path, value, table_c_sheet)
-    address = address[-1]
-    address = "C" + str(address[0])
-    target_address = "C27"
-    target_end = last_col + str(27)
-
-    # 找到表b的 息税前利润 起始位置
-    table_B_sheet = "B项目信息"
-    start_year, end_year = struct_years(file_path, table_B_sheet)
-    print("建设期的区间为：", start_year, "-", end_year)
-    _, c1 = find_cell(file_path, start_year, sheet_name)
-    _, c2 = find_cell(file_path, end_year, sheet_name)
-
-    # 第一段与第二段的起始位置
-    struct_target = c1 + str(25)
-    c2 = get_column_letter(column_index_from_string(c2) + 1)
-    struct_target2 = c2 + str(25)
-    loop_num = column_index_from_string(last_col) - column_index_from_string(c2)
-
-    # 找到表b中引用的表c的单元格
-    value1 = "债券发行及服务费"
-    address1 = find_all_cells(file_path, value1, table_c_sheet)
-    address1 = address1[-1]
-    address1 = "D" + str(address1[0])
-
-    value2 = "应付利息"
-    address2 = find_all_cells(file_path, value2, table_c_sheet)
-    address2 = address2[-1]
-    address2 = "D" + str(address2[0])
-
-    value3 = "还本付息兑付手续费"
-    address3 = find_all_cells(file_path, value3, table_c_sheet)
-    address3 = address3[-1]
-    address3 = "D" + str(address3[0])
-
-    # 找到表b中引用的表E的单元格
-    table_E_sheet = "E总成本费用估算表"
-    _, c3 = find_cell(file_path, end_year + 1, table_E_sheet)
-
-    # 1 营业收入
-    table_F_sheet = "F项目收入"
-    table_F_value = "年度合计（不含税）"
-    r, c = find_cell(file_path, table_F_value, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address = c + str(r)
-
-    # 4 补贴收入 (默认表F中存在"补贴收入")
-    table_F_value2 = "补贴收入"
-    r, c = find_cell(file_path, table_F_value2, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address2 = c + str(r)
-
-    # 2 营业税金及附加
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value = "城建税及教育费附加"
-    r, c = find_cell(file_path, table_G_value, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address = c + str(r)
-
-    # 初始化公式生成器（输入输出为同一个文件）
-    formula_generator = ExcelFormulaGenerator(
-        data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
-    )
+# 表b、d、e、a.1、a.2 共用的锚点：引用表c借款总结、表F、G、E.4 中的单元格
+TABLE_C_SHEET = "c借款还本付息计划表"
+REPORT_ANCHORS = {
+    # 表c借款总结中的行（名称在表c中出现多次，取最后一次）
+    "c_repay_total": {"sheet": TABLE_C_SHEET, "label": "当期还本付息", "occurrence": -1, "col": "C"},
+    "c_issue_fee": {"sheet": TABLE_C_SHEET, "label": "债券发行及服务费", "occurrence": -1, "col": "D"},
+    "c_interest_payable": {"sheet": TABLE_C_SHEET, "label": "应付利息", "occurrence": -1, "col": "D"},
+    "c_service_fee": {"sheet": TABLE_C_SHEET, "label": "还本付息兑付手续费", "occurrence": -1, "col": "D"},
+    "c_principal": {"sheet": TABLE_C_SHEET, "label": "其中：还本", "occurrence": -1, "col": "D"},
+    "c_interest": {"sheet": TABLE_C_SHEET, "label": "其中：还本", "occurrence": -1, "col": "D", "row_offset": 1},
+    "c_interest2": {"sheet": TABLE_C_SHEET, "label": "其中：还本", "occurrence": -1, "col": "D", "row_offset": 3},
+    "c_interest3": {"sheet": TABLE_C_SHEET, "label": "其中：还本", "occurrence": -1, "col": "D", "row_offset": 4},
+    "c_closing": {"sheet": TABLE_C_SHEET, "label": "期末借款余额", "occurrence": -1, "col": "D"},
+    # 营业收入、补贴收入 (默认表F中存在"补贴收入")
+    "F_total": {"sheet": "F项目收入", "label": "年度合计（不含税）", "col_offset": 2},
+    "F_subsidy": {"sheet": "F项目收入", "label": "补贴收入", "col_offset": 2},
+    # 增值税销项税额、进项税额、营业税金及附加、增值税
+    "G_output_tax": {"sheet": "G.税金及附加测算表", "label": "当期销项税额", "col_offset": 2},
+    "G_input_tax": {"sheet": "G.税金及附加测算表", "label": "当期进项税额", "col_offset": 2},
+    "G_surtax": {"sheet": "G.税金及附加测算表", "label": "城建税及教育费附加", "col_offset": 2},
+    "G_vat": {"sheet": "G.税金及附加测算表", "label": "当期应缴增值税", "col_offset": 2},
+    # 建设投资：E.4 增值税率右侧一列的最后一行
+    "E4_investment": {"sheet": "E.4建设投资税后金额表", "label": "增值税率", "col_offset": 1, "last_row": True},
+}
 
-    config = [
-        {
-            "operation": "custom",
-            "formula_template": "=((C26-C11)/{A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            }
-        },
+# b表：C27 利息备付率；息税前利润建设期引用表c，运营期引用表E利息支出（建设期结束后一年起）
+TABLE_B_SPEC = {
+    "sheet": "b利润与利润分配表（损益和利润分配表）",
+    "anchors": dict(
+        REPORT_ANCHORS,
+        profit={"cell": "D7"},
+        profit_operation={"year": "construction_end", "col_offset": 1, "row": 7},
+        E_interest={"sheet": "E总成本费用估算表", "year": "construction_end", "year_offset": 1, "row": 14},
+    ),
+    "formulas": [
+        {"target": "C27", "template": "=((C26-C11)/{c_repay_total})", "count": 1},
         # 息税前利润 (第一段引用表c部分)
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val}+{C_val}+{D_val})",
-            "params": {
-                "A_val": {"sheet": "", "cell": "D7"},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": address1},  # A表的y (向右移动)
-                "C_val": {"sheet": table_c_sheet, "cell": address2},  # A表的y (向右移动)
-                "D_val": {"sheet": table_c_sheet, "cell": address3}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": struct_target  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": end_year - start_year + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "C_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "D_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
+        {"target": {"year": "construction_start", "row": 25}, "count": "construction",
+         "template": "=({profit}+{c_issue_fee}+{c_interest_payable}+{c_service_fee})"},
         # 息税前利润 (第二段)
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val})",
-            "params": {
-                "A_val": {"sheet": "", "cell": c2 + str(7)},  # A表的y (向右移动)
-                "B_val": {"sheet": table_E_sheet, "cell": c3 + str(14)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": struct_target2  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业收入（不含增值税）
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D3"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业税金及附加
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D4"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 补贴收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D6"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-    ]
-
-    formula_generator.generate_formulas(config)
-
-    # 合并单元格
-
-    wb = load_workbook(file_path)
-    ws = wb[sheet_name]
-
-    # 创建居中对齐样式
-    alignment_center = Alignment(horizontal='center', vertical='center')
-    # 设置全边框
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    ws.merge_cells(range_string=f"{target_address}:{target_end}")
-    # 设置指定区域单元格居中对齐
-    for row in ws[f"{target_address}:{target_end}"]:
-        for cell in row:
-            cell.alignment = alignment_center
-            cell.border = border
-
-    wb.save(file_path)
-    wb.close()
-
-
-def table_d(file_path, sheet_name, last_col):
-    value = "其中：还本"
-    table_c_sheet = "c借款还本付息计划表"
-    address = find_all_cells(file_path, value, table_c_sheet)
-    address = address[-1]
-    address1 = "D" + str(address[0] + 1)
-    address2 = "D" + str(address[0])
-    target_address = "D28"
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string("D")
-
-    # 1.1.1 营业收入
-    table_F_sheet = "F项目收入"
-    table_F_value = "年度合计（不含税）"
-    r, c = find_cell(file_path, table_F_value, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address = c + str(r)
-
-    # 1.1.2 增值税销项税额
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value3 = "当期销项税额"
-    r, c = find_cell(file_path, table_G_value3, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address3 = c + str(r)
-
-    # 1.1.3 补贴收入 (默认表F中存在"补贴收入")
-    table_F_value2 = "补贴收入"
-    r, c = find_cell(file_path, table_F_value2, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address2 = c + str(r)
-
-    # 1.2.2 增值税进项税额
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value4 = "当期进项税额"
-    r, c = find_cell(file_path, table_G_value4, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address4 = c + str(r)
-
-    # 1.2.3 营业税金及附加
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value = "城建税及教育费附加"
-    r, c = find_cell(file_path, table_G_value, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address = c + str(r)
-
-    # 1.2.4 增值税
-    table_G_value2 = "当期应缴增值税"
-    r, c = find_cell(file_path, table_G_value2, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address2 = c + str(r)
-
-    # 2.2.1 建设投资
-    table_E4_sheet = "E.4建设投资税后金额表"
-    table_E4_value = "增值税率"
-    r, c = find_cell(file_path, table_E4_value, table_E4_sheet)
-    c = get_column_letter(column_index_from_string(c) + 1)
-    r = find_last_used_row(file_path, table_E4_sheet)
-    table_E4_address = c + str(r)
-
-    # 初始化公式生成器（输入输出为同一个文件）
-    formula_generator = ExcelFormulaGenerator(
-        data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
-    )
-
-    config = [
-        # 各种利息支出
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val}+{C_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": down_n_cells(address1, 2)},  # A表的y (向右移动)
-                "C_val": {"sheet": table_c_sheet, "cell": down_n_cells(address1, 3)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "C_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 偿还债务本金
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address2}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": down_n_cells(target_address, 1)  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D5"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 增值税销项税额
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address3},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D6"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 补贴收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D7"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 增值税进项税额
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address4},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D11"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业税金及附加
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D12"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 增值税
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D13"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 建设投资
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E4_sheet, "cell": table_E4_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D19"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
-
-    formula_generator.generate_formulas(config)
-
-
-def table_e(file_path, sheet_name, last_col):
-    value = "期末借款余额"
-    table_c_sheet = "c借款还本付息计划表"
-    address = find_all_cells(file_path, value, table_c_sheet)
-    address = address[-1]
-    address = "D" + str(address[0])
-    target_address = "C19"
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string("C")
-
-    # 1.3 固定资产净值
-    table_E2_sheet = "E.2固定资产折旧费估算表"
-    table_E2_value = "净值合计"
-    r, c = find_cell(file_path, table_E2_value, table_E2_sheet)
-    c = get_column_letter(column_index_from_string(c) + 5)
-    table_E2_address = c + str(r)
-
-    # 1.4 无形及其他资产净值
-    table_E3_sheet = "E.3无形资产和其他资产摊销费估算表"
-    table_E3_value = "净值合计"
-    r, c = find_cell(file_path, table_E3_value, table_E3_sheet)
-    c = "F"
-    table_E3_address = c + str(r)
-
-    # 初始化公式生成器（输入输出为同一个文件）
-    formula_generator = ExcelFormulaGenerator(
-        data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
-    )
-
-    config = [
-        # 建设投资借款
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 固定资产净值
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E2_sheet, "cell": table_E2_address}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "C11"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 无形及其他资产净值
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E3_sheet, "cell": table_E3_address}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "C12"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
-
-    formula_generator.generate_formulas(config)
-
-
-def table_a1(file_path, sheet_name, last_col):
-    # 初始化公式生成器（输入输出为同一个文件）
-    formula_generator = ExcelFormulaGenerator(
-        data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
-    )
-
-    value = "Ⅰ"
-    r, _ = find_cell(file_path, value, sheet_name)
-
-    start_address1 = "D15"
-    end_address1 = last_col + str(15)
-
-    start_address2 = "D18"
-    end_address2 = last_col + str(18)
-
-    target_start = "D" + str(r)
-    target_end = last_col + str(r)
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string("D")
-
-    # 1.1 营业收入
-    table_F_sheet = "F项目收入"
-    table_F_value = "年度合计（不含税）"
-    r, c = find_cell(file_path, table_F_value, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address = c + str(r)
-
-    # 1.2 补贴收入 (默认表F中存在"补贴收入")
-    table_F_value2 = "补贴收入"
-    r, c = find_cell(file_path, table_F_value2, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address2 = c + str(r)
-
-    # 2.1 建设投资
-    table_E4_sheet = "E.4建设投资税后金额表"
-    table_E4_value = "增值税率"
-    r, c = find_cell(file_path, table_E4_value, table_E4_sheet)
-    c = get_column_letter(column_index_from_string(c) + 1)
-    r = find_last_used_row(file_path, table_E4_sheet)
-    table_E4_address = c + str(r)
-
-    # 2.4 营业税金及附加
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value = "城建税及教育费附加"
-    r, c = find_cell(file_path, table_G_value, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address = c + str(r)
-
-    # 2.5 增值税
-    table_G_value2 = "当期应缴增值税"
-    r, c = find_cell(file_path, table_G_value2, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address2 = c + str(r)
-
-    config = [
-        {
-            "operation": "custom",
-            "formula_template": "=(IRR({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": start_address1},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": end_address1},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_start  # 目标起始位置 (向右移动)
-            }
-        },
-
-        {
-            "operation": "custom",
-            "formula_template": "=(IRR({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": start_address2},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": end_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": down_n_cells(target_start, 1)  # 目标起始位置 (向右移动)
-            }
-        },
-
-        {
-            "operation": "custom",
-            "formula_template": "=(NPV(A财务假设!$D$3,{A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": start_address1},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": end_address1},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": down_n_cells(target_start, 2)  # 目标起始位置 (向右移动)
-            }
-        },
-
-        {
-            "operation": "custom",
-            "formula_template": "=(NPV(A财务假设!$D$4,{A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": start_address2},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": end_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": down_n_cells(target_start, 3)  # 目标起始位置 (向右移动)
-            }
-        },
-
-        # 营业收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D4"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 补贴收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D5"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+        {"target": {"year": "construction_end", "col_offset": 1, "row": 25},
+         "template": "=({profit_operation}+{E_interest})"},
+        {"target": "D3", "template": "=({F_total})", "count_from": "profit_operation"},    # 营业收入（不含增值税）
+        {"target": "D4", "template": "=({G_surtax})", "count_from": "profit_operation"},   # 营业税金及附加
+        {"target": "D6", "template": "=({F_subsidy})", "count_from": "profit_operation"},  # 补贴收入
+    ],
+}
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 建设投资
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E4_sheet, "cell": table_E4_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D9"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+# d表：利息支出、偿还债务本金引用表c借款总结，其余行引用表F、G、E.4
+TABLE_D_SPEC = {
+    "sheet": "d财务计划现金流量表",
+    "anchors": REPORT_ANCHORS,
+    "formulas": [
+        {"target": "D28", "template": "=({c_interest}+{c_interest2}+{c_interest3})", "count_offset": 1},  # 各种利息支出
+        {"target": "D29", "template": "=({c_principal})", "count_offset": 1},   # 偿还债务本金
+        {"target": "D5", "template": "=({F_total})"},          # 营业收入
+        {"target": "D6", "template": "=({G_output_tax})"},     # 增值税销项税额
+        {"target": "D7", "template": "=({F_subsidy})"},        # 补贴收入
+        {"target": "D11", "template": "=({G_input_tax})"},     # 增值税进项税额
+        {"target": "D12", "template": "=({G_surtax})"},        # 营业税金及附加
+        {"target": "D13", "template": "=({G_vat})"},           # 增值税
+        {"target": "D19", "template": "=({E4_investment})"},   # 建设投资
+    ],
+    "count_offset": 0,
+}
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业税金及附加
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D12"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+# e表：建设投资借款、固定资产净值、无形及其他资产净值
+TABLE_E_SPEC = {
+    "sheet": "e资产负债表",
+    "anchors": dict(
+        REPORT_ANCHORS,
+        E2_net={"sheet": "E.2固定资产折旧费估算表", "label": "净值合计", "col_offset": 5},
+        E3_net={"sheet": "E.3无形资产和其他资产摊销费估算表", "label": "净值合计", "col": "F"},
+    ),
+    "formulas": [
+        {"target": "C19", "template": "=({c_closing})"},   # 建设投资借款
+        {"target": "C11", "template": "=({E2_net})"},      # 固定资产净值
+        {"target": "C12", "template": "=({E3_net})"},      # 无形及其他资产净值
+    ],
+    "count_offset": 1,
+}
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 增值税
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D13"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+# a.1表：Ⅰ所在行起依次为 所得税前/后 内部收益率、净现值（单个单元格，之后合并到 last_col）
+TABLE_A1_SPEC = {
+    "sheet": "a.1财务现金流量表",
+    "anchors": dict(
+        REPORT_ANCHORS,
+        pretax_first={"cell": "D15"},
+        pretax_last={"row": 15, "col": "last_col"},
+        aftertax_first={"cell": "D18"},
+        aftertax_last={"row": 18, "col": "last_col"},
+    ),
+    "formulas": [
+        {"target": {"label": "Ⅰ", "col": "D"}, "template": "=(IRR({pretax_first}:{pretax_last}))", "count": 1},
+        {"target": {"label": "Ⅰ", "col": "D", "row_offset": 1},
+         "template": "=(IRR({aftertax_first}:{aftertax_last}))", "count": 1},
+        {"target": {"label": "Ⅰ", "col": "D", "row_offset": 2},
+         "template": "=(NPV(A财务假设!$D$3,{pretax_first}:{pretax_last}))", "count": 1},
+        {"target": {"label": "Ⅰ", "col": "D", "row_offset": 3},
+         "template": "=(NPV(A财务假设!$D$4,{aftertax_first}:{aftertax_last}))", "count": 1},
+        {"target": "D4", "template": "=({F_total})"},          # 营业收入
+        {"target": "D5", "template": "=({F_subsidy})"},        # 补贴收入
+        {"target": "D9", "template": "=({E4_investment})"},    # 建设投资
+        {"target": "D12", "template": "=({G_surtax})"},        # 营业税金及附加
+        {"target": "D13", "template": "=({G_vat})"},           # 增值税
+    ],
+    "count_offset": 0,
+}
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
+# a.2表：资本金财务内部收益率（单个单元格，之后合并到 last_col）；借款本金偿还、利息支付引用表c
+TABLE_A2_SPEC = {
+    "sheet": "a.2项目资本金现金流量表",
+    "anchors": dict(
+        REPORT_ANCHORS,
+        cash_first={"cell": "D17"},
+        cash_last={"row": 17, "col": "last_col"},
+    ),
+    "formulas": [
+        {"target": {"label": "资本金财务内部收益率（%）", "col": "D"},
+         "template": "=(IRR({cash_first}:{cash_last}))", "count": 1},
+        {"target": "D10", "template": "=({c_principal})", "count_offset": 1},    # 借款本金偿还
+        {"target": "D11", "template": "=({c_interest}+{c_interest2}+{c_interest3})", "count_offset": 1},  # 借款利息支付
+        {"target": "D4", "template": "=({F_total})"},      # 营业收入
+        {"target": "D5", "template": "=({F_subsidy})"},    # 补贴收入
+        {"target": "D13", "template": "=({G_surtax})"},    # 营业税金及附加
+        {"target": "D14", "template": "=({G_vat})"},       # 增值税
+    ],
+    "count_offset": 0,
+}
 
-    formula_generator.generate_formulas(config)
 
+def merge_rows(file_path, sheet_name, start, end, rows=1):
+    """从 start:end 起向下 rows 行，每行合并成一个单元格，居中并加全边框"""
     wb = load_workbook(file_path)
     ws = wb[sheet_name]
 
@@ -1860,9 +1010,9 @@ def table_a1(file_path, sheet_name, last_col):
         bottom=Side(style='thin')
     )
 
-    for i in range(4):
-        merge_start = down_n_cells(target_start, i)
-        merge_end = down_n_cells(target_end, i)
+    for i in range(rows):
+        merge_start = down_n_cells(start, i)
+        merge_end = down_n_cells(end, i)
         ws.merge_cells(range_string=f"{merge_start}:{merge_end}")
         # 设置指定区域单元格居中对齐
         for row in ws[f"{merge_start}:{merge_end}"]:
@@ -1870,255 +1020,34 @@ def table_a1(file_path, sheet_name, last_col):
                 cell.alignment = alignment_center
                 cell.border = border
 
-    wb.save(file_path)
+    save_workbook(wb, file_path)
     wb.close()
 
 
-def table_a2(file_path, sheet_name, last_col):
-    # 初始化公式生成器（输入输出为同一个文件）
-    formula_generator = ExcelFormulaGenerator(
-        data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
-    )
-
-    value = "资本金财务内部收益率（%）"
-    r, _ = find_cell(file_path, value, sheet_name)
-
-    start_address = "D17"
-    end_address = last_col + str(17)
-
-    target_start = "D" + str(r)
-    target_end = last_col + str(r)
-
-    value = "其中：还本"
-    table_c_sheet = "c借款还本付息计划表"
-    address = find_all_cells(file_path, value, table_c_sheet)
-    address = address[-1]
-    # 利息
-    address1 = "D" + str(address[0] + 1)
-    # 本金
-    address2 = "D" + str(address[0])
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string("D")
-    target_address = "D10"
-
-    # 1.1 营业收入
-    table_F_sheet = "F项目收入"
-    table_F_value = "年度合计（不含税）"
-    r, c = find_cell(file_path, table_F_value, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address = c + str(r)
-
-    # 1.2 补贴收入 (默认表F中存在"补贴收入")
-    table_F_value2 = "补贴收入"
-    r, c = find_cell(file_path, table_F_value2, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_F_address2 = c + str(r)
-
-    # 2.5 营业税金及附加
-    table_G_sheet = "G.税金及附加测算表"
-    table_G_value = "城建税及教育费附加"
-    r, c = find_cell(file_path, table_G_value, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address = c + str(r)
-
-    # 2.6 增值税
-    table_G_value2 = "当期应缴增值税"
-    r, c = find_cell(file_path, table_G_value2, table_G_sheet)
-    c = get_column_letter(column_index_from_string(c) + 2)
-    table_G_address2 = c + str(r)
-
-    config = [
-        {
-            "operation": "custom",
-            "formula_template": "=(IRR({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": start_address},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": end_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_start  # 目标起始位置 (向右移动)
-            }
-        },
-        # 借款本金偿还
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address2}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 借款利息支付
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val}+{C_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": down_n_cells(address1, 2)},  # A表的y (向右移动)
-                "C_val": {"sheet": table_c_sheet, "cell": down_n_cells(address1, 3)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": down_n_cells(target_address, 1)  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num + 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "C_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+def table_b(file_path, sheet_name, last_col):
+    fill_table(file_path, dict(TABLE_B_SPEC, sheet=sheet_name), last_col)
+    # 利息备付率合并到最后一列
+    merge_rows(file_path, sheet_name, "C27", last_col + str(27))
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D4"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 补贴收入
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D5"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+def table_d(file_path, sheet_name, last_col):
+    fill_table(file_path, dict(TABLE_D_SPEC, sheet=sheet_name), last_col)
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 营业税金及附加
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D13"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 增值税
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G_sheet, "cell": table_G_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D14"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
+def table_e(file_path, sheet_name, last_col):
+    fill_table(file_path, dict(TABLE_E_SPEC, sheet=sheet_name), last_col)
 
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
 
-    formula_generator.generate_formulas(config)
+def table_a1(file_path, sheet_name, last_col):
+    fill_table(file_path, dict(TABLE_A1_SPEC, sheet=sheet_name), last_col)
+    r, _ = find_cell(file_path, "Ⅰ", sheet_name)
+    merge_rows(file_path, sheet_name, "D" + str(r), last_col + str(r), rows=4)
 
-    wb = load_workbook(file_path)
-    ws = wb[sheet_name]
 
-    # 创建居中对齐样式
-    alignment_center = Alignment(horizontal='center', vertical='center')
-    # 设置全边框
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    ws.merge_cells(range_string=f"{target_start}:{target_end}")
-    # 设置指定区域单元格居中对齐
-    for row in ws[f"{target_start}:{target_end}"]:
-        for cell in row:
-            cell.alignment = alignment_center
-            cell.border = border
-
-    wb.save(file_path)
-    wb.close()
+def table_a2(file_path, sheet_name, last_col):
+    fill_table(file_path, dict(TABLE_A2_SPEC, sheet=sheet_name), last_col)
+    r, _ = find_cell(file_path, "资本金财务内部收益率（%）", sheet_name)
+    merge_rows(file_path, sheet_name, "D" + str(r), last_col + str(r))
 
 
 if __name__ == "__main__":
@@ -7,20 +7,94 @@ from loan_calculate import loan_fill
 from copy_formula import just_copy, special_copy, clear_style_cache
 from other_table import copy_one, copy_two, copy_three
 from final_table import final_copy, table_c_last
+from openpyxl_vba import WorkbookSession, load_workbook
+from formula_evaluator import recalculate_workbook
+from template_cache import load_template_layout
+from project_calendar import ProjectCalendar
+from template_snapshot import load_template
+from write_plan import capture_plan, apply_plan
+from plan_cache import plan_key, load_cached_plan, store_plan
 import shutil
 import os
+import tempfile
 
 
 # 假设这是您已经完成的Excel修改功能
 # 请确保您已经定义了以下函数：
 # loan_fill, copy_three, copy_two, copy_one, just_copy, special_copy, final_copy, table_c_last, clear_style_cache
 
-def modify_excel_file(input_path, output_path, progress_callback=None):
+# 各阶段: (进度, 提示, 函数, 是否需要 last_year)
+PIPELINE_STAGES = [
+    (25, "正在生成表E.2、E.3...", copy_three, True),
+    (37.5, "正在生成表E.1、E.1.1...", copy_two, True),
+    (50, "正在生成表D.2、D.4、E、F、F.1、G...", copy_one, True),
+    (62.5, "正在生成表b、d、e...", just_copy, True),
+    (75, "正在生成表a.1、a.2...", special_copy, True),
+    (87.5, "正在生成表III、VI...", final_copy, True),
+    (99, "正在回填表c...", table_c_last, False),
+]
+
+
+def run_pipeline(session, progress_callback=None):
+    """
+    在会话的工作簿上依次运行各阶段（不保存）
+    :param session: WorkbookSession
+    :param progress_callback: 进度回调函数
+    :return: loan_fill 得到的最后一年
+    """
+    if progress_callback:
+        progress_callback(12.5, "正在生成表c...")
+    last_year = loan_fill(session)
+
+    for progress, message, stage, needs_last_year in PIPELINE_STAGES:
+        if progress_callback:
+            progress_callback(progress, message)
+        if needs_last_year:
+            stage(session, last_year)
+        else:
+            stage(session)
+    return last_year
+
+
+def plan_excel_file(input_path, progress_callback=None):
+    """
+    只生成写入计划，不输出文件（dry run）：在输入文件的临时副本上运行各阶段，与原模板比较得到计划
+    :param input_path: 输入文件路径
+    :param progress_callback: 进度回调函数
+    :return: (True, WritePlan) 或 (False, 错误信息)；计划的 meta 中记录 last_year 和模板结构哈希
+    """
+    work_dir = tempfile.mkdtemp(prefix="plan_")
+    try:
+        work_path = os.path.join(work_dir, os.path.basename(input_path))
+        shutil.copy2(input_path, work_path)
+        template_wb = load_workbook(work_path)
+        session = WorkbookSession(work_path)
+        session.template_layout = load_template_layout(session)
+        session.project_calendar = ProjectCalendar.from_workbook(session)
+
+        last_year = run_pipeline(session, progress_callback)
+
+        plan = capture_plan(template_wb, session.wb)
+        plan.meta.update(last_year=last_year, template_hash=session.template_layout.template_hash)
+        clear_style_cache()
+        print(f"写入计划: {len(plan)} 个单元格")
+        return True, plan
+    except Exception as e:
+        return False, f"处理过程中发生错误: {str(e)}"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def modify_excel_file(input_path, output_path, progress_callback=None, use_snapshot=False, plan=None,
+                      use_plan_cache=False):
     """
     修改Excel文件的主函数
     :param input_path: 输入文件路径
     :param output_path: 输出文件路径
     :param progress_callback: 进度回调函数，用于更新GUI进度
+    :param use_snapshot: 为 True 时输入文件的解析结果保存为快照，再次处理同一文件时直接恢复（见 template_snapshot）
+    :param plan: 写入计划（plan_excel_file 的结果）；给出时直接套用计划，不再运行各阶段
+    :param use_plan_cache: 为 True 时按 (模板结构, 借款结构, 年份范围) 缓存写入计划，结构相同的项目直接套用（见 plan_cache）
     """
     try:
         if progress_callback:
@@ -32,37 +106,45 @@ def modify_excel_file(input_path, output_path, progress_callback=None):
 
         shutil.copy2(input_path, output_path)
 
-        if progress_callback:
-            progress_callback(12.5, "正在生成表c...")
-        last_year = loan_fill(output_path)
-
-        if progress_callback:
-            progress_callback(25, "正在生成表E.2、E.3...")
-        copy_three(output_path, last_year)
-
-        if progress_callback:
-            progress_callback(37.5, "正在生成表E.1、E.1.1...")
-        copy_two(output_path, last_year)
-
-        if progress_callback:
-            progress_callback(50, "正在生成表D.2、D.4、E、F、F.1、G...")
-        copy_one(output_path, last_year)
-
-        if progress_callback:
-            progress_callback(62.5, "正在生成表b、d、e...")
-        just_copy(output_path, last_year)
-
-        if progress_callback:
-            progress_callback(75, "正在生成表a.1、a.2...")
-        special_copy(output_path, last_year)
+        # 模板只解析一次，各阶段共享同一个内存中的工作簿，最后统一保存
+        # 输出文件是输入文件的副本，可以直接使用输入文件的快照
+        session = WorkbookSession(output_path, wb=load_template(input_path) if use_snapshot else None)
+        # 模板中的固定位置按模板结构缓存，同一结构的模板不再重复扫描
+        session.template_layout = load_template_layout(session)
+        # 建设期、运营期年份只读取一次，各阶段和写入计划缓存键共用（见 project_calendar）
+        session.project_calendar = ProjectCalendar.from_workbook(session)
+
+        cache_key = None
+        if plan is None and use_plan_cache:
+            cache_key = plan_key(session, session.template_layout.template_hash)
+            plan = load_cached_plan(cache_key)
+            if plan is not None:
+                print("写入计划缓存命中，直接套用")
+            else:
+                # 未命中：另外加载一份原模板，生成后比较得到计划
+                template_wb = load_template(input_path) if use_snapshot else load_workbook(input_path)
+
+        if plan is not None:
+            if progress_callback:
+                progress_callback(50, "正在套用写入计划...")
+            apply_plan(session.wb, plan)
+            session.mark_dirty()
+        else:
+            last_year = run_pipeline(session, progress_callback)
+            if cache_key is not None:
+                new_plan = capture_plan(template_wb, session.wb)
+                new_plan.meta.update(last_year=last_year, template_hash=session.template_layout.template_hash)
+                store_plan(cache_key, new_plan)
 
         if progress_callback:
-            progress_callback(87.5, "正在生成表III、VI...")
-        final_copy(output_path, last_year)
+            progress_callback(99.5, "正在保存文件...")
+        # 只重写有变化的工作表，控件、宏等部件从原文件原样复制（见 xlsm_splice）
+        session.save()
 
+        # 写入公式计算结果，data_only 读取和校验不需要经过 Excel 也能拿到数值
         if progress_callback:
-            progress_callback(99, "正在回填表c...")
-        table_c_last(output_path)
+            progress_callback(99.8, "正在计算公式结果...")
+        recalculate_workbook(session)
 
         if progress_callback:
             progress_callback(100, "完成")
@@ -272,7 +354,9 @@ class ExcelModifierApp:
             success, message = modify_excel_file(
                 self.input_file_path.get(),
                 output_path,
-                progress_callback=self.update_status
+                progress_callback=self.update_status,
+                use_snapshot=True,
+                use_plan_cache=True
             )
 
             if success:
@@ -3,10 +3,45 @@ from openpyxl.utils import column_index_from_string, get_column_letter
 
 from circulate_formula import ExcelFormulaGenerator
 from copy_formula import find_last_used_row, find_last_used_column, expand_excel_header, ExcelAutoFiller
-from findAndSet import find_cell
+from findAndSet import get_year_axis
 from loan_assignment import right_n_cells, up_n_cells, down_n_cells
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl_vba import load_workbook
+from openpyxl_vba import load_workbook, save_workbook
+from table_spec import fill_table
+
+# Ⅲ表：经营性收入 = F表 年度合计（不含税）- 补贴收入，政府补贴收入 = F表 补贴收入
+TABLE_III_SPEC = {
+    "sheet": "Ⅲ项目分年度收入合计表",
+    "anchors": {
+        "F_total": {"sheet": "F项目收入", "last_row": True, "col": "D"},     # 年度合计（不含税）
+        "F_subsidy": {"sheet": "F项目收入", "label": "补贴收入", "col": "D"},
+    },
+    "formulas": [
+        {"target": "B4", "template": "=({F_total}-{F_subsidy})"},   # 经营性收入
+        {"target": "B5", "template": "=({F_subsidy})"},             # 政府补贴收入
+    ],
+    "count_offset": -1,
+}
+
+# Ⅵ表：行 3、4、5、7 分别对应表c借款总结的 n.1、n.2.1、n.3、n.2.2（按表c最后一行向上定位）
+TABLE_VI_SPEC = {
+    "sheet": "Ⅵ专项债券应付本息情况表",
+    "anchors": {
+        "c_opening": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D", "row_offset": -7},
+        "c_opening_next": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "E", "row_offset": -7},
+        "c_principal": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D", "row_offset": -5},
+        "c_interest": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D", "row_offset": -4},
+        "c_closing": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D", "row_offset": -3},
+    },
+    "formulas": [
+        {"target": "B3", "template": "=({c_opening_next}-{c_opening})"},   # 本期新增
+        {"target": "B4", "template": "=({c_principal})"},                  # 本期偿还
+        {"target": "B5", "template": "=({c_closing})"},                    # 期末本金
+        {"target": "B7", "template": "=({c_interest})"},                   # 应付利息
+    ],
+    "count_offset": -1,
+}
+
 
 def table_III(input_path, sheet_name, last_col):
     """
@@ -17,85 +52,7 @@ def table_III(input_path, sheet_name, last_col):
     :param last_col: III表扩充表头后的最后一列
     :return:
     """
-
-    # 经营性收入 第一个单元格地址
-    target_address1 = "B4"
-
-    # 政府补贴收入 第一个单元格地址
-    target_address2 = "B5"
-
-    # 表F 年度合计（不含税） 地址
-    table_F_sheet = "F项目收入"
-    r = find_last_used_row(input_path, table_F_sheet)
-    address_F1 = "D" + str(r)
-
-    # 表F 补贴收入 地址
-    value = "补贴收入"
-    r, _ = find_cell(input_path, value, table_F_sheet)
-    address_F2 = "D" + str(r)
-
-    # 循环次数
-    loop_num = column_index_from_string(last_col) - column_index_from_string("B") - 1
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    config = [
-        # 1.1 建设投资
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}-{B_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": address_F1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_F_sheet, "cell": address_F2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address1  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 1.2 建设期利息
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": address_F2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address2  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
-
-    formula_generator.generate_formulas(config)
+    fill_table(input_path, dict(TABLE_III_SPEC, sheet=sheet_name), last_col)
 
 
 def table_VI(input_path, sheet_name, last_col):
@@ -105,147 +62,13 @@ def table_VI(input_path, sheet_name, last_col):
     :param input_path:
     :param sheet_name:
     :param last_col:
-    :return:
+    :return: 本期新增最后一格的公式（引用表c期末本金的最后一列）
     """
+    fill_table(input_path, dict(TABLE_VI_SPEC, sheet=sheet_name), last_col)
 
-    # 本期新增 第一个单元格地址
-    target_address1 = "B3"
-
-    # 本期偿还 第一个单元格地址
-    target_address2 = "B4"
-
-    # 期末本金 第一个单元格地址
-    target_address3 = "B5"
-
-    # 应付利息 第一个单元格地址
-    target_address4 = "B7"
-
-    # 表c 的n.1 地址
     table_c_sheet = "c借款还本付息计划表"
     r = find_last_used_row(input_path, table_c_sheet)
-    address_c1 = "D" + str(r - 7)
-
-    # 表c 的n.2.1 地址
-    address_c2 = "D" + str(r - 5)
-
-    # 表c 的n.2.2 地址
-    address_c3 = "D" + str(r - 4)
-
-    # 表c 的n.3 地址
-    address_c4 = "D" + str(r - 3)
-
     _, c = find_last_used_column(input_path, table_c_sheet)
-
-    # 循环次数
-    loop_num = column_index_from_string(last_col) - column_index_from_string("B") - 1
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    config = [
-        # 本期新增
-        {
-            "operation": "custom",
-            "formula_template": "=({B_val}-{A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address_c1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": right_n_cells(address_c1, 1)},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address1  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 本期偿还
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address_c2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address2  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 期末本金
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address_c4}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address3  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 应付利息
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": address_c3},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address4  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
-
-    formula_generator.generate_formulas(config)
     print("done")
     print("c:", c)
     temp_address = c + str(r - 3)
@@ -292,15 +115,14 @@ def final_copy(input_path, target_year):
         else:
             table_c_formula = table_VI(input_path, sheet_name, start_col)
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
 
         last_row = find_last_used_row(input_path, sheet_name)
 
-        for i in range(r + 1, last_row + 1):
-            filler.auto_fill(f"{start_col}{i}", f"{start_col_plus}{i}:{c}{i}")
+        filler.fill_rows(start_col, start_col_plus, c, r + 1, last_row + 1)
 
         # 修改表 VI 本期新增 的最后一格
         if sheet_name == "Ⅵ专项债券应付本息情况表":
@@ -308,7 +130,7 @@ def final_copy(input_path, target_year):
             wb = load_workbook(input_path)
             ws = wb[sheet_name]
             ws[target_address].value = table_c_formula
-            wb.save(input_path)
+            save_workbook(wb, input_path)
 
 
 def format_existing_excel(file_path, sheet_name, output_path=None):
@@ -401,7 +223,7 @@ def format_existing_excel(file_path, sheet_name, output_path=None):
         # sheet.column_dimensions[column_letter].width = adjusted_width
 
     # 保存工作簿
-    workbook.save(output_path)
+    save_workbook(workbook, output_path)
     print(f"Excel格式已成功更新并保存到: {output_path}")
 
 def table_c_last(input_path):
@@ -513,7 +335,7 @@ def table_c_last(input_path):
     ws[final_address2].value = "偿债备付率（%）"
     ws[right_n_cells(final_address1, 1)].value = "/"
     ws[right_n_cells(final_address2, 1)].value = "/"
-    wb.save(input_path)
+    save_workbook(wb, input_path)
     wb.close()
 
     format_existing_excel(input_path, table_c_sheet)
@@ -521,7 +343,7 @@ def table_c_last(input_path):
     wb = load_workbook(input_path)
     ws = wb[table_c_sheet]
     ws.merge_cells(range_string=f"{merge_address1}:{merge_address2}")
-    wb.save(input_path)
+    save_workbook(wb, input_path)
     wb.close()
 
 
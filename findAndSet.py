@@ -1,10 +1,352 @@
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
+import os
 import re
-from collections import OrderedDict
+from bisect import insort
+from collections import Counter, OrderedDict
+from weakref import WeakKeyDictionary
 # from openpyxl import load_workbook
 from typing import List, Tuple
 import json
-from openpyxl_vba import load_workbook
+from openpyxl_vba import load_workbook, save_workbook, WorkbookSession
+from formula_evaluator import read_cached_rows
+
+
+class SheetLabelIndex:
+    """
+    工作表标签索引：遍历一次工作表，建立 单元格值 → [(行号, 列号), ...] 的映射
+
+    坐标按先行后列排序，与逐格扫描的先后顺序一致；查找为 O(1)。
+    值按 == 比较（与原来的逐格扫描相同，2025 与 2025.0 视为相等）。
+    cached_values 为返回 {(行号, 列号): 缓存值} 的函数时，公式单元格同时按缓存值登记
+    （读取文件时与 data_only 的查找结果一致，如 E.4 表头 =D.3建设投资分年计划表!E2 也能按 2025 找到），
+    工作表中有公式时才调用
+    """
+
+    def __init__(self, ws, cached_values=None):
+        self._coords = {}
+        self._values = {}
+        formula_cells = []
+        for row in ws.iter_rows():
+            for cell in row:
+                value = cell.value
+                if value is None:
+                    continue
+                self._add((cell.row, cell.column), value)
+                if cached_values is not None and isinstance(value, str) and value.startswith("="):
+                    formula_cells.append((cell.row, cell.column))
+        if formula_cells:
+            cached = cached_values()
+            for key in formula_cells:
+                value = cached.get(key)
+                if value is not None:
+                    self._add(key, value, ordered=True)
+
+    def _add(self, key, value, ordered=False):
+        try:
+            coords = self._coords.setdefault(value, [])
+        except TypeError:  # 不可哈希的值不参与索引
+            return
+        if ordered:
+            insort(coords, key)
+        else:
+            coords.append(key)
+        self._values.setdefault(key, []).append(value)
+
+    def find_all(self, value):
+        """返回所有等于 value 的单元格 [(行号, 列号), ...]"""
+        try:
+            return list(self._coords.get(value, ()))
+        except TypeError:
+            return []
+
+    def find_first(self, value):
+        """返回第一个等于 value 的单元格 (行号, 列号)，找不到时返回 (None, None)"""
+        coords = self.find_all(value)
+        return coords[0] if coords else (None, None)
+
+    def update(self, row, column, value):
+        """单元格被改写后增量更新索引"""
+        key = (row, column)
+        for old in self._values.pop(key, ()):
+            self._coords[old].remove(key)
+        if value is not None:
+            self._add(key, value, ordered=True)
+
+
+class YearAxis:
+    """
+    年份表头轴：从表头行建立 年份 ↔ 列号 的双向映射
+
+    表头单元格可以是整数年份（2025），也可以是带后缀的文本（"2025\n（税后）"、"2025\n"），
+    按 (年份, 后缀) 区分，整数年份的后缀为 None。
+    cached_values 的含义与 SheetLabelIndex 相同：公式表头（如 =D.3建设投资分年计划表!E2）取文件中的缓存值
+    """
+
+    def __init__(self, ws, header_row=None, cached_values=None):
+        self._cached_values = cached_values
+        self._cached = None
+        if header_row is None:
+            header_row = self._detect_header_row(ws)
+        self.header_row = header_row
+        self._columns = {}
+        self._years = {}
+        for _, row in self._rows(ws, header_row, header_row):
+            for col, value in enumerate(row, start=1):
+                parsed = self._parse(value)
+                if parsed:
+                    self.add(parsed[0], col, parsed[1])
+
+    def _rows(self, ws, min_row, max_row):
+        """逐行生成 (行号, 各单元格的值)，公式单元格有缓存值时取缓存值"""
+        rows = ws.iter_rows(min_row=min_row, max_row=max_row, values_only=True)
+        for row_idx, row in enumerate(rows, start=min_row):
+            if self._cached_values is not None and any(isinstance(v, str) and v.startswith("=") for v in row):
+                if self._cached is None:
+                    self._cached = self._cached_values()
+                row = [self._cached.get((row_idx, col), value)
+                       if isinstance(value, str) and value.startswith("=") else value
+                       for col, value in enumerate(row, start=1)]
+            yield row_idx, row
+
+    @staticmethod
+    def _parse(value):
+        """解析表头值，返回 (年份, 后缀)；不是年份时返回 None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)) and value == int(value) and 1900 <= value <= 2200:
+            return int(value), None
+        if isinstance(value, str):
+            match = re.match(r'^(\d{4})(.*)$', value, re.S)
+            if match and 1900 <= int(match.group(1)) <= 2200:
+                return int(match.group(1)), match.group(2)
+        return None
+
+    def _detect_header_row(self, ws, max_row=4):
+        """在前几行中选年份最多的一行作为表头（大部分表为第 2 行，E.2/E.3/Ⅲ 等为第 3 行）"""
+        best_row, best_count = 2, 0
+        for row_idx, row in self._rows(ws, 1, max_row):
+            count = sum(1 for value in row if self._parse(value))
+            if count > best_count:
+                best_row, best_count = row_idx, count
+        return best_row
+
+    def add(self, year, column, suffix=None):
+        """登记一个年份列（expand_excel_header 追加年份后调用）"""
+        self._columns.setdefault((year, suffix), column)
+        self._years.setdefault(column, year)
+
+    def column_index(self, year, suffix=None):
+        """年份 → 列号，找不到时返回 None"""
+        return self._columns.get((year, suffix))
+
+    def column(self, year, suffix=None):
+        """年份 → 列字母，找不到时返回 None"""
+        col = self.column_index(year, suffix)
+        return get_column_letter(col) if col else None
+
+    def year(self, column):
+        """列号或列字母 → 年份，不是年份列时返回 None"""
+        if isinstance(column, str):
+            column = column_index_from_string(column)
+        return self._years.get(column)
+
+    def locate(self, year, suffix=None):
+        """与 find_cell(file_path, year, sheet_name) 相同的返回值: (行号, 列字母) 或 (None, None)"""
+        col = self.column(year, suffix)
+        if col is None:
+            return None, None
+        return self.header_row, col
+
+
+class SheetBounds:
+    """
+    工作表已用区域：记录每行、每列中"去掉首尾空白后非空"的单元格数量，
+    最后一行 / 最后一列直接取记录的最大值
+
+    公式单元格按 data_only 语义视为无值（与 openpyxl 保存后的文件一致）
+    """
+
+    def __init__(self, ws):
+        self._cells = set()
+        self._row_counts = Counter()
+        self._col_counts = Counter()
+        self.last_row = 0
+        self.last_column = 0
+        # 会话中的工作簿只遍历已存在的单元格，不会像 iter_rows 那样补出空单元格
+        cells = ws._cells.values() if hasattr(ws, "_cells") else (c for row in ws.iter_rows() for c in row)
+        for cell in cells:
+            if self._is_used(cell.value, cell.data_type):
+                self._add(cell.row, cell.column)
+
+    @staticmethod
+    def _is_used(value, data_type=None):
+        if value is None or data_type == 'f':
+            return False
+        if data_type is None and isinstance(value, str) and value.startswith('='):
+            return False
+        return str(value).strip() != ''
+
+    def _add(self, row, column):
+        self._cells.add((row, column))
+        self._row_counts[row] += 1
+        self._col_counts[column] += 1
+        self.last_row = max(self.last_row, row)
+        self.last_column = max(self.last_column, column)
+
+    def _remove(self, row, column):
+        self._cells.discard((row, column))
+        for counts, key in ((self._row_counts, row), (self._col_counts, column)):
+            counts[key] -= 1
+            if counts[key] <= 0:
+                del counts[key]
+        if row == self.last_row and row not in self._row_counts:
+            self.last_row = max(self._row_counts, default=0)
+        if column == self.last_column and column not in self._col_counts:
+            self.last_column = max(self._col_counts, default=0)
+
+    def update(self, row, column, value):
+        """单元格被改写或清空后增量更新"""
+        used = self._is_used(value)
+        if (row, column) in self._cells and not used:
+            self._remove(row, column)
+        elif (row, column) not in self._cells and used:
+            self._add(row, column)
+
+
+# 文件路径 → ((修改时间, 文件大小), {(工作表名, 键): 对象})
+_file_sheet_caches = {}
+# 会话中的工作表 → ((会话修改次数, 单元格数), {键: 对象})
+_session_sheet_caches = WeakKeyDictionary()
+
+
+def _get_sheet(wb, sheet_name):
+    """sheet_name 可以是工作表名称、工作表序号，或 None（活动工作表）"""
+    if isinstance(sheet_name, int):
+        return wb.worksheets[sheet_name]
+    return wb[sheet_name] if sheet_name else wb.active
+
+
+def _session_stamp(session, ws):
+    return session.generation, len(ws._cells)
+
+
+def _sheet_cache(file_path, sheet_name, key, build):
+    """
+    按工作表缓存由 build(ws) 生成的对象（标签索引、年份轴、已用区域）
+
+    file_path 为 WorkbookSession 时，会话记录新的修改或工作表新增单元格后重建
+    （直接改写内存中已有单元格的调用方需要 save_workbook 或 mark_modified，ExcelAutoFiller / ExcelFormulaGenerator 已处理）；
+    为文件路径时，按文件的修改时间和大小缓存，文件被重新保存后自动失效。
+    """
+    if isinstance(file_path, WorkbookSession):
+        ws = _get_sheet(file_path.wb, sheet_name)
+        stamp = _session_stamp(file_path, ws)
+        cached = _session_sheet_caches.get(ws)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, {})
+            _session_sheet_caches[ws] = cached
+        if key not in cached[1]:
+            cached[1][key] = build(ws)
+        return cached[1][key]
+
+    path = os.path.abspath(os.fspath(file_path))
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _file_sheet_caches.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, {})
+        _file_sheet_caches[path] = cached
+
+    objects = cached[1]
+    if (sheet_name, key) not in objects:
+        wb = load_workbook(path, read_only=True, keep_vba=False)  # 只读、不复制宏，只用于查找
+        try:
+            objects[(sheet_name, key)] = build(_get_sheet(wb, sheet_name))
+        finally:
+            wb.close()
+    return objects[(sheet_name, key)]
+
+
+def _session_sheet_cached(session, ws):
+    """会话中已缓存的工作表对象；增量更新后重新登记时间戳，避免被当作失效"""
+    cached = _session_sheet_caches.get(ws)
+    if cached is None:
+        return {}
+    _session_sheet_caches[ws] = (_session_stamp(session, ws), cached[1])
+    return cached[1]
+
+
+def _file_cached_values(file_path, ws):
+    """
+    读取文件时返回加载该工作表缓存值 {(行号, 列号): 值} 的函数（结果与标签索引等一起缓存，文件修改后失效）；
+    会话中的工作簿返回 None：内存中的公式按 data_only 语义视为没有缓存值
+    """
+    if isinstance(file_path, WorkbookSession):
+        return None
+    path = os.path.abspath(os.fspath(file_path))
+
+    def load():
+        objects = _file_sheet_caches[path][1]
+        key = (ws.title, "cached")
+        if key not in objects:
+            objects[key] = {(row, col): value for row, values in read_cached_rows(path, ws.title)
+                            for col, value in values.items()}
+        return objects[key]
+    return load
+
+
+def get_label_index(file_path, sheet_name=None):
+    """获取工作表的标签索引；读取文件时公式单元格同时按缓存值登记"""
+    return _sheet_cache(file_path, sheet_name, "labels",
+                        lambda ws: SheetLabelIndex(ws, _file_cached_values(file_path, ws)))
+
+
+def get_sheet_bounds(file_path, sheet_name=0):
+    """获取工作表的已用区域（最后一行 / 最后一列）"""
+    return _sheet_cache(file_path, sheet_name, "bounds", SheetBounds)
+
+
+def get_year_axis(file_path, sheet_name, header_row=None):
+    """获取工作表的年份表头轴，header_row 为 None 时自动识别表头行"""
+    return _sheet_cache(file_path, sheet_name, ("years", header_row),
+                        lambda ws: YearAxis(ws, header_row, _file_cached_values(file_path, ws)))
+
+
+def update_year_axis(file_path, sheet_name, header_row, year, column):
+    """
+    expand_excel_header 追加年份后同步年份轴、标签索引和已用区域
+
+    只对 WorkbookSession 生效；文件路径模式下缓存随文件修改时间自动失效
+    """
+    if not isinstance(file_path, WorkbookSession):
+        return
+    ws = file_path.wb[sheet_name]
+    cached = _session_sheet_cached(file_path, ws)
+    for key, obj in cached.items():
+        if isinstance(obj, YearAxis) and obj.header_row == header_row:
+            obj.add(year, column)
+        elif isinstance(obj, (SheetLabelIndex, SheetBounds)):
+            obj.update(header_row, column, year)
+
+
+def _template_anchor(file_path, value, sheet_name):
+    """
+    会话附带的模板分析缓存（template_cache）中记录的锚点坐标 [(行号, 列号), ...]，只供 find_cell 使用
+
+    坐标上的值已经不是 value（模板被改动过）或不是已记录的锚点时返回 None，由调用方回退到标签索引
+    """
+    layout = getattr(file_path, "template_layout", None)
+    if layout is None or not isinstance(sheet_name, str) or sheet_name not in file_path.wb.sheetnames:
+        return None
+    coords = layout.find_all(sheet_name, value)
+    if not coords:
+        return None
+    cells = file_path.wb[sheet_name]._cells
+    for key in coords:
+        cell = cells.get(key)
+        if cell is None or cell.value != value:
+            return None
+    return coords
 
 
 def find_cell(file_path, value ,sheet_name):
@@ -16,29 +358,16 @@ def find_cell(file_path, value ,sheet_name):
     value：特定值
     sheet_name: 工作表名称(可选)
     """
-    # 加载工作簿
-    wb = load_workbook(file_path, read_only=True)  # 使用只读模式提高性能
-
-    if sheet_name:
-        sheet = wb[sheet_name]
+    # 模板中的固定位置直接取分析缓存，其余通过标签索引查找特定值的单元格
+    coords = _template_anchor(file_path, value, sheet_name)
+    if coords:
+        row_number, column_number = coords[0]
     else:
-        sheet = wb.active
-
-    # 查找特定值的单元格
-    for row in sheet.iter_rows():
-        for cell in row:
-            if cell.value == value:
-                # 获取行号和列号
-                row_number = cell.row
-                column_number = cell.column
-                column_letter = get_column_letter(column_number)
+        row_number, column_number = get_label_index(file_path, sheet_name).find_first(value)
+    if row_number is None:
+        return None, None
 
-                wb.close()  # 提前关闭工作簿
-
-                return row_number, column_letter
-
-    wb.close()
-    return None, None
+    return row_number, get_column_letter(column_number)
 
 
 # def find_cell(file_path, value ,sheet_name):
@@ -97,16 +426,9 @@ def find_all_cells(file_path: str,
     找到 Excel 表中**所有**等于给定值的单元格（行号, 列字母）
     返回：[(row1, col1), (row2, col2), ...]
     """
-    wb = load_workbook(file_path, data_only=True)
-    ws = wb[sheet_name] if sheet_name else wb.active
-
-    addresses = []
-    for row in ws.iter_rows():
-        for cell in row:
-            if cell.value == value:
-                addresses.append((cell.row, get_column_letter(cell.column)))
-
-    return addresses
+    # 不使用模板分析缓存：任务中写入的同名单元格只在实时的标签索引中
+    coords = get_label_index(file_path, sheet_name).find_all(value)
+    return [(row, get_column_letter(col)) for row, col in coords]
 
 
 def find_all_coords_co(file_path: str,
@@ -116,15 +438,8 @@ def find_all_coords_co(file_path: str,
     找到 Excel 表中**所有**等于给定值的单元格（行号, 列字母）
     返回：['D4', 'F5', ...]
     """
-    wb = load_workbook(file_path, data_only=True)
-    ws = wb[sheet_name] if sheet_name else wb.active
-
-    coords = []
-    for row in ws.iter_rows():
-        for cell in row:
-            if cell.value == value:
-                coords.append(f"{get_column_letter(cell.column)}{cell.row}")
-    return coords
+    index = get_label_index(file_path, sheet_name)
+    return [f"{get_column_letter(col)}{row}" for row, col in index.find_all(value)]
 
 
 def read_cell_formula(file_path, sheet_name, cell_address):
@@ -194,7 +509,17 @@ def set_cell_value(file_path, row_number, column_number, new_value, sheet_name=N
     col_letter = get_column_letter(column_number)
 
     # 保存文件
-    wb.save(file_path)
+    save_workbook(wb, file_path)
+
+    # 会话模式下增量更新标签索引（文件模式下索引随文件修改时间自动失效）
+    if isinstance(file_path, WorkbookSession):
+        cached = _session_sheet_cached(file_path, sheet)
+        for key in ("labels", "bounds"):
+            if key in cached:
+                cached[key].update(row_number, column_number, new_value)
+        # 改写了表头行时丢弃对应的年份轴，下次查询时重建
+        for key in [k for k, obj in cached.items() if isinstance(obj, YearAxis) and obj.header_row == row_number]:
+            del cached[key]
 
     print(f"成功更新单元格 {col_letter}{row_number} 的值:")
     print(f"旧值: {old_value}")
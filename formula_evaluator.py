@@ -0,0 +1,1315 @@
+import datetime
+import math
+import os
+import re
+import tempfile
+import zipfile
+from functools import lru_cache
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.datetime import to_excel, from_excel
+from openpyxl.worksheet.formula import ArrayFormula
+
+from formula_translator import CELL_REF, NAME_TOKEN, REF_END, SHEET_PREFIX, STRING_LITERAL, parse_cell
+from openpyxl_vba import load_workbook
+from xlsm_splice import sheet_parts
+
+"""
+
+公式计算
+openpyxl 保存后公式单元格没有缓存值，data_only=True 读取时全部是 None，必须用 Excel 打开一次才有数值。
+这里对本项目写入的公式子集（四则运算、比较、SUM/IF/MAX/AVERAGE/VLOOKUP/SUMIF 等、跨表引用）
+建立整个工作簿的依赖图，按拓扑顺序计算，再把结果作为缓存值写回 .xlsm
+
+用法:
+    recalculate_workbook(output_path)      # 计算并写回缓存值
+    values = FormulaEvaluator(wb).evaluate()  # 只计算，返回 {(表名, 行, 列): 值}
+    python formula_evaluator.py [模板.xlsm ...]  # 回归检查：计算结果与 Excel 保存的缓存值一致
+
+"""
+
+
+class ExcelError:
+    """Excel 错误值（#DIV/0!、#VALUE! 等），参与运算时向外传播"""
+    __slots__ = ("code",)
+
+    def __init__(self, code):
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+    __str__ = __repr__
+
+
+DIV0 = ExcelError("#DIV/0!")
+VALUE = ExcelError("#VALUE!")
+REF = ExcelError("#REF!")
+NAME = ExcelError("#NAME?")
+NUM = ExcelError("#NUM!")
+NA = ExcelError("#N/A")
+ERRORS = {e.code: e for e in (DIV0, VALUE, REF, NAME, NUM, NA, ExcelError("#NULL!"))}
+
+
+class CellRange:
+    """区域引用的值：按行排列的二维列表，函数参数中的单个单元格引用也用 1×1 的区域表示"""
+    __slots__ = ("sheet", "min_row", "min_col", "rows")
+
+    def __init__(self, sheet, min_row, min_col, rows):
+        self.sheet = sheet
+        self.min_row = min_row
+        self.min_col = min_col
+        self.rows = rows
+
+    def values(self):
+        for row in self.rows:
+            yield from row
+
+
+# ------------------------------------------------------------------ 词法 / 语法分析
+
+# 字符串、引用和名称的规则与 formula_translator 共用，这里只补充空白、错误值、函数调用和运算符
+_FORMULA_TOKEN = re.compile(
+    rf"""
+    (?P<space>\s+)
+    |(?P<string>{STRING_LITERAL})
+    |(?P<ref>
+        (?:(?P<sheet>{SHEET_PREFIX})!)?
+        (?:(?P<start>{CELL_REF})(?::(?P<end>{CELL_REF}))?{REF_END}|(?P<referr>\#REF!))
+    )
+    |(?P<error>\#DIV/0!|\#VALUE!|\#REF!|\#NAME\?|\#NUM!|\#N/A|\#NULL!)
+    |(?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<func>[A-Za-z_][A-Za-z0-9_.]*)\s*\(
+    |(?P<name>{NAME_TOKEN})
+    |(?P<op><>|<=|>=|[-+*/^&=<>%(),])
+    """,
+    re.VERBOSE,
+)
+
+# 二元运算符优先级（数值越大越先计算）
+_BINARY_PRECEDENCE = {
+    "=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1,
+    "&": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+    "^": 5,
+}
+_UNARY_PRECEDENCE = 6
+
+
+class FormulaSyntaxError(ValueError):
+    pass
+
+
+def _parse_cell(text):
+    cell = parse_cell(text)
+    return cell.row, cell.col
+
+
+def _sheet_name(text):
+    """返回 (外部链接序号或 None, 工作表名)，去掉引号"""
+    if text is None:
+        return None, None
+    if text.startswith("'"):
+        text = text[1:-1].replace("''", "'")
+    link = None
+    if text.startswith("["):
+        index, text = text[1:].split("]", 1)
+        link = int(index)
+    return link, text
+
+
+def _tokenize(formula):
+    tokens = []
+    pos = 0
+    while pos < len(formula):
+        match = _FORMULA_TOKEN.match(formula, pos)
+        if not match:
+            raise FormulaSyntaxError(f"无法识别的公式内容: {formula[pos:]}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        if kind == "ref":
+            link, sheet = _sheet_name(match.group("sheet"))
+            if match.group("referr"):
+                tokens.append(("error", "#REF!"))
+                continue
+            row, col = _parse_cell(match.group("start"))
+            if match.group("end"):
+                end_row, end_col = _parse_cell(match.group("end"))
+                tokens.append(("range", (link, sheet, min(row, end_row), min(col, end_col),
+                                         max(row, end_row), max(col, end_col))))
+            else:
+                tokens.append(("ref", (link, sheet, row, col)))
+        else:
+            tokens.append((kind, match.group(kind)))
+    tokens.append(("end", None))
+    return tokens
+
+
+class _Parser:
+    """
+    把公式解析成由元组组成的语法树:
+    ("num", 1.0) ("str", "a") ("bool", True) ("err", ExcelError) ("missing",)
+    ("ref", 外部链接, 表名, 行, 列) ("range", 外部链接, 表名, 起始行, 起始列, 结束行, 结束列) ("name", 名称)
+    ("neg", x) ("pct", x) ("bin", 运算符, a, b) ("call", 函数名, (参数, ...))
+    表名为 None 时表示公式所在的工作表
+    """
+
+    def __init__(self, formula):
+        self.tokens = _tokenize(formula)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.expression(0)
+        if self.peek()[0] != "end":
+            raise FormulaSyntaxError(f"公式多余内容: {self.peek()[1]}")
+        return node
+
+    def expression(self, min_precedence):
+        node = self.unary()
+        while True:
+            kind, value = self.peek()
+            if kind == "op" and value == "%":
+                self.next()
+                node = ("pct", node)
+                continue
+            precedence = _BINARY_PRECEDENCE.get(value) if kind == "op" else None
+            if precedence is None or precedence <= min_precedence:
+                return node
+            self.next()
+            node = ("bin", value, node, self.expression(precedence))
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == "op" and value in ("-", "+"):
+            self.next()
+            operand = self.expression(_UNARY_PRECEDENCE)
+            return ("neg", operand) if value == "-" else operand
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.next()
+        if kind == "number":
+            return ("num", float(value))
+        if kind == "string":
+            return ("str", value[1:-1].replace('""', '"'))
+        if kind == "error":
+            return ("err", ERRORS[value])
+        if kind == "ref":
+            return ("ref",) + value
+        if kind == "range":
+            return ("range",) + value
+        if kind == "name":
+            upper = value.upper()
+            if upper in ("TRUE", "FALSE"):
+                return ("bool", upper == "TRUE")
+            return ("name", value)
+        if kind == "func":
+            return ("call", value.upper(), self.arguments())
+        if kind == "op" and value == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        raise FormulaSyntaxError(f"公式语法错误: {value}")
+
+    def arguments(self):
+        args = []
+        if self.peek() == ("op", ")"):
+            self.next()
+            return tuple(args)
+        while True:
+            if self.peek()[0] == "op" and self.peek()[1] in (",", ")"):
+                args.append(("missing",))
+            else:
+                args.append(self.expression(0))
+            kind, value = self.next()
+            if value == ")":
+                return tuple(args)
+            if value != ",":
+                raise FormulaSyntaxError(f"函数参数错误: {value}")
+
+    def expect(self, value):
+        if self.next() != ("op", value):
+            raise FormulaSyntaxError(f"缺少 {value}")
+
+
+@lru_cache(maxsize=65536)
+def parse_formula(formula):
+    """解析公式文本（可带开头的 "="），同一个公式只解析一次"""
+    if formula.startswith("="):
+        formula = formula[1:]
+    return _Parser(formula).parse()
+
+
+def _references(node):
+    """语法树中的全部单元格/区域引用节点"""
+    kind = node[0]
+    if kind in ("ref", "range"):
+        yield node
+    elif kind in ("neg", "pct"):
+        yield from _references(node[1])
+    elif kind == "bin":
+        yield from _references(node[2])
+        yield from _references(node[3])
+    elif kind == "call":
+        for arg in node[2]:
+            yield from _references(arg)
+
+
+# ------------------------------------------------------------------ 取值与类型转换
+
+def _to_number(value):
+    """算术运算中的取值：空值为 0，逻辑值为 1/0，数字文本转成数字"""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, ExcelError):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("%")) / (100 if value.strip().endswith("%") else 1)
+        except ValueError:
+            return VALUE
+    return VALUE
+
+
+def _to_bool(value):
+    if isinstance(value, ExcelError):
+        return value
+    if value is None:
+        return False
+    if isinstance(value, str):
+        upper = value.upper()
+        if upper in ("TRUE", "FALSE"):
+            return upper == "TRUE"
+        return VALUE
+    return bool(value)
+
+
+def _to_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _type_rank(value):
+    if isinstance(value, bool):
+        return 2
+    if isinstance(value, str):
+        return 1
+    return 0
+
+
+def _compare(a, b):
+    """按 Excel 规则比较两个值：数字 < 文本 < 逻辑值，文本不区分大小写，空值按对方类型视为 0/""/FALSE"""
+    if a is None:
+        a = "" if isinstance(b, str) else (False if isinstance(b, bool) else 0)
+    if b is None:
+        b = "" if isinstance(a, str) else (False if isinstance(a, bool) else 0)
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if isinstance(a, str):
+        a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+_COMPARISONS = {
+    "=": lambda result: result == 0,
+    "<>": lambda result: result != 0,
+    "<": lambda result: result < 0,
+    ">": lambda result: result > 0,
+    "<=": lambda result: result <= 0,
+    ">=": lambda result: result >= 0,
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _arithmetic(op, a, b):
+    a = _to_number(a)
+    if isinstance(a, ExcelError):
+        return a
+    b = _to_number(b)
+    if isinstance(b, ExcelError):
+        return b
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        return DIV0 if b == 0 else a / b
+    # "^"
+    if a == 0 and b < 0:
+        return DIV0
+    try:
+        result = a ** b
+    except OverflowError:
+        return NUM
+    return NUM if isinstance(result, complex) else result
+
+
+def _numbers(args, strict=True):
+    """
+    展开函数参数中的数字：区域中只取数字（忽略文本、逻辑值和空单元格），
+    直接写在参数里的值按算术规则转换（strict 为 False 时忽略不能转换的值）
+    """
+    for arg in args:
+        if isinstance(arg, CellRange):
+            for value in arg.values():
+                if isinstance(value, ExcelError):
+                    yield value
+                elif _is_number(value):
+                    yield value
+        elif arg is None:
+            continue
+        else:
+            number = _to_number(arg)
+            if isinstance(number, ExcelError) and not strict and number is VALUE:
+                continue
+            yield number
+
+
+def _collect_numbers(args, strict=True):
+    """返回数字列表，遇到错误值时返回该错误"""
+    result = []
+    for number in _numbers(args, strict):
+        if isinstance(number, ExcelError):
+            return number
+        result.append(number)
+    return result
+
+
+_DAY_ZERO = (1900, 1, 0)
+_DATE_PARTS = {"year": 0, "month": 1, "day": 2}
+
+
+def _date_value(value):
+    number = _to_number(value)
+    if isinstance(number, ExcelError):
+        return number
+    if number < 0:
+        return NUM
+    if number < 1:
+        # 0~1 之间（空单元格、纯时间）Excel 视为 1900-01-00，from_excel 会返回 time
+        return _DAY_ZERO
+    return from_excel(number)
+
+
+def _criteria_matcher(criteria):
+    """SUMIF 条件：数字、文本（支持 * ? 通配符）或带 > < >= <= <> = 前缀的表达式"""
+    op = "="
+    operand = criteria
+    if isinstance(criteria, str):
+        match = re.match(r"^(<=|>=|<>|<|>|=)?(.*)$", criteria, re.DOTALL)
+        op = match.group(1) or "="
+        operand = match.group(2)
+        number = _to_number(operand) if operand != "" else VALUE
+        if not isinstance(number, ExcelError):
+            operand = number
+    if isinstance(operand, str):
+        if op in ("=", "<>"):
+            pattern = re.compile(
+                "^" + re.escape(operand).replace(r"\*", ".*").replace(r"\?", ".") + "$",
+                re.IGNORECASE | re.DOTALL,
+            )
+
+            def match_text(value):
+                if operand == "":
+                    matched = value is None or value == ""
+                else:
+                    matched = isinstance(value, str) and bool(pattern.match(value))
+                return matched if op == "=" else not matched
+            return match_text
+    elif operand is None:
+        operand = 0
+
+    def match_value(value):
+        # 类型不同的单元格只有 "<>" 条件成立（空单元格不等于 0，数字条件不匹配文本）
+        same_type = _is_number(value) if _is_number(operand) else isinstance(value, type(operand))
+        if not same_type:
+            return op == "<>"
+        return _COMPARISONS[op](_compare(value, operand))
+    return match_value
+
+
+# ------------------------------------------------------------------ 函数
+
+def _fn_sum(args):
+    numbers = _collect_numbers(args)
+    return numbers if isinstance(numbers, ExcelError) else sum(numbers)
+
+
+def _fn_max(args):
+    numbers = _collect_numbers(args)
+    if isinstance(numbers, ExcelError):
+        return numbers
+    return max(numbers) if numbers else 0
+
+
+def _fn_min(args):
+    numbers = _collect_numbers(args)
+    if isinstance(numbers, ExcelError):
+        return numbers
+    return min(numbers) if numbers else 0
+
+
+def _fn_average(args):
+    numbers = _collect_numbers(args)
+    if isinstance(numbers, ExcelError):
+        return numbers
+    return sum(numbers) / len(numbers) if numbers else DIV0
+
+
+def _fn_count(args):
+    return sum(1 for arg in args for value in (arg.values() if isinstance(arg, CellRange) else [arg])
+               if _is_number(value))
+
+
+def _fn_counta(args):
+    return sum(1 for arg in args for value in (arg.values() if isinstance(arg, CellRange) else [arg])
+               if value is not None)
+
+
+def _scalar_args(function):
+    """把参数中的区域按单值取用（取左上角单元格），用于 ABS、ROUND、YEAR 等单值函数"""
+    def wrapper(args):
+        values = []
+        for arg in args:
+            if isinstance(arg, CellRange):
+                arg = arg.rows[0][0] if len(arg.rows) == 1 and len(arg.rows[0]) == 1 else VALUE
+            values.append(arg)
+        return function(*values)
+    return wrapper
+
+
+def _number_function(function):
+    def wrapper(*values):
+        numbers = [_to_number(value) for value in values]
+        for number in numbers:
+            if isinstance(number, ExcelError):
+                return number
+        return function(*numbers)
+    return wrapper
+
+
+def _round(number, digits=0):
+    factor = 10 ** int(digits)
+    return math.floor(abs(number) * factor + 0.5) / factor * (1 if number >= 0 else -1)
+
+
+def _round_away(number, digits=0):
+    factor = 10 ** int(digits)
+    return math.ceil(abs(number) * factor - 1e-9) / factor * (1 if number >= 0 else -1)
+
+
+def _round_toward(number, digits=0):
+    factor = 10 ** int(digits)
+    return math.floor(abs(number) * factor + 1e-9) / factor * (1 if number >= 0 else -1)
+
+
+def _power(number, exponent):
+    return _arithmetic("^", number, exponent)
+
+
+def _mod(number, divisor):
+    return DIV0 if divisor == 0 else number - divisor * math.floor(number / divisor)
+
+
+def _date(year, month, day):
+    year, month, day = int(year), int(month), int(day)
+    if year < 1900:
+        year += 1900
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    try:
+        date = datetime.datetime(year, month, 1) + datetime.timedelta(days=day - 1)
+    except (ValueError, OverflowError):
+        return NUM
+    return to_excel(date)
+
+
+def _date_part(attribute):
+    def part(value):
+        date = _date_value(value)
+        if isinstance(date, ExcelError):
+            return date
+        if date is _DAY_ZERO:
+            return _DAY_ZERO[_DATE_PARTS[attribute]]
+        return getattr(date, attribute)
+    return part
+
+
+def _fn_npv(args):
+    rate = args[0].rows[0][0] if isinstance(args[0], CellRange) else args[0]
+    rate = _to_number(rate)
+    if isinstance(rate, ExcelError):
+        return rate
+    numbers = _collect_numbers(args[1:])
+    if isinstance(numbers, ExcelError):
+        return numbers
+    if rate == -1:
+        return DIV0
+    return sum(value / (1 + rate) ** (i + 1) for i, value in enumerate(numbers))
+
+
+def _fn_irr(args):
+    numbers = _collect_numbers(args[:1])
+    if isinstance(numbers, ExcelError):
+        return numbers
+    guess = 0.1
+    if len(args) > 1 and args[1] is not None:
+        guess = _to_number(args[1])
+        if isinstance(guess, ExcelError):
+            return guess
+    if not any(value > 0 for value in numbers) or not any(value < 0 for value in numbers):
+        return NUM
+    rate = guess
+    for _ in range(100):
+        if rate <= -1:
+            return NUM
+        try:
+            npv = sum(value / (1 + rate) ** i for i, value in enumerate(numbers))
+            derivative = sum(-i * value / (1 + rate) ** (i + 1) for i, value in enumerate(numbers))
+        except OverflowError:
+            return NUM
+        if derivative == 0:
+            return NUM
+        new_rate = rate - npv / derivative
+        if abs(new_rate - rate) < 1e-10:
+            return new_rate
+        rate = new_rate
+    return NUM
+
+
+def _fn_vlookup(args):
+    if len(args) < 3 or not isinstance(args[1], CellRange):
+        return VALUE
+    lookup, table, col_index = args[0], args[1], args[2]
+    if isinstance(lookup, CellRange):
+        lookup = lookup.rows[0][0]
+    if isinstance(col_index, CellRange):
+        col_index = col_index.rows[0][0]
+    approximate = _to_bool(args[3]) if len(args) > 3 and args[3] is not None else True
+    for value in (lookup, approximate):
+        if isinstance(value, ExcelError):
+            return value
+    col_index = _to_number(col_index)
+    if isinstance(col_index, ExcelError):
+        return col_index
+    col_index = int(col_index)
+    if col_index < 1:
+        return VALUE
+    if col_index > len(table.rows[0]):
+        return REF
+
+    found = None
+    for i, row in enumerate(table.rows):
+        key = row[0]
+        if key is None or _type_rank(key) != _type_rank(lookup):
+            continue
+        result = _compare(key, lookup)
+        if result == 0 and not approximate:
+            found = i
+            break
+        if approximate:
+            if result > 0:
+                break
+            found = i
+    if found is None:
+        return NA
+    return table.rows[found][col_index - 1]
+
+
+def _fn_sumif(args):
+    if len(args) < 2 or not isinstance(args[0], CellRange):
+        return VALUE
+    criteria = args[1].rows[0][0] if isinstance(args[1], CellRange) else args[1]
+    if isinstance(criteria, ExcelError):
+        return criteria
+    sum_range = args[2] if len(args) > 2 and isinstance(args[2], CellRange) else args[0]
+    matcher = _criteria_matcher(criteria)
+    total = 0
+    for r, row in enumerate(args[0].rows):
+        for c, value in enumerate(row):
+            if not matcher(value):
+                continue
+            try:
+                target = sum_range.rows[r][c]
+            except IndexError:
+                continue
+            if isinstance(target, ExcelError):
+                return target
+            if _is_number(target):
+                total += target
+    return total
+
+
+def _logical(combine):
+    def function(args):
+        results = []
+        for arg in args:
+            for value in (arg.values() if isinstance(arg, CellRange) else [arg]):
+                if isinstance(arg, CellRange) and (value is None or isinstance(value, str)):
+                    continue
+                value = _to_bool(value)
+                if isinstance(value, ExcelError):
+                    return value
+                results.append(value)
+        return combine(results) if results else VALUE
+    return function
+
+
+FUNCTIONS = {
+    "SUM": _fn_sum,
+    "MAX": _fn_max,
+    "MIN": _fn_min,
+    "AVERAGE": _fn_average,
+    "COUNT": _fn_count,
+    "COUNTA": _fn_counta,
+    "ABS": _scalar_args(_number_function(abs)),
+    "ROUND": _scalar_args(_number_function(_round)),
+    "ROUNDUP": _scalar_args(_number_function(_round_away)),
+    "ROUNDDOWN": _scalar_args(_number_function(_round_toward)),
+    "INT": _scalar_args(_number_function(math.floor)),
+    "POWER": _scalar_args(_number_function(_power)),
+    "MOD": _scalar_args(_number_function(_mod)),
+    "DATE": _scalar_args(_number_function(_date)),
+    "YEAR": _scalar_args(_date_part("year")),
+    "MONTH": _scalar_args(_date_part("month")),
+    "DAY": _scalar_args(_date_part("day")),
+    "NPV": _fn_npv,
+    "IRR": _fn_irr,
+    "VLOOKUP": _fn_vlookup,
+    "SUMIF": _fn_sumif,
+    "AND": _logical(all),
+    "OR": _logical(any),
+    "NOT": _scalar_args(lambda value: (lambda b: b if isinstance(b, ExcelError) else not b)(_to_bool(value))),
+}
+
+
+# ------------------------------------------------------------------ 工作簿计算
+
+class FormulaEvaluator:
+    """
+    对整个工作簿的公式建立依赖图并按拓扑顺序计算
+
+    values: {(表名, 行, 列): 计算结果}，只包含公式单元格
+    dependents: {单元格: 直接引用它的公式单元格集合}，引用的可以是常量单元格或数组公式覆盖的单元格
+    order: 公式单元格的计算顺序
+    overrides: {(表名, 行, 列): 值}，假设分析时临时替换的单元格值（优先于单元格内容和公式结果）
+    """
+
+    def __init__(self, wb):
+        self.wb = wb
+        self.sheets = {ws.title: ws for ws in wb.worksheets}
+        self.formulas = {}
+        self.array_ranges = {}
+        self.spill_cells = {}
+        self.values = {}
+        self.dependents = {}
+        self.precedents = {}
+        self.order = []
+        self.position = {}
+        self.cyclic = []
+        self.overrides = {}
+        self._build()
+
+    # ---------------------------------------------------------------- 建图
+
+    def _build(self):
+        for ws in self.wb.worksheets:
+            for (row, col), cell in ws._cells.items():
+                if cell.data_type != "f":
+                    continue
+                value = cell.value
+                if isinstance(value, ArrayFormula):
+                    text = value.text
+                    self.array_ranges[(ws.title, row, col)] = value.ref
+                elif isinstance(value, str):
+                    text = value
+                else:
+                    continue
+                try:
+                    tree = parse_formula(text)
+                except (FormulaSyntaxError, KeyError) as e:
+                    print(f"公式解析失败 {ws.title}!{cell.coordinate}: {text} ({e})")
+                    tree = ("err", NAME)
+                self.formulas[(ws.title, row, col)] = tree
+
+        # 数组公式覆盖的其他单元格由左上角的公式计算：计算顺序按左上角单元格排，
+        # 依赖关系仍记在被引用的单元格上，假设分析单独替换其中一格时也能找到下游公式
+        spill_anchor = {}
+        for key, ref in self.array_ranges.items():
+            try:
+                min_col, min_row, max_col, max_row = range_boundaries(ref)
+            except ValueError:
+                continue
+            self.spill_cells[key] = [(key[0], row, col) for row in range(min_row, max_row + 1)
+                                     for col in range(min_col, max_col + 1)]
+            for cell in self.spill_cells[key]:
+                if cell != key:
+                    spill_anchor[cell] = key
+
+        for key, tree in self.formulas.items():
+            cells = set()
+            for node in _references(tree):
+                cells.update(self._node_cells(node, key[0]))
+            self.precedents[key] = {spill_anchor.get(cell, cell) for cell in cells}
+            for cell in cells:
+                self.dependents.setdefault(cell, set()).add(key)
+        self.spill_anchor = spill_anchor
+        self.order, self.cyclic = self._topological_order(self.precedents)
+        self.position = {key: i for i, key in enumerate(self.order)}
+
+    def _node_cells(self, node, current_sheet):
+        """引用节点覆盖的单元格（外部链接引用不在本工作簿内，不产生依赖）"""
+        if node[1] is not None:
+            return []
+        sheet = node[2] or current_sheet
+        if node[0] == "ref":
+            return [(sheet, node[3], node[4])]
+        _, _, _, min_row, min_col, max_row, max_col = node
+        return [(sheet, row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+    def _direct_dependents(self, key):
+        """直接引用 key 的公式；数组公式包括引用其覆盖的任一单元格的公式"""
+        cells = self.spill_cells.get(key)
+        if cells is None:
+            return self.dependents.get(key, ())
+        dependents = set()
+        for cell in cells:
+            dependents.update(self.dependents.get(cell, ()))
+        return dependents
+
+    def _topological_order(self, precedents):
+        pending = {key: sum(1 for cell in cells if cell in self.formulas) for key, cells in precedents.items()}
+        ready = [key for key, count in pending.items() if count == 0]
+        order = []
+        while ready:
+            key = ready.pop()
+            order.append(key)
+            for dependent in self._direct_dependents(key):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        cyclic = [key for key, count in pending.items() if count > 0]
+        return order, cyclic
+
+    # ---------------------------------------------------------------- 计算
+
+    def evaluate(self):
+        """按依赖顺序计算全部公式，返回 {(表名, 行, 列): 值}；循环引用的单元格不计算"""
+        self.values = {}
+        for key in self.order:
+            self._evaluate_cell(key)
+        if self.cyclic:
+            print(f"存在循环引用，{len(self.cyclic)} 个公式单元格未计算")
+        return self.values
+
+    def upstream(self, cells):
+        """计算 cells 需要的全部公式单元格（cells 本身是公式时也包括在内，沿依赖图向上传递）"""
+        needed = set()
+        stack = [self.spill_anchor.get(cell, cell) for cell in cells]
+        while stack:
+            key = stack.pop()
+            if key in needed or key not in self.formulas:
+                continue
+            needed.add(key)
+            stack.extend(self.precedents[key])
+        return needed
+
+    def evaluate_cells(self, cells):
+        """
+        只计算 cells 及其依赖的公式，不计算整个工作簿
+
+        返回:
+            {(表名, 行, 列): 值}，只包含 cells；循环引用中的单元格为 None
+        """
+        needed = [key for key in self.upstream(cells) if key in self.position]
+        needed.sort(key=self.position.get)
+        for key in needed:
+            self._evaluate_cell(key)
+        return {cell: self.cell_value(*cell) for cell in cells}
+
+    def downstream(self, cells):
+        """受 cells 影响的全部公式单元格（沿依赖图向下传递）"""
+        affected = set()
+        stack = list(cells)
+        while stack:
+            for dependent in self._direct_dependents(stack.pop()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        return affected
+
+    def recalculate(self, overrides):
+        """
+        替换部分单元格的值，只按依赖顺序重算受影响的公式
+
+        参数:
+            overrides: {(表名, 行, 列): 新值}，可以是输入单元格，也可以是公式单元格（直接指定结果）
+        返回:
+            {(表名, 行, 列): (原值, 新值)}，只包含值发生变化的单元格；传给 restore 可恢复原状态
+        """
+        changes = {}
+        for key, value in overrides.items():
+            old = self.cell_value(*key)
+            self.overrides[key] = value
+            if old != value:
+                changes[key] = (old, value)
+
+        dirty = [key for key in self.downstream(overrides) if key in self.position and key not in self.overrides]
+        dirty.sort(key=self.position.get)
+        for key in dirty:
+            cells = self.spill_cells.get(key, [key])
+            before = [self.values.get(cell) for cell in cells]
+            self._evaluate_cell(key)
+            for cell, old in zip(cells, before):
+                new = self.values.get(cell)
+                if old != new or type(old) is not type(new):
+                    changes.setdefault(cell, (old, new))
+        return changes
+
+    def restore(self, changes):
+        """撤销 recalculate 的结果，回到替换前的状态"""
+        for key, (old, _) in changes.items():
+            if key in self.overrides:
+                continue
+            self.values[key] = old
+        self.overrides.clear()
+
+    def _evaluate_cell(self, key):
+        sheet, row, col = key
+        try:
+            result = self._eval(self.formulas[key], (sheet, row, col))
+        except (ArithmeticError, ValueError, TypeError, AttributeError, LookupError) as e:
+            print(f"公式计算失败 {sheet}!R{row}C{col}: {e}")
+            result = VALUE
+
+        if key in self.array_ranges:
+            self._spill(key, result)
+            return
+        if isinstance(result, CellRange):
+            result = self._intersect(result, row, col)
+        self.values[key] = 0 if result is None else result
+
+    def _spill(self, key, result):
+        """数组公式：结果区域按位置填到数组公式覆盖的各单元格"""
+        sheet, row, col = key
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(self.array_ranges[key])
+        except ValueError:
+            min_row, min_col, max_row, max_col = row, col, row, col
+        for r in range(min_row, max_row + 1):
+            for c in range(min_col, max_col + 1):
+                if isinstance(result, CellRange):
+                    try:
+                        value = result.rows[r - min_row][c - min_col]
+                    except IndexError:
+                        value = NA
+                else:
+                    value = result
+                self.values[(sheet, r, c)] = 0 if value is None else value
+
+    @staticmethod
+    def _intersect(cell_range, row, col):
+        """公式结果是区域时按 Excel 的隐式交集取值"""
+        rows = cell_range.rows
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        if len(rows) == 1 and cell_range.min_col <= col < cell_range.min_col + len(rows[0]):
+            return rows[0][col - cell_range.min_col]
+        if all(len(r) == 1 for r in rows) and cell_range.min_row <= row < cell_range.min_row + len(rows):
+            return rows[row - cell_range.min_row][0]
+        return VALUE
+
+    def cell_value(self, sheet, row, col):
+        """单元格当前的值：公式单元格取计算结果，其他取单元格内容（日期转成序列号）"""
+        key = (sheet, row, col)
+        if key in self.overrides:
+            return self.overrides[key]
+        if key in self.formulas or key in self.values:
+            return self.values.get(key)
+        ws = self.sheets.get(sheet)
+        if ws is None:
+            return REF
+        cell = ws._cells.get((row, col))
+        if cell is None:
+            return None
+        value = cell.value
+        if hasattr(value, "item"):
+            # pandas 写入的 numpy 数值转成 Python 数值
+            value = value.item()
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)):
+            return to_excel(value)
+        if isinstance(value, str) and value.startswith("#") and value in ERRORS:
+            return ERRORS[value]
+        return value
+
+    def _external_value(self, link, sheet, row, col):
+        """外部链接引用取链接中保存的缓存值"""
+        try:
+            book = self.wb._external_links[link - 1].externalBook
+            sheet_id = book.sheetNames.sheetName.index(sheet)
+        except (IndexError, ValueError, AttributeError):
+            return REF
+        data_set = book.sheetDataSet
+        if data_set is None:
+            return None
+        for sheet_data in data_set.sheetData:
+            if sheet_data.sheetId != sheet_id:
+                continue
+            for ext_row in sheet_data.row:
+                if ext_row.r != row:
+                    continue
+                for ext_cell in ext_row.cell:
+                    ext_row_index, ext_col = _parse_cell(ext_cell.r)
+                    if ext_col != col or ext_cell.v is None:
+                        continue
+                    if ext_cell.t in ("str", "s", "inlineStr"):
+                        return ext_cell.v
+                    if ext_cell.t == "b":
+                        return ext_cell.v in ("1", "true", "TRUE")
+                    if ext_cell.t == "e":
+                        return ERRORS.get(ext_cell.v, VALUE)
+                    return float(ext_cell.v)
+        return None
+
+    def _range_value(self, node, current):
+        _, link, sheet, min_row, min_col, max_row, max_col = node
+        sheet = sheet or current[0]
+        if link is None and sheet not in self.sheets:
+            return REF
+        get = self.cell_value if link is None else (lambda s, r, c: self._external_value(link, s, r, c))
+        rows = [[get(sheet, r, c) for c in range(min_col, max_col + 1)] for r in range(min_row, max_row + 1)]
+        return CellRange(sheet, min_row, min_col, rows)
+
+    def _eval_arg(self, node, current):
+        """函数参数：引用保留为区域（SUM 等按引用规则忽略文本），其余按单值计算"""
+        if node[0] == "ref":
+            _, link, sheet, row, col = node
+            return self._range_value(("range", link, sheet, row, col, row, col), current)
+        if node[0] == "range":
+            return self._range_value(node, current)
+        if node[0] == "missing":
+            return None
+        return self._eval(node, current)
+
+    def _eval(self, node, current):
+        kind = node[0]
+        if kind == "num" or kind == "str" or kind == "bool" or kind == "err":
+            return node[1]
+        if kind == "ref":
+            _, link, sheet, row, col = node
+            if link is not None:
+                return self._external_value(link, sheet, row, col)
+            sheet = sheet or current[0]
+            if sheet not in self.sheets:
+                return REF
+            return self.cell_value(sheet, row, col)
+        if kind == "range":
+            return self._range_value(node, current)
+        if kind == "bin":
+            return self._binary(node[1], self._scalar(node[2], current), self._scalar(node[3], current))
+        if kind == "neg":
+            value = _to_number(self._scalar(node[1], current))
+            return value if isinstance(value, ExcelError) else -value
+        if kind == "pct":
+            value = _to_number(self._scalar(node[1], current))
+            return value if isinstance(value, ExcelError) else value / 100
+        if kind == "call":
+            return self._call(node[1], node[2], current)
+        if kind == "missing":
+            return None
+        return NAME
+
+    def _scalar(self, node, current):
+        value = self._eval(node, current)
+        if isinstance(value, CellRange):
+            value = self._intersect(value, current[1], current[2])
+        return value
+
+    @staticmethod
+    def _binary(op, a, b):
+        for value in (a, b):
+            if isinstance(value, ExcelError):
+                return value
+        if op == "&":
+            return _to_text(a) + _to_text(b)
+        if op in _COMPARISONS:
+            return _COMPARISONS[op](_compare(a, b))
+        return _arithmetic(op, a, b)
+
+    def _call(self, name, args, current):
+        # 需要按条件计算参数或读取引用位置的函数单独处理
+        if name == "IF":
+            if not args or len(args) > 3:
+                return VALUE
+            condition = _to_bool(self._scalar(args[0], current))
+            if isinstance(condition, ExcelError):
+                return condition
+            if condition:
+                return self._scalar(args[1], current) if len(args) > 1 else True
+            return self._scalar(args[2], current) if len(args) > 2 else False
+        if name == "IFERROR":
+            value = self._scalar(args[0], current)
+            return self._scalar(args[1], current) if isinstance(value, ExcelError) else value
+        if name in ("ROW", "COLUMN"):
+            if not args:
+                return current[1] if name == "ROW" else current[2]
+            node = args[0]
+            if node[0] not in ("ref", "range"):
+                return VALUE
+            return node[3] if name == "ROW" else node[4]
+
+        function = FUNCTIONS.get(name)
+        if function is None:
+            return NAME
+        values = [self._eval_arg(arg, current) for arg in args]
+        return function(values)
+
+
+# ------------------------------------------------------------------ 写回缓存值
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_CELL_ELEMENT = re.compile(r'<c r="(?P<ref>[A-Z]+\d+)"(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</c>)', re.DOTALL)
+_TYPE_ATTR = re.compile(r'\s+t="[^"]*"')
+_VALUE_ELEMENT = re.compile(r"<v\s*/>|<v>.*?</v>|<v\s[^>]*>.*?</v>", re.DOTALL)
+
+
+def _cached_value_xml(value):
+    """返回 (单元格 t 属性, <v> 文本)，无法写入时返回 None"""
+    if isinstance(value, ExcelError):
+        return "e", value.code
+    if isinstance(value, bool):
+        return "b", "1" if value else "0"
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+            return "e", NUM.code
+        return None, repr(float(value)) if isinstance(value, float) else str(int(value))
+    if isinstance(value, str):
+        return "str", escape(value)
+    return None
+
+
+def _apply_cached_values(xml, cell_values):
+    """把 {"D5": 值} 写进工作表 XML 中对应单元格的 <v>"""
+    def replace(match):
+        ref = match.group("ref")
+        if ref not in cell_values:
+            return match.group(0)
+        cached = _cached_value_xml(cell_values[ref])
+        if cached is None:
+            return match.group(0)
+        data_type, text = cached
+        body = match.group("body") or ""
+        if "<is>" in body:
+            return match.group(0)
+        attrs = _TYPE_ATTR.sub("", match.group("attrs"))
+        if data_type:
+            attrs += f' t="{data_type}"'
+        body = _VALUE_ELEMENT.sub("", body) + f"<v>{text}</v>"
+        return f'<c r="{ref}"{attrs}>{body}</c>'
+
+    return _CELL_ELEMENT.sub(replace, xml)
+
+
+def _shared_strings(archive):
+    """共享字符串表，富文本按各段文字拼接（不含注音）"""
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    for item in ElementTree.fromstring(archive.read("xl/sharedStrings.xml")).iter(f"{{{_MAIN_NS}}}si"):
+        texts = [item.find(f"{{{_MAIN_NS}}}t")] + [run.find(f"{{{_MAIN_NS}}}t") for run in item.iter(f"{{{_MAIN_NS}}}r")]
+        strings.append("".join(t.text or "" for t in texts if t is not None))
+    return strings
+
+
+def _cell_cached_value(cell, shared_strings):
+    """单元格 XML 中的缓存值，与 openpyxl data_only 读取的类型一致（日期保持序列号）"""
+    data_type = cell.get("t", "n")
+    if data_type == "inlineStr":
+        inline = cell.find(f"{{{_MAIN_NS}}}is")
+        return "".join(t.text or "" for t in inline.iter(f"{{{_MAIN_NS}}}t")) if inline is not None else None
+    value = cell.find(f"{{{_MAIN_NS}}}v")
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if data_type == "s":
+        return shared_strings[int(text)]
+    if data_type in ("str", "e"):
+        return text
+    if data_type == "b":
+        return text == "1"
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def read_cached_rows(file_path, sheet_name):
+    """
+    流式读取已保存文件中一个工作表各单元格的缓存值（公式取上次计算的结果），
+    只解析该工作表的 XML 和共享字符串表，不加载整个工作簿
+    参数:
+        file_path: 文件路径或 WorkbookSession（读取磁盘上的文件）
+        sheet_name: 工作表名称
+    返回:
+        逐行生成 (行号, {列号: 值})，空单元格不包含在内
+    """
+    row_tag = f"{{{_MAIN_NS}}}row"
+    cell_tag = f"{{{_MAIN_NS}}}c"
+    with zipfile.ZipFile(os.fspath(file_path)) as archive:
+        parts = sheet_parts(archive)
+        if sheet_name not in parts:
+            raise KeyError(f"工作表不存在: {sheet_name}")
+        shared_strings = _shared_strings(archive)
+        with archive.open(parts[sheet_name]) as part:
+            row_num = 0
+            for _, element in ElementTree.iterparse(part):
+                if element.tag != row_tag:
+                    continue
+                row_num = int(element.get("r", row_num + 1))
+                values = {}
+                col = 0
+                for cell in element.iter(cell_tag):
+                    reference = cell.get("r")
+                    col = _parse_cell(reference)[1] if reference else col + 1
+                    value = _cell_cached_value(cell, shared_strings)
+                    if value is not None:
+                        values[col] = value
+                element.clear()
+                yield row_num, values
+
+
+def write_cached_values(file_path, values):
+    """
+    把计算结果作为缓存值写进已保存的 .xlsx/.xlsm（只改动工作表 XML 中的 <v>，宏和其他部件原样保留）
+    参数:
+        file_path: 文件路径
+        values: {(表名, 行, 列): 值}
+    返回:
+        写入的单元格数量
+    """
+    by_sheet = {}
+    for (sheet, row, col), value in values.items():
+        by_sheet.setdefault(sheet, {})[f"{get_column_letter(col)}{row}"] = value
+
+    file_path = os.fspath(file_path)
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(file_path)[1], dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(file_path) as source, zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as target:
+            parts = {part: by_sheet[name] for name, part in sheet_parts(source).items() if name in by_sheet}
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename in parts:
+                    data = _apply_cached_values(data.decode("utf-8"), parts[item.filename]).encode("utf-8")
+                target.writestr(item, data)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return sum(len(cells) for cells in by_sheet.values())
+
+
+def recalculate_workbook(file_path):
+    """
+    计算工作簿中的全部公式，并把结果作为缓存值写回文件，
+    之后 data_only=True 读取（find_all_cells、校验等）不需要经过 Excel 也能拿到数值
+
+    参数:
+        file_path: 文件路径或 WorkbookSession（会话需先 save，计算使用内存中的工作簿）
+    返回:
+        写入缓存值的单元格数量，失败时返回 0
+    """
+    try:
+        wb = load_workbook(file_path)
+        values = FormulaEvaluator(wb).evaluate()
+        count = write_cached_values(file_path, values)
+        print(f"公式计算完成，已写入 {count} 个单元格的缓存值")
+        return count
+    except Exception as e:
+        print(f"公式计算失败，未写入缓存值: {e}")
+        return 0
+
+
+def values_match(expected, actual, rel_tol=1e-9, abs_tol=1e-9):
+    """
+    两个单元格值是否相同：数值按相对误差比较（运算顺序不同带来的浮点误差不算不同），
+    错误值按错误码比较（缓存值中的错误是 "#DIV/0!" 形式的文本），空值与空文本相同
+    """
+    if isinstance(expected, ExcelError) or isinstance(actual, ExcelError):
+        return str(expected) == str(actual)
+    if _is_number(expected) and _is_number(actual):
+        return math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=abs_tol)
+    if expected in (None, "") and actual in (None, ""):
+        return True
+    return type(expected) is type(actual) and expected == actual
+
+
+def check_cached_values(file_path):
+    """
+    回归检查：计算由 Excel 保存过的文件中的全部公式，与文件中的缓存值（Excel 的计算结果）比较
+    返回不一致的单元格 [(表名, 地址, 缓存值, 计算值), ...]；循环引用的单元格不参与比较
+    """
+    wb = load_workbook(file_path)
+    values = FormulaEvaluator(wb).evaluate()
+    mismatches = []
+    for sheet_name in wb.sheetnames:
+        cached = dict(read_cached_rows(file_path, sheet_name))
+        for (sheet, row, col), value in values.items():
+            if sheet != sheet_name:
+                continue
+            expected = cached.get(row, {}).get(col)
+            if not values_match(expected, value):
+                mismatches.append((sheet, f"{get_column_letter(col)}{row}", expected, value))
+    return mismatches
+
+
+if __name__ == "__main__":
+    # 用仓库中的模板（由 Excel 保存，带缓存值）检查计算结果
+    import glob
+    import sys
+
+    templates = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.xlsm")))
+    failed = False
+    for template in templates:
+        mismatches = check_cached_values(template)
+        print(f"{os.path.basename(template)}: {len(mismatches)} 个单元格与 Excel 的计算结果不一致")
+        for mismatch in mismatches[:20]:
+            print("   ", mismatch)
+        failed = failed or bool(mismatches)
+    sys.exit(1 if failed else 0)
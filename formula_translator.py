@@ -0,0 +1,191 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from openpyxl.utils import get_column_letter, column_index_from_string
+
+
+# 词法片段，formula_evaluator 的公式词法分析共用同一套规则
+SHEET_CHARS = r"\w.\u3000-\u303f\uff00-\uffef"  # 字母数字、点号、中文标点和全角括号
+CELL_REF = r"\$?[A-Za-z]{1,3}\$?\d+"
+# 工作表前缀（不含 "!"）：带引号，或不带引号（可带外部链接序号 [1]）
+SHEET_PREFIX = rf"'(?:[^']|'')+'|(?:\[\d+\])?[^\W\d][{SHEET_CHARS}]*"
+# 引用之后不能紧跟名称字符、"(" 或 "!"，否则是函数名（LOG10(）或工作表名的一部分
+REF_END = rf"(?![{SHEET_CHARS}(!])"
+STRING_LITERAL = r'"(?:[^"]|"")*"'
+NAME_TOKEN = rf"[^\W\d][{SHEET_CHARS}]*"
+
+# 词法规则：字符串常量、数字、单元格/区域引用（可带工作表前缀）、函数名或名称、其他单个字符
+# 函数名（如 LOG10、ATAN2）整体作为名称处理，不会被当作单元格引用
+_TOKEN_PATTERN = re.compile(
+    rf"""
+    (?P<string>{STRING_LITERAL})
+    |
+    (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?%?)
+    |
+    (?P<ref>
+        (?:(?P<sheet>{SHEET_PREFIX})!)?                          # 工作表前缀（带引号或不带引号）
+        (?P<start>{CELL_REF})                                    # 起始单元格
+        (?::(?P<end>{CELL_REF}))?                                # 区域结束单元格（可选）
+    ){REF_END}
+    |
+    (?P<name>{NAME_TOKEN})
+    |
+    (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_CELL_PATTERN = re.compile(r"^(\$?)([A-Za-z]{1,3})(\$?)(\d+)$")
+
+
+class CellRef(NamedTuple):
+    """单个单元格地址：行号、列号以及行/列是否为绝对引用"""
+    row: int
+    col: int
+    row_abs: bool
+    col_abs: bool
+
+    def shift(self, row_offset, col_offset, shift_absolute=False):
+        new_row = self.row if (self.row_abs and not shift_absolute) else self.row + row_offset
+        new_col = self.col if (self.col_abs and not shift_absolute) else self.col + col_offset
+        return CellRef(max(1, new_row), max(1, new_col), self.row_abs, self.col_abs)
+
+    def render(self):
+        return f"{'$' if self.col_abs else ''}{get_column_letter(self.col)}{'$' if self.row_abs else ''}{self.row}"
+
+
+class RefToken(NamedTuple):
+    """公式中的一个引用：原样保留的工作表前缀（含 "!"）、起始单元格、区域结束单元格"""
+    sheet_prefix: str
+    start: CellRef
+    end: Optional[CellRef]
+
+
+@lru_cache(maxsize=None)
+def parse_cell(ref):
+    """解析 "$D$5" 形式的单元格地址，不是单元格地址时返回 None"""
+    parts = _CELL_PATTERN.match(ref)
+    if not parts:
+        return None
+    col = column_index_from_string(parts.group(2).upper())
+    return CellRef(int(parts.group(4)), col, bool(parts.group(3)), bool(parts.group(1)))
+
+
+@lru_cache(maxsize=4096)
+def tokenize_formula(formula) -> Tuple:
+    """
+    把公式拆成 文本片段 和 RefToken 组成的元组（相邻文本已合并），同一个公式只解析一次
+
+    支持带引号的中文工作表名（'b利润与利润分配表（损益和利润分配表）'!D5）、
+    不带引号的工作表名（C.1项目融资信息!D4）、区域引用（D5:AA5）和绝对引用（$D$4）
+    """
+    tokens = []
+    text = []
+    for match in _TOKEN_PATTERN.finditer(formula):
+        if match.lastgroup != "ref":
+            text.append(match.group())
+            continue
+        start = parse_cell(match.group("start"))
+        end = parse_cell(match.group("end")) if match.group("end") else None
+        if start is None or (match.group("end") and end is None) or start.col > 16384:
+            text.append(match.group())
+            continue
+        if text:
+            tokens.append("".join(text))
+            text = []
+        sheet = match.group("sheet")
+        tokens.append(RefToken(f"{sheet}!" if sheet else "", start, end))
+    if text:
+        tokens.append("".join(text))
+    return tuple(tokens)
+
+
+def _render(tokens, row_offset, col_offset, shift_absolute=False, quote_sheets=False):
+    parts = []
+    for token in tokens:
+        if isinstance(token, str):
+            parts.append(token)
+            continue
+        ref = token.start.shift(row_offset, col_offset, shift_absolute).render()
+        if token.end is not None:
+            ref += ":" + token.end.shift(row_offset, col_offset, shift_absolute).render()
+        sheet_prefix = token.sheet_prefix
+        if quote_sheets and sheet_prefix and not sheet_prefix.startswith("'"):
+            sheet_prefix = f"'{sheet_prefix[:-1]}'!"
+        parts.append(sheet_prefix + ref)
+    return "".join(parts)
+
+
+@lru_cache(maxsize=65536)
+def translate_formula(formula, row_offset, col_offset, quote_sheets=False):
+    """
+    把公式整体平移 row_offset 行、col_offset 列（与 Excel 复制粘贴公式相同）
+
+    相对引用按偏移量移动，带 $ 的行/列保持不变，移出表格左上边界时停在第 1 行/第 1 列；
+    quote_sheets 为 True 时工作表名统一加单引号（'C.1项目融资信息'!D4）
+    """
+    if not row_offset and not col_offset and not quote_sheets:
+        return formula
+    return _render(tokenize_formula(formula), row_offset, col_offset, quote_sheets=quote_sheets)
+
+
+@lru_cache(maxsize=65536)
+def shift_reference(ref, row_offset, col_offset, shift_absolute=False):
+    """
+    平移单个单元格或区域地址（如 "F4"、"$D$4"、"F4:F24"、"Sheet1!D4"）
+
+    shift_absolute 为 True 时带 $ 的行/列也一起移动（$ 符号保留）
+    """
+    return _render(tokenize_formula(ref), row_offset, col_offset, shift_absolute)
+
+
+@lru_cache(maxsize=4096)
+def to_r1c1(formula, base_row, base_col, quote_sheets=False):
+    """
+    把 (base_row, base_col) 单元格中的公式转成 R1C1 相对形式
+
+    相对的行/列记录为相对 base 单元格的偏移量，带 $ 的记录绝对值；
+    同一个源公式横向广播到多列时只需要转换一次，再用 render_r1c1 逐个目标单元格拼出 A1 文本
+    """
+    parts = []
+    for token in tokenize_formula(formula):
+        if isinstance(token, str):
+            parts.append(token)
+            continue
+        sheet_prefix = token.sheet_prefix
+        if quote_sheets and sheet_prefix and not sheet_prefix.startswith("'"):
+            sheet_prefix = f"'{sheet_prefix[:-1]}'!"
+        cells = tuple(
+            (ref.row if ref.row_abs else ref.row - base_row, ref.row_abs,
+             ref.col if ref.col_abs else ref.col - base_col, ref.col_abs)
+            for ref in (token.start, token.end) if ref is not None
+        )
+        parts.append((sheet_prefix, cells))
+    return tuple(parts)
+
+
+def render_r1c1(r1c1, row, col):
+    """把 to_r1c1 的结果放到 (row, col) 单元格，拼出 A1 形式的公式文本"""
+    parts = []
+    for part in r1c1:
+        if isinstance(part, str):
+            parts.append(part)
+            continue
+        sheet_prefix, cells = part
+        refs = []
+        for row_val, row_abs, col_val, col_abs in cells:
+            ref_row = row_val if row_abs else max(1, row + row_val)
+            ref_col = col_val if col_abs else max(1, col + col_val)
+            refs.append(f"{'$' if col_abs else ''}{get_column_letter(ref_col)}{'$' if row_abs else ''}{ref_row}")
+        parts.append(sheet_prefix + ":".join(refs))
+    return "".join(parts)
+
+
+def shift_reference_series(ref, row_step, col_step, count, shift_absolute=False):
+    """
+    一次生成 ref 按 (row_step, col_step) 连续平移 0..count-1 次的全部地址
+
+    ref 只解析一次，每次平移只做整数运算，用于公式生成器的循环展开
+    """
+    tokens = tokenize_formula(ref)
+    return [_render(tokens, row_step * i, col_step * i, shift_absolute) for i in range(count)]
@@ -1,9 +1,12 @@
 from openpyxl.formatting.formatting import ConditionalFormattingList
 from openpyxl.worksheet.datavalidation import DataValidationList
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.dimensions import DimensionHolder
 
 from circulate_formula import ExcelFormulaGenerator
+from formula_translator import translate_formula
 import datetime
-from findAndSet import find_cell, find_all_cells, find_all_coords_co
+from findAndSet import find_cell, find_all_cells, find_all_coords_co, get_year_axis
 import re
 from copy import copy
 from openpyxl.utils import get_column_letter, column_index_from_string
@@ -12,7 +15,8 @@ import os
 from loan_function import repay_method_cal
 import string
 from typing import List, Dict, Any
-from openpyxl_vba import load_workbook
+from openpyxl_vba import load_workbook, save_workbook
+from project_calendar import get_project_calendar
 
 def right_n_cells(addr: str, n: int) -> str:
     """
@@ -172,53 +176,50 @@ def excel_date_to_year(excel_dates):
 
 
 def struct_years(file_path, table_b_sheet):
-    # 建设期的时间范围
-    start_value = "建设开始年月"
-    end_value = "建设完成年月"
-    # 加载工作簿
-    wb = load_workbook(file_path)
-    ws = wb[table_b_sheet]
-
-    start_years_address = find_all_cells(file_path, start_value, table_b_sheet)  # [(row1, col1), (row2, col2), ...]
-    end_years_address = find_all_cells(file_path, end_value, table_b_sheet)  # [(row1, col1), (row2, col2), ...]
-    # 建设期开始年月单元格地址列表
-    start = []
-    start_years = []
-    # 建设期完成年月单元格地址列表
-    end = []
-    end_years = []
-    for start_year_address in start_years_address:
-        start.append(right_n_cells(start_year_address[1] + str(start_year_address[0]), 2))
-    for end_year_address in end_years_address:
-        end.append(right_n_cells(end_year_address[1] + str(end_year_address[0]), 2))
-    # 根据单元格地址求出其值所代表的年份
-    print("start:", start)
-    print("end:", end)
-    # 遍历所有单元格地址
-    for cell_address in start:
-        # 获取单元格值
-        cell = ws[cell_address]
-        start_years.append(cell.value)
-
-    for cell_address in end:
-        # 获取单元格值
-        cell = ws[cell_address]
-        end_years.append(cell.value)
-
-    start_years = excel_date_to_year(start_years)
-    end_years = excel_date_to_year(end_years)
-
-    print("start_years:", start_years)
-    print("end_years:", end_years)
-
-    # 找出最大与最小的区间
-    min_year = min(start_years)
-    max_year = max(end_years)
-
-    return min_year, max_year
-
-
-def write_loan(loan, file_path):
+    """建设期的时间范围：(最早的建设开始年份, 最晚的建设完成年份)，取自项目日历"""
+    calendar = get_project_calendar(file_path, table_b_sheet)
+    return calendar.construction_start, calendar.construction_end
+
+
+def draw_cell(file_path, loan_id, start_year):
+    """C.2表中第 loan_id 笔借款开始年份的提款额单元格地址（如 "C3"），以后各年依次向右"""
+    C_2_sheet_name = "C.2项目每年借款信息"
+    # **************************************** 此处修改 *********************************************
+    # C_2_start_year = str(start_year) + "（万元）"
+    _, C_2_col = find_cell(file_path, start_year, C_2_sheet_name)
+    # 与C.1表类似，表示在C.2表中，到第一笔借款需要向下偏移几行
+    r, _ = find_cell(file_path, "序号", C_2_sheet_name)
+    return C_2_col + str(loan_id + r)
+
+
+def fee_rate_cells(file_path):
+    """
+    A财务假设 中的费率单元格（绝对地址）
+    返回 (债券还本付息兑付手续费率, 债券发行登记服务费率, 5年期及以上债券发行手续费率)
+    """
+    repay_sheet = "A财务假设"
+    repay_rates_row, repay_rates_col = find_cell(file_path, "债券还本付息兑付手续费率", repay_sheet)
+    repay_rates_addr = right_n_cells(f"{repay_rates_col}{repay_rates_row}", 2)
+
+    # **************************************** 此处修改 *********************************************
+    # bond_value2 = "5年期及以上债券发行手续费率"
+    bond_rates_row, bond_rates_col = find_cell(file_path, "债券发行登记服务费率", repay_sheet)
+    bond_rates_row2, bond_rates_col2 = find_cell(file_path, "5年期及以上债券发行手续费为发行额的0.08%", repay_sheet)
+    bond_rates_addr = right_n_cells(f"{bond_rates_col}{bond_rates_row}", 2)
+    bond_rates_addr2 = right_n_cells(f"{bond_rates_col2}{bond_rates_row2}", 1)
+    return (to_absolute_address(repay_rates_addr), to_absolute_address(bond_rates_addr),
+            to_absolute_address(bond_rates_addr2))
+
+
+def write_loan(loan, file_path, target_sheet=None, row_offset=0):
+    """
+    写入一笔借款的还本付息公式
+    :param loan: read_financing_info 得到的借款信息
+    :param file_path: 文件路径或 WorkbookSession
+    :param target_sheet: 为空时写入以借款名称命名的单独工作表；
+                         给出时直接写进该表（表c）中本笔借款的位置，公式按 row_offset 整体下移
+    :param row_offset: 本笔借款在 target_sheet 中相对单独工作表的行偏移
+    """
     # Excel 日期序列号
     start_sn = loan['开始时间']
     end_sn = loan['结束时间']
@@ -249,8 +250,8 @@ def write_loan(loan, file_path):
     # 还款方式,通过传入loan作为参数，然后从loan中获取
     repayment_method = loan['还款方式']
 
-    # 通过起始年份寻找到第一个填充的单元格的地址
-    row, col = find_cell(file_path, start_year, sheet_name)
+    # 通过起始年份寻找到第一个填充的单元格的地址（表c与单独工作表的年份列相同）
+    row, col = get_year_axis(file_path, target_sheet or sheet_name).locate(start_year)
 
     # C.1表的起始位置 ,本方法内部循环的参数，每次循环向下位移1
     shift = loan['序号']
@@ -261,13 +262,7 @@ def write_loan(loan, file_path):
 
     # C.2表的起始位置,本方法内部循环的参数，每次循环向下位移1
     C_2_sheet_name = "C.2项目每年借款信息"
-    # **************************************** 此处修改 *********************************************
-    # C_2_start_year = str(start_year) + "（万元）"
-    C_2_start_year = start_year
-    C_2_row, C_2_col = find_cell(file_path, C_2_start_year, C_2_sheet_name)
-    # 此处的 2 与C.1表中的类似，表示在C.2表中，到第一笔借款需要向下偏移几行，本方法所使用的模板中未去掉了第一行的表名行，向下偏移2
-    r, _ = find_cell(file_path, "序号", C_2_sheet_name)
-    C_2 = C_2_col + str(shift + r)
+    C_2 = draw_cell(file_path, shift, start_year)
 
     # 还本位移,通过传入loan作为参数，然后从loan中提取计算
     # delta_year = end_year - start_year        # 整数年差
@@ -275,40 +270,24 @@ def write_loan(loan, file_path):
     target = right_n_cells(origin, delta_year)
     print(target)  # -> I5
 
-    # 还本付息兑付手续费率
-    repay_value = "债券还本付息兑付手续费率"
+    # 还本付息兑付手续费率、债券发行登记服务费率、债券发行手续费率
     repay_sheet = "A财务假设"
-    repay_rates_row, repay_rates_col = find_cell(file_path, repay_value, repay_sheet)
-    repay_rates_addr = right_n_cells(f"{repay_rates_col}{repay_rates_row}", 2)
-    repay_rates_addr = to_absolute_address(repay_rates_addr)
-
-    # 债券发行及服务费费率
-    bond_value = "债券发行登记服务费率"
-    # **************************************** 此处修改 *********************************************
-    # bond_value2 = "5年期及以上债券发行手续费率"
-    bond_value2 = "5年期及以上债券发行手续费为发行额的0.08%"
-    bond_sheet = "A财务假设"
-    bond_rates_row, bond_rates_col = find_cell(file_path, bond_value, bond_sheet)
-    bond_rates_row2, bond_rates_col2 = find_cell(file_path, bond_value2, bond_sheet)
-    bond_rates_addr = right_n_cells(f"{bond_rates_col}{bond_rates_row}", 2)
-    # bond_rates_addr2 = right_n_cells(f"{bond_rates_col2}{bond_rates_row2}", 2)
-    # **************************************** 此处修改 *********************************************
-    bond_rates_addr2 = right_n_cells(f"{bond_rates_col2}{bond_rates_row2}", 1)
-    bond_rates_addr = to_absolute_address(bond_rates_addr)
-    bond_rates_addr2 = to_absolute_address(bond_rates_addr2)
+    repay_rates_addr, bond_rates_addr, bond_rates_addr2 = fee_rate_cells(file_path)
 
     # 建设期应付利息 获得建设期的起始和结束年份
     table_B_sheet = "B项目信息"
     table_c_sheet = "c借款还本付息计划表"
     start_year, end_year = struct_years(file_path, table_B_sheet)
     print("建设期的区间为：", start_year, "-", end_year)
-    _, c1 = find_cell(file_path, start_year, table_c_sheet)
-    _, c2 = find_cell(file_path, end_year, table_c_sheet)
+    _, c1 = get_year_axis(file_path, table_c_sheet).locate(start_year)
+    _, c2 = get_year_axis(file_path, table_c_sheet).locate(end_year)
 
     # 初始化公式生成器（输入输出为同一个文件）
     formula_generator = ExcelFormulaGenerator(
         data_file=file_path,  # 包含所有数据的单一文件
-        output_file=file_path  # 输出到同一个文件
+        output_file=file_path,  # 输出到同一个文件
+        # 下面的配置按单独工作表的行号编写，直接写入表c时整体下移到本笔借款的位置
+        sheet_map={sheet_name: (target_sheet, row_offset)} if target_sheet else None
     )
 
     # 还款方式：到期一次性还清
@@ -799,15 +778,7 @@ def _copy_and_delete_in_same_file(file_path, target_sheet_name,
 
     if target_sheet_name in wb.sheetnames:
         tgt_sheet = wb[target_sheet_name]
-        merged_ranges = list(tgt_sheet.merged_cells.ranges)
-        for merged_range in merged_ranges:
-            try:
-                tgt_sheet.unmerge_cells(str(merged_range))
-            except KeyError as e:
-                # 如果遇到不存在的单元格，跳过并继续
-                print(f"跳过不存在的合并单元格: {merged_range}, 错误: {e}")
-                continue
-        tgt_sheet.delete_rows(1, tgt_sheet.max_row)
+        reset_sheet_contents(tgt_sheet)
 
     else:
         tgt_sheet = wb.create_sheet(title=target_sheet_name)
@@ -837,7 +808,7 @@ def _copy_and_delete_in_same_file(file_path, target_sheet_name,
     delete_count = _delete_processed_sheets(wb, sheets_to_process)
 
     # 保存工作簿
-    wb.save(file_path)
+    save_workbook(wb, file_path)
     print(f"\n操作完成！数据已复制到 {file_path} 的 [{target_sheet_name}] sheet")
     print(f"共处理 {len(sheets_to_process)} 个sheet，删除 {delete_count} 个sheet")
 
@@ -878,7 +849,7 @@ def _copy_and_delete_in_different_files(source_file, target_file, target_sheet_n
     # adjust_column_width(tgt_sheet)
 
     # 保存目标工作簿
-    tgt_wb.save(target_file)
+    save_workbook(tgt_wb, target_file)
     print(f"\n操作完成！数据已复制到 {target_file} 的 [{target_sheet_name}] sheet")
     print(f"共处理 {len(sheets_to_process)} 个sheet")
 
@@ -887,43 +858,75 @@ def _copy_and_delete_in_different_files(source_file, target_file, target_sheet_n
 
     # 保存修改后的源工作簿
     if delete_count > 0:
-        src_wb.save(source_file)
+        save_workbook(src_wb, source_file)
         print(f"\n已从源文件删除 {delete_count} 个sheet，源文件已更新")
     else:
         print("\n没有删除任何sheet")
 
 
+def reset_sheet_contents(sheet):
+    """
+    清空工作表内容：单元格、合并区域、行高、条件格式直接换成空的，不逐个拆分合并区域、不整行删除移动单元格
+    列宽、视图、页面设置、数据验证等工作表级设置保留
+    """
+    sheet._cells = {}
+    sheet._current_row = 0
+    sheet.merged_cells = MultiCellRange()
+    sheet.row_dimensions = DimensionHolder(worksheet=sheet, default_factory=sheet._add_row)
+    sheet.conditional_formatting = ConditionalFormattingList()
+
+
 def _copy_sheet_content(source_sheet, target_sheet, preserve_formulas, include_header=True):
-    """复制工作表内容并调整公式引用"""
+    """
+    复制工作表内容并调整公式引用
+
+    写入位置由本函数自己记录（不在每一行重新计算 target_sheet.max_row），合并多张借款表时耗时与总行数成正比；
+    同一工作簿内复制时直接复用源单元格的样式下标，不再逐个复制字体、边框等样式对象
+    """
     start_row = 1 if include_header else 2
     row_count = 0
 
+    # 目标表当前最后一行，之后每复制一行向下移动一行
+    cursor = target_sheet.max_row
     # 计算行偏移量（目标表当前行与源表起始行之间的差值）
-    row_offset = target_sheet.max_row - start_row + 1
+    row_offset = cursor - start_row + 1
 
-    for source_row_idx, row in enumerate(source_sheet.iter_rows(min_row=start_row), start_row):
-        # 目标行位置
-        target_row_idx = target_sheet.max_row + 1
+    same_workbook = source_sheet.parent is target_sheet.parent
+    # 源样式 → 目标单元格的样式（只复制字体、边框、填充、数字格式、对齐，与逐个复制样式对象的结果相同）
+    styles = {}
 
+    for row in source_sheet.iter_rows(min_row=start_row):
+        cursor += 1
         for col_idx, cell in enumerate(row, 1):
-            new_cell = target_sheet.cell(row=target_row_idx, column=col_idx)
+            new_cell = target_sheet.cell(row=cursor, column=col_idx)
 
             if preserve_formulas and cell.data_type == 'f':
-                # 获取公式并调整相对引用
-                formula = cell.value
-                adjusted_formula = adjust_formula_references(formula, row_offset)
-                new_cell.value = adjusted_formula
+                # 获取公式并调整相对引用（同一张表的偏移量相同，相同公式只解析一次）
+                new_cell.value = adjust_formula_references(cell.value, row_offset)
             else:
                 # 复制值
                 new_cell.value = cell.value
 
             # 可选：复制样式
             if cell.has_style:
-                new_cell.font = copy(cell.font)
-                new_cell.border = copy(cell.border)
-                new_cell.fill = copy(cell.fill)
-                new_cell.number_format = cell.number_format
-                new_cell.alignment = copy(cell.alignment)
+                key = tuple(cell._style)
+                style = styles.get(key)
+                if style is None:
+                    if same_workbook:
+                        style = copy(cell._style)
+                        style.protectionId = 0
+                        style.pivotButton = 0
+                        style.quotePrefix = 0
+                        style.xfId = 0
+                    else:
+                        new_cell.font = copy(cell.font)
+                        new_cell.border = copy(cell.border)
+                        new_cell.fill = copy(cell.fill)
+                        new_cell.number_format = cell.number_format
+                        new_cell.alignment = copy(cell.alignment)
+                        style = new_cell._style
+                    styles[key] = style
+                new_cell._style = copy(style)
 
         row_count += 1
 
@@ -941,22 +944,8 @@ def adjust_formula_references(formula, row_offset):
     返回:
         str: 调整后的公式
     """
-    # 正则表达式匹配Excel单元格引用（如A1、$B$2、C$3、$D4等）
-    pattern = r'([A-Za-z]{1,3})(\$?)(\d+)'
-
-    def adjust_match(match):
-        col_ref = match.group(1)  # 列引用（如"A"、"AB"）
-        row_lock = match.group(2)  # 行锁定符（"$"或空）
-        row_num = int(match.group(3))  # 行号
-
-        # 如果行没有被锁定（$），则调整行号
-        if not row_lock:
-            row_num += row_offset
-
-        return f"{col_ref}{row_lock}{row_num}"
-
-    # 应用调整
-    return re.sub(pattern, adjust_match, formula)
+    # 按词法解析后平移引用（行被锁定（$）时不调整），函数名如 LOG10 不会被误改
+    return translate_formula(formula, row_offset, 0)
 
 
 def _get_sheets_to_process(workbook, sheets_to_copy, target_sheet_name):
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import datetime
 from datetime import datetime as dt
@@ -6,12 +7,13 @@ import os
 
 from circulate_formula import ExcelFormulaGenerator
 from findAndSet import find_all_cells, find_cell
-from loan_assignment import write_loan, copy_and_delete_sheets, loan_summary
+from loan_assignment import write_loan, loan_summary, reset_sheet_contents, draw_cell, fee_rate_cells
+from loan_schedule import SCHEDULE_COLUMNS, compute_schedules
+from formula_evaluator import FormulaEvaluator, read_cached_rows, values_match
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter, column_index_from_string
-from openpyxl_vba import load_workbook
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl_vba import load_workbook, save_workbook
 """
 
 表c填充主要文件
@@ -23,6 +25,36 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 # 忽略特定警告
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+# 表c中每笔借款标题行下的 8 行明细，(序号后缀, 项目名称, 计划表中的列)
+OUTPUT_ROWS = [
+    ("1", "期初借款余额", '期初借款余额'),
+    ("2", "当期还本付息", '当期还本付息'),
+    ("2.1", "其中：还本", '还本'),
+    ("2.2", "付息", '付息'),
+    ("3", "期末借款余额", '期末借款余额'),
+    ("4", "还本付息兑付手续费", '还本付息兑付手续费'),
+    ("5", "债券发行及服务费", '债券发行及服务费'),
+    ("6", "应付利息", '应付利息'),
+]
+
+# 合计列填 0 的项目：余额各年相加没有意义（第一年的期初公式引用左侧的期末合计单元格）；
+# 应付利息只应合计建设期各年，模板中不填
+NO_TOTAL_COLUMNS = ('期初借款余额', '期末借款余额', '应付利息')
+
+C2_SHEET = "C.2项目每年借款信息"
+
+
+def excel_serial_to_month(serial):
+    """
+    将Excel序列日期转换为月份，无法识别时返回 1
+    """
+    try:
+        if isinstance(serial, (int, float)):
+            return (dt(1899, 12, 30) + datetime.timedelta(days=serial)).month
+        return 1
+    except:
+        return 1
+
 
 def excel_serial_to_year(serial):
     """
@@ -48,7 +80,7 @@ def excel_serial_to_year(serial):
 class Loan:
     def __init__(self, loan_id, name, loan_type, amount, start_year, end_year, term,
                  interest_rate, repayment_method, first_interest_month,
-                 bond_issue_fee, bond_registration_fee, bond_repayment_fee):
+                 bond_issue_fee, bond_registration_fee, bond_repayment_fee, start_month=1):
         """
         初始化借款对象
         参数:
@@ -65,6 +97,7 @@ class Loan:
         bond_issue_fee: 债券发行费(万元)
         bond_registration_fee: 债券发行登记服务费(万元)
         bond_repayment_fee: 债券还本付息兑付手续费(万元)
+        start_month: 开始月份（判断上/下半年付息、计算建设期应付利息）
         """
         self.loan_id = loan_id
         self.name = name
@@ -79,82 +112,52 @@ class Loan:
         self.bond_issue_fee = bond_issue_fee
         self.bond_registration_fee = bond_registration_fee
         self.bond_repayment_fee = bond_repayment_fee
+        self.start_month = start_month
         self.schedule = None
+        self.schedule_values = None
 
-    def generate_schedule(self, all_years):
+    def generate_schedule(self, all_years, values=None):
         """
         生成还款计划表
         参数:
         all_years: 所有年份列表
+        values: 可选，compute_schedules 算出的本笔借款各列数值 {列名: 长度为年份数的数组}；
+                不传时为全 0 的占位表（实际数值由 write_loan 写入的公式计算）
         返回:
         包含还款计划的DataFrame
         """
-        # 创建空的还款计划DataFrame，初始化为0.0
-        schedule = pd.DataFrame(
-            index=all_years,
-            columns=['期初借款余额', '还本', '付息', '期末借款余额', '当期还本付息', '还本付息兑付手续费',
-                     '债券发行及服务费'
-                , '应付利息'],
-            dtype=float
-        )
-        schedule = schedule.fillna(0.0)
-        #
-        # # 设置提款计划
-        # if self.start_year in schedule.index:
-        #     schedule.loc[self.start_year, '期初借款余额'] = 0.0
-        #     schedule.loc[self.start_year, '期末借款余额'] = self.amount
-        #
-        # # 初始化余额
-        # prev_balance = self.amount if self.start_year in all_years else 0.0
-        #
-        # # 计算每一年数据
-        # for year in all_years:
-        #     if year < self.start_year:
-        #         schedule.loc[year, '期初借款余额'] = 0.0
-        #         schedule.loc[year, '期末借款余额'] = 0.0
-        #         continue
-        #
-        #     # 设置期初余额
-        #     schedule.loc[year, '期初借款余额'] = prev_balance
-        #
-        #     # 计算利息
-        #     interest = prev_balance * self.interest_rate
-        #     schedule.loc[year, '付息'] = interest
-        #
-        #     # 计算还本
-        #     principal_payment = 0.0
-        #     if year == self.end_year:  # 最后一年
-        #         principal_payment = prev_balance
-        #     elif self.repayment_method in ["到期前逐年还本", "贷款期内等额本金还款", "等额本金"]:
-        #         # 等额本金还款
-        #         if self.term > 0:
-        #             # 计算每年应还本金
-        #             principal_payment = self.amount / self.term
-        #             # 确保不会偿还超过剩余本金
-        #             if principal_payment > prev_balance:
-        #                 principal_payment = prev_balance
-        #
-        #     schedule.loc[year, '还本'] = principal_payment
-        #
-        #     # 计算期末余额
-        #     ending_balance = prev_balance - principal_payment
-        #     schedule.loc[year, '期末借款余额'] = ending_balance
-        #     prev_balance = ending_balance
-        #
-        #     # 计算当期还本付息
-        #     schedule.loc[year, '当期还本付息'] = principal_payment + interest
-        #
-        #     # 计算手续费
-        #     if self.term > 0:
-        #         schedule.loc[year, '还本付息兑付手续费'] = self.bond_repayment_fee / self.term
-        #
-        # # 债券发行及服务费只在开始年份计入
-        # if self.start_year in schedule.index:
-        #     schedule.loc[self.start_year, '债券发行及服务费'] = self.bond_issue_fee + self.bond_registration_fee
+        if values is None:
+            data = np.zeros((len(all_years), len(SCHEDULE_COLUMNS)))
+        else:
+            data = np.column_stack([values[column] for column in SCHEDULE_COLUMNS])
+        schedule = pd.DataFrame(data, index=all_years, columns=SCHEDULE_COLUMNS, dtype=float)
 
         self.schedule = schedule
         return schedule
 
+    def output_rows(self, all_years, values, loan_id=None, name=None):
+        """
+        按模板格式生成本笔借款的各行（标题行 + 8 行明细），直接由计划表的数组得到
+        参数:
+        all_years: 所有年份列表
+        values: 各列数值 {列名: 长度为年份数的数组}，即 compute_schedules 结果中本笔借款的一行
+        loan_id: 序号，默认为本笔借款的序号（借款总结使用最后一笔借款的序号 + 1）
+        name: 项目名称，默认为借款名称
+        返回:
+        行列表，每行为 [序号, 项目, 合计, 各年数值...]
+        """
+        if loan_id is None:
+            loan_id = self.loan_id
+        if name is None:
+            name = self.name
+
+        rows = [[loan_id, name, ""] + ["" for _ in all_years]]
+        for suffix, label, column in OUTPUT_ROWS:
+            row_values = np.asarray(values[column], dtype=float)
+            total = 0.0 if column in NO_TOTAL_COLUMNS else float(row_values.sum())
+            rows.append([f"{loan_id}.{suffix}", label, total] + row_values.tolist())
+        return rows
+
     def get_output_table(self, all_years):
         """
         生成符合模板格式的输出表格
@@ -164,36 +167,10 @@ class Loan:
         按照模板格式的DataFrame
         """
         if self.schedule is None:
-            self.generate_schedule(all_years)
-
-        # 创建输出表格
-        output_df = pd.DataFrame(
-            columns=['序号', '项目', '合计'] + [year for year in all_years]
-        )
-
-        # 添加借款标题行
-        output_df.loc[0] = [self.loan_id, self.name, ""] + ["" for _ in all_years]
-
-        # 添加详细数据行
-        output_df.loc[1] = [f"{self.loan_id}.1", "期初借款余额", self.schedule['期初借款余额'].sum()] + list(
-            self.schedule['期初借款余额'].values)
-        output_df.loc[2] = [f"{self.loan_id}.2", "当期还本付息", self.schedule['当期还本付息'].sum()] + list(
-            self.schedule['当期还本付息'].values)
-        output_df.loc[3] = [f"{self.loan_id}.2.1", "其中：还本", self.schedule['还本'].sum()] + list(
-            self.schedule['还本'].values)
-        output_df.loc[4] = [f"{self.loan_id}.2.2", "付息", self.schedule['付息'].sum()] + list(
-            self.schedule['付息'].values)
-        output_df.loc[5] = [f"{self.loan_id}.3", "期末借款余额", self.schedule['期末借款余额'].sum()] + list(
-            self.schedule['期末借款余额'].values)
-        output_df.loc[6] = [f"{self.loan_id}.4", "还本付息兑付手续费",self.schedule['还本付息兑付手续费'].sum()] + list(
-            self.schedule['还本付息兑付手续费'].values)
-        output_df.loc[7] = [f"{self.loan_id}.5", "债券发行及服务费", self.schedule['债券发行及服务费'].sum()] + list(
-            self.schedule['债券发行及服务费'].values)
-        output_df.loc[8] = [f"{self.loan_id}.6", "应付利息", self.schedule['应付利息'].sum()] + list(
-            self.schedule['应付利息'].values)
-
-        # 添加详细数据行
-
+            self.generate_schedule(all_years, self.schedule_values)
+        values = {column: self.schedule[column].to_numpy() for column in SCHEDULE_COLUMNS}
+        rows = self.output_rows(all_years, values)
+        output_df = pd.DataFrame(rows, columns=['序号', '项目', '合计'] + [year for year in all_years], dtype=object)
         return output_df
 
 
@@ -201,6 +178,8 @@ class LoanRepaymentSystem:
     def __init__(self):
         self.loans = []
         self.all_years = []
+        self.schedule_values = {}
+        self.row_offsets = []
 
     def add_loan(self, loan_data):
         """添加借款到系统"""
@@ -221,7 +200,8 @@ class LoanRepaymentSystem:
             first_interest_month=loan_data['首年计息月份'],
             bond_issue_fee=loan_data['债券发行费（万元）'],
             bond_registration_fee=loan_data['债券发行登记服务费（万元）'],
-            bond_repayment_fee=loan_data['债券还本付息兑付手续费（万元）']
+            bond_repayment_fee=loan_data['债券还本付息兑付手续费（万元）'],
+            start_month=excel_serial_to_month(loan_data['开始时间'])
         )
         self.loans.append(loan)
 
@@ -237,6 +217,99 @@ class LoanRepaymentSystem:
         max_year = max(end_years)
         return list(range(min_year, max_year + 1))
 
+    def compute_schedules(self, all_years=None, draws=None, repay_fee_rate=0.0, issue_fee_rate=0.0):
+        """
+        用 compute_schedules 一次算出全部借款的还本付息计划，并写入各借款的 schedule
+        参数:
+        all_years: 所有年份列表，默认按全部借款的起止年份计算
+        draws: 每年提款额（表C.2），形状 (借款数, 年份数)；默认开始年份一次提清
+        repay_fee_rate: 债券还本付息兑付手续费率
+        issue_fee_rate: 债券发行手续费率 + 发行登记服务费率
+        返回:
+        {列名: 形状 (借款数, 年份数) 的数组}
+        """
+        if all_years is None:
+            all_years = self.calculate_years_range()
+        if not self.loans:
+            return {}
+
+        results = compute_schedules(
+            amounts=[loan.amount for loan in self.loans],
+            start_years=[loan.start_year for loan in self.loans],
+            end_years=[loan.end_year for loan in self.loans],
+            terms=[loan.term for loan in self.loans],
+            rates=[loan.interest_rate for loan in self.loans],
+            methods=[loan.repayment_method for loan in self.loans],
+            all_years=all_years,
+            start_months=[loan.start_month for loan in self.loans],
+            draws=draws,
+            repay_fee_rate=repay_fee_rate,
+            issue_fee_rate=issue_fee_rate,
+        )
+        for i, loan in enumerate(self.loans):
+            loan.schedule_values = {column: values[i] for column, values in results.items()}
+            loan.schedule = None
+        return results
+
+    def read_schedule_inputs(self, file_path, all_years):
+        """
+        读取公式中引用、借款信息里没有的数值：各笔借款每年的提款额（表C.2）和费率（A财务假设）
+        只计算这些单元格依赖的公式（表C.2 的提款额是引用 C.1 的公式）
+        返回:
+        (draws, repay_fee_rate, issue_fee_rate)，draws 形状 (借款数, 年份数)
+        """
+        repay_cell, bond_cell, bond_cell2 = fee_rate_cells(file_path)
+        fee_cells = [("A财务假设", *coordinate_to_tuple(cell.replace("$", ""))) for cell in (repay_cell, bond_cell, bond_cell2)]
+
+        draw_cells = {}
+        for i, loan in enumerate(self.loans):
+            row, col = coordinate_to_tuple(draw_cell(file_path, loan.loan_id, loan.start_year))
+            for j, year in enumerate(all_years):
+                if loan.start_year <= year <= loan.end_year:
+                    draw_cells[(i, j)] = (C2_SHEET, row, col + year - loan.start_year)
+
+        evaluator = FormulaEvaluator(load_workbook(file_path))
+        values = evaluator.evaluate_cells(fee_cells + list(draw_cells.values()))
+
+        def number(cell):
+            value = values[cell]
+            return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+        draws = np.zeros((len(self.loans), len(all_years)))
+        for (i, j), cell in draw_cells.items():
+            draws[i, j] = number(cell)
+        repay_fee_rate, bond_rate, bond_rate2 = (number(cell) for cell in fee_cells)
+        return draws, repay_fee_rate, bond_rate + bond_rate2
+
+    def check_schedules(self, file_path, sheet_name="c借款还本付息计划表"):
+        """
+        核对 write_loan 写入表c的公式与 compute_schedules 的结果（export_to_excel 之后、write_loan 写完公式后调用）
+        比较每笔借款 8 行明细在借款区间内各年的值，只计算这些单元格依赖的公式
+        返回:
+        不一致的单元格列表 [(地址, 公式结果, 计算值), ...]
+        """
+        cells = {}
+        for i, (loan, row_offset) in enumerate(zip(self.loans, self.row_offsets)):
+            for k, (_, _, column) in enumerate(OUTPUT_ROWS):
+                # 标题行在 2 + row_offset，明细从下一行开始；年份从第 4 列开始
+                row = 3 + row_offset + k
+                for j, year in enumerate(self.all_years):
+                    if loan.start_year <= year <= loan.end_year:
+                        cells[(sheet_name, row, 4 + j)] = self.schedule_values[column][i, j]
+
+        evaluator = FormulaEvaluator(load_workbook(file_path))
+        actual = evaluator.evaluate_cells(list(cells))
+        mismatches = []
+        for cell, expected in cells.items():
+            value = 0 if actual[cell] is None else actual[cell]
+            if not values_match(float(expected), value):
+                mismatches.append((f"{get_column_letter(cell[2])}{cell[1]}", value, float(expected)))
+        if mismatches:
+            print(f"[{sheet_name}] 还本付息计划核对：{len(mismatches)} 个单元格与公式结果不一致，例如 {mismatches[:5]}")
+        else:
+            print(f"[{sheet_name}] 还本付息计划核对：{len(cells)} 个单元格与公式结果一致")
+        return mismatches
+
     # def export_to_excel(self, file_path):
     #     """
     #     导出结果到Excel文件
@@ -281,11 +354,15 @@ class LoanRepaymentSystem:
     #
     #     return len(self.all_years), self.all_years[-1]
 
-    def export_to_excel(self, file_path):
+    def export_to_excel(self, file_path, sheet_name="c借款还本付息计划表"):
         """
         导出结果到Excel文件，保留VBA宏
+        各笔借款和借款总结按最终位置直接写进表c，不再先为每笔借款建单独的工作表、写完公式再复制合并
         参数:
-        file_path: 输出文件路径
+        file_path: 输出文件路径或 WorkbookSession
+        sheet_name: 表c的名称
+        返回:
+        (年份数量, 最后一年)；各笔借款在表c中相对单独工作表的行偏移记在 self.row_offsets
         """
         if not self.loans:
             print("没有可导出的借款数据")
@@ -296,80 +373,43 @@ class LoanRepaymentSystem:
         print("年份为：", self.all_years)
         print("一共有:", len(self.all_years))
 
-        # 检查文件是否存在，如果存在则加载，否则创建新工作簿
-        if os.path.exists(file_path):
-            try:
-                # 加载现有工作簿，保留VBA宏
-                book = load_workbook(file_path)
-                print("已加载现有工作簿并保留VBA宏")
-            except Exception as e:
-                print(f"加载工作簿时出错: {e}")
-                # 创建新工作簿作为备选
-                book = Workbook()
-                # 删除默认工作表
-                if book.sheetnames:
-                    default_sheet = book.active
-                    book.remove(default_sheet)
-                print("创建了新工作簿")
+        book = load_workbook(file_path)
+        if sheet_name in book.sheetnames:
+            ws = book[sheet_name]
+            reset_sheet_contents(ws)
         else:
-            # 文件不存在，创建新工作簿
-            book = Workbook()
-            # 删除默认工作表
-            if book.sheetnames:
-                default_sheet = book.active
-                book.remove(default_sheet)
-            print("创建了新工作簿")
-
-        # 为每笔借款创建单独的工作表
-        for loan in self.loans:
-            # 生成借款计划表
-            loan_table = loan.get_output_table(self.all_years)
-
-            # 设置工作表名称
-            sheet_name = f"借款{loan.loan_id}"
-
-            # 检查工作表是否已存在，如果存在则删除
-            if sheet_name in book.sheetnames:
-                book.remove(book[sheet_name])
-                print(f"已删除现有工作表: {sheet_name}")
-
-            # 创建新工作表
-            ws = book.create_sheet(sheet_name)
-
-            # 将DataFrame写入工作表
-            for r in dataframe_to_rows(loan_table, index=False, header=True):
-                ws.append(r)
-
-            print(f"已创建工作表: {sheet_name}")
-
-        # 添加借款总结工作表
-        if self.loans:
-            loan_all = self.loans[-1]  # 获取最后一笔借款
-            loan_all.loan_id = loan_all.loan_id + 1
-            loan_all.name = "借款总结"
-            loan_table = loan_all.get_output_table(self.all_years)
-
-            # 设置工作表名称
-            sheet_name = f"借款{loan_all.loan_id}"
-
-            # 检查工作表是否已存在，如果存在则删除
-            if sheet_name in book.sheetnames:
-                book.remove(book[sheet_name])
-
-            # 创建新工作表
-            ws = book.create_sheet(sheet_name)
-
-            # 将DataFrame写入工作表
-            for r in dataframe_to_rows(loan_table, index=False, header=True):
-                ws.append(r)
-
-            print(f"已创建借款总结工作表: {sheet_name}")
+            ws = book.create_sheet(title=sheet_name)
+
+        # 表头在第 2 行（与原来复制合并时的位置一致）；单独工作表中每笔借款占第 2~10 行，
+        # 第 k 笔（从 0 开始）在表c中下移 1 + 9k 行，借款总结接在最后一笔之后
+        block_rows = 9
+        header = ['序号', '项目', '合计'] + [year for year in self.all_years]
+        for col, value in enumerate(header, start=1):
+            ws.cell(row=2, column=col, value=value)
+
+        # 按表C.2的提款额和A财务假设的费率一次算出全部借款的计划表
+        draws, repay_fee_rate, issue_fee_rate = self.read_schedule_inputs(file_path, self.all_years)
+        self.schedule_values = self.compute_schedules(self.all_years, draws, repay_fee_rate, issue_fee_rate)
+
+        # 借款总结为各笔借款逐年相加，序号为最后一笔的序号 + 1
+        last_loan = self.loans[-1]
+        blocks = [loan.output_rows(self.all_years, loan.schedule_values) for loan in self.loans]
+        totals = {column: values.sum(axis=0) for column, values in self.schedule_values.items()}
+        blocks.append(last_loan.output_rows(self.all_years, totals, loan_id=last_loan.loan_id + 1, name="借款总结"))
+
+        self.row_offsets = []
+        for k, rows in enumerate(blocks):
+            row_offset = 1 + block_rows * k
+            self.row_offsets.append(row_offset)
+            for r, row_values in enumerate(rows, start=2 + row_offset):
+                for col, value in enumerate(row_values, start=1):
+                    ws.cell(row=r, column=col, value=value)
 
         # 保存工作簿
         try:
-            book.save(file_path)
+            save_workbook(book, file_path)
             print(f"结果已成功导出到: {os.path.abspath(file_path)}")
-            print(f"包含以下工作表: {[f'借款{loan.loan_id}' for loan in self.loans]} 和 借款{loan_all.loan_id}")
+            print(f"[{sheet_name}] 包含 {len(self.loans)} 笔借款和借款总结")
         except Exception as e:
             print(f"保存工作簿时出错: {e}")
             return
@@ -377,7 +417,6 @@ class LoanRepaymentSystem:
         return len(self.all_years), self.all_years[-1]
 
 
-
 def read_financing_info(file_path, sheet_name):
     """
     从 Excel 读取融资信息，自动识别表头所在行
@@ -395,105 +434,90 @@ def read_financing_info(file_path, sheet_name):
     ]
 
     try:
-        # 1）先把整张表读进来，不指定 header
-        raw = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-
-        # 2）逐行查找"序号"所在行（忽略 NaN）
-        header_idx = None
-        for idx, row in raw.iterrows():
-            # 把 NaN 过滤掉，再转字符串，防止类型不一致
-            row_vals = [str(v).strip() for v in row.dropna().values]
-            if '序号' in row_vals:
-                header_idx = idx
+        # 1）流式读取 C.1 表的缓存值（只解析这一张表的 XML，不再两次 read_excel 解析整个工作簿）
+        rows = read_cached_rows(file_path, sheet_name)
+
+        # 2）逐行查找"序号"所在行作为表头，列名统一去掉前后空格，防止隐藏空格导致匹配失败
+        header = None
+        for _, values in rows:
+            if '序号' in [str(v).strip() for v in values.values()]:
+                header = {}
+                for col, name in values.items():
+                    header.setdefault(str(name).strip(), col)
                 break
 
-        if header_idx is None:
+        if header is None:
             raise ValueError("未在工作表中找到'序号'列，无法确定表头位置")
 
-        # 3）用这一行作为表头重新读取
-        df = pd.read_excel(
-            file_path,
-            sheet_name=sheet_name,
-            header=header_idx  # 真正的表头行
-        )
-
-        # 4）列名统一去掉前后空格，防止隐藏空格导致匹配失败
-        df.columns = df.columns.astype(str).str.strip()
-
-        # 5）检查缺失列
-        missing = [c for c in required_columns if c not in df.columns]
+        # 3）检查缺失列
+        missing = [c for c in required_columns if c not in header]
         if missing:
             raise ValueError(f"Excel 缺少必要列: {', '.join(missing)}")
 
-        # 6）后续解析逻辑保持不变
-        loans = []
-        for _, row in df.iterrows():
-            try:
-                # 跳过空行（序号为NaN的行）
-                if pd.isna(row['序号']):
-                    continue
-
-                # 处理首年计息月份
-                first_interest_month = row['首年计息月份']
-                if pd.isna(first_interest_month):
-                    first_interest_month = 1
-                else:
-                    # 确保转换为整数
-                    first_interest_month = int(float(str(first_interest_month).strip()))
-
-                # 处理日期字段
-                def parse_date(d):
-                    if pd.isna(d):
-                        # 返回默认日期或处理缺失日期的方式
-                        return (dt.now().date() - dt(1899, 12, 30).date()).days
-
-                    # 如果是字符串格式的日期
-                    if isinstance(d, str) and "年" in d:
-                        try:
-                            # 处理"2023年1月"格式
-                            date_obj = dt.strptime(d.strip(), "%Y年%m月")
-                            return (date_obj.date() - dt(1899, 12, 30).date()).days
-                        except ValueError:
-                            # 如果格式不匹配，返回当前日期
-                            return (dt.now().date() - dt(1899, 12, 30).date()).days
-
-                    # 如果是Excel日期数字
-                    try:
-                        return float(d)
-                    except (ValueError, TypeError):
-                        # 如果转换失败，返回当前日期
-                        return (dt.now().date() - dt(1899, 12, 30).date()).days
-
-                # 创建贷款信息字典
-                loan = {
-                    '序号': int(float(row['序号'])),  # 先转浮点再转整，避免NaN问题
-                    '借款名称': str(row['借款名称']).strip() if not pd.isna(row['借款名称']) else "",
-                    '借款类别': str(row['借款类别']).strip() if not pd.isna(row['借款类别']) else "",
-                    '借款金额（万元）': float(row['借款金额\n（万元）']) if not pd.isna(row['借款金额\n（万元）']) else 0.0,
-                    '开始时间': parse_date(row['开始时间']),
-                    '结束时间': parse_date(row['结束时间']),
-                    '借款周期（年）': int(float(row['借款周期（年）'])) if not pd.isna(row['借款周期（年）']) else 0,
-                    '借款利率': float(row['借款利率']) if not pd.isna(row['借款利率']) else 0.0,
-                    '还款方式': str(row['还款方式']).strip() if not pd.isna(row['还款方式']) else "",
-                    '首年计息月份': first_interest_month,
-                    '债券发行费（万元）': float(row['债券发行费（万元）']) if not pd.isna(row['债券发行费（万元）']) else 0.0,
-                    '债券发行登记服务费（万元）': float(row['债券发行登记服务费\n（万元）']) if not pd.isna(
-                        row['债券发行登记服务费\n（万元）']) else 0.0,
-                    '债券还本付息兑付手续费（万元）': float(row['债券还本付息兑付手续费\n（万元）']) if not pd.isna(
-                        row['债券还本付息兑付手续费\n（万元）']) else 0.0
-                }
-                loans.append(loan)
-            except Exception as e:
-                print(f"行解析失败: {e}，跳过")
-                continue
-
-        return loans
+        # 4）表头以下各行（继续读同一个流），按列整理后统一转换类型
+        records = [values for _, values in rows]
+        df = pd.DataFrame({column: [values.get(header[column]) for values in records] for column in required_columns},
+                          dtype=object)
+        return _financing_records(df)
 
     except Exception as e:
         print(f"读取融资信息失败: {e}")
         return []
 
 
+def _financing_records(df):
+    """
+    把 C.1 表各列按列转换成借款信息字典
+    数值列转换失败（非空但不是数字）的行跳过；序号为空的行是空行或说明行，直接跳过
+    """
+    numeric_columns = ['序号', '借款金额\n（万元）', '借款周期（年）', '借款利率', '首年计息月份',
+                       '债券发行费（万元）', '债券发行登记服务费\n（万元）', '债券还本付息兑付手续费\n（万元）']
+    numbers = {column: pd.to_numeric(df[column], errors="coerce") for column in numeric_columns}
+
+    keep = df['序号'].notna()
+    for column in numeric_columns:
+        invalid = keep & df[column].notna() & numbers[column].isna()
+        for index in df.index[invalid]:
+            print(f"行解析失败: {column!r} 不是数字（{df.at[index, column]!r}），跳过")
+        keep &= ~invalid
+
+    def text(column):
+        return [str(v).strip() if v is not None else "" for v in df[column]]
+
+    def number(column, default):
+        return numbers[column].fillna(default).to_numpy(dtype=float)
+
+    def parse_date(column):
+        # 日期：Excel 序列号直接使用；"2023年1月"格式的文字换算成序列号；缺失或无法识别时使用当天
+        values = df[column]
+        serials = pd.to_numeric(values, errors="coerce")
+        texts = values[values.map(lambda v: isinstance(v, str) and "年" in v)].astype(str).str.strip()
+        parsed = pd.to_datetime(texts, format="%Y年%m月", errors="coerce")
+        serials = serials.fillna((parsed - pd.Timestamp(1899, 12, 30)).dt.days)
+        today = (dt.now().date() - dt(1899, 12, 30).date()).days
+        return serials.fillna(today).to_numpy(dtype=float)
+
+    columns = {
+        '序号': np.trunc(number('序号', 0)).astype(int),
+        '借款名称': text('借款名称'),
+        '借款类别': text('借款类别'),
+        '借款金额（万元）': number('借款金额\n（万元）', 0.0),
+        '开始时间': parse_date('开始时间'),
+        '结束时间': parse_date('结束时间'),
+        '借款周期（年）': np.trunc(number('借款周期（年）', 0)).astype(int),
+        '借款利率': number('借款利率', 0.0),
+        '还款方式': text('还款方式'),
+        '首年计息月份': np.trunc(number('首年计息月份', 1)).astype(int),
+        '债券发行费（万元）': number('债券发行费（万元）', 0.0),
+        '债券发行登记服务费（万元）': number('债券发行登记服务费\n（万元）', 0.0),
+        '债券还本付息兑付手续费（万元）': number('债券还本付息兑付手续费\n（万元）', 0.0),
+    }
+    # 转成 object 数组再 tolist，得到 Python 的 int / float
+    rows = keep.to_numpy()
+    columns = {key: np.asarray(values, dtype=object)[rows].tolist() for key, values in columns.items()}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
 def format_existing_excel(file_path, sheet_name, output_path=None):
     """
     修改现有Excel文件的格式：微软雅黑字体、居中对齐、全边框
@@ -584,7 +608,7 @@ def format_existing_excel(file_path, sheet_name, output_path=None):
         # sheet.column_dimensions[column_letter].width = adjusted_width
 
     # 保存工作簿
-    workbook.save(output_path)
+    save_workbook(workbook, output_path)
     print(f"Excel格式已成功更新并保存到: {output_path}")
 
 
@@ -650,8 +674,7 @@ def loan_fill(input_file):
 
     # 验证文件存在
     if not os.path.exists(input_file):
-        print(f"文件不存在: {input_file}")
-        exit()
+        raise FileNotFoundError(f"文件不存在: {input_file}")
 
     # 输出文件路径
     # output_file = input("请输入输出文件路径（默认为: 借款还本付息计划表.xlsx）: ").strip()
@@ -667,8 +690,7 @@ def loan_fill(input_file):
     financing_data = read_financing_info(input_file, sheet_name)
 
     if not financing_data:
-        print("未读取到融资信息，请检查文件格式和内容")
-        exit()
+        raise ValueError("未读取到融资信息，请检查C.1项目融资信息表的格式和内容")
 
     print(f"成功读取 {len(financing_data)} 笔借款信息")
 
@@ -679,26 +701,28 @@ def loan_fill(input_file):
         print(f"添加借款: {loan_data['序号']} {loan_data['借款名称']} ({loan_data['借款金额（万元）']}万元)")
 
     # 生成并导出还款计划
-    year_num, last_year = system.export_to_excel(output_file)
+    year_num, last_year = system.export_to_excel(output_file, "c借款还本付息计划表")
 
     print("借款还本付息计划表生成完成！")
     print("表头年份数量一共有：", year_num)
     print("最后一年的年份为：", last_year)
 
-    for loan_data in financing_data:
-        write_loan(loan_data, output_file)
+    # 借款年份和最后一年补充到会话的项目日历中，后续各阶段共用
+    calendar = getattr(input_file, "project_calendar", None)
+    if calendar is not None:
+        calendar.set_loans(system.loans, last_year)
 
-    # 将生成的各模板表c’ 复制到一个sheet中,然后删除被复制的sheet
-    source = output_file  # 替换为源Excel文件路径
-    target = output_file  # 替换为目标Excel文件路径
-    target_sheet = "c借款还本付息计划表"  # 替换为目标sheet名称
-    sheets_to_copy = [f"借款{i + 1}" for i in range(len(financing_data) + 1)]
-    print("sheets_to_copy:", sheets_to_copy)
-    copy_and_delete_sheets(source, target, target_sheet, sheets_to_copy, True)
+    # 公式直接写进表c中各笔借款的位置
+    target_sheet = "c借款还本付息计划表"
+    for loan_data, row_offset in zip(financing_data, system.row_offsets):
+        write_loan(loan_data, output_file, target_sheet, row_offset)
 
     # 填充借款总结的内容
     loan_summary(output_file, target_sheet, year_num)
 
+    # 公式计算结果与向量化计算的计划表核对
+    system.check_schedules(output_file, target_sheet)
+
     # 修改格式
     # format_existing_excel(output_file, target_sheet)
 
@@ -0,0 +1,134 @@
+import numpy as np
+
+"""
+
+借款还本付息计划的向量化计算
+所有借款 × 所有年份 一次算成 (借款数, 年份数) 的二维数组，计算规则与 write_loan / repay_method_cal 写入表c的公式一致，
+可用于核对公式结果，或在几百笔借款、四十年跨度下快速得到数值
+
+"""
+
+# 与 Loan.generate_schedule 的列顺序一致
+SCHEDULE_COLUMNS = ['期初借款余额', '还本', '付息', '期末借款余额', '当期还本付息', '还本付息兑付手续费',
+                    '债券发行及服务费', '应付利息']
+
+# repay_method_cal 中的 7 种还款方式 -> (还本规则, 参数)
+#   maturity: 到期一次性还清
+#   equal:    贷款期内每年还 金额/借款周期
+#   last_n:   最后 n 年每年还 金额/n
+REPAYMENT_METHODS = {
+    "到期一次性还清": ("maturity", 0),
+    "贷款期内本期等额本金还款": ("equal", 0),
+    "贷款期内本期等额本息还款": ("equal", 0),  # 与 repay_method_cal 相同，暂按等额本金计算
+    "后五年每年还本20%": ("last_n", 5),
+    "后十年每年还本10%": ("last_n", 10),
+    "后二十年每年还本5%": ("last_n", 20),
+    "自定义还款": ("maturity", 0),  # 与 repay_method_cal 相同，暂按到期一次性还清计算
+}
+
+
+def principal_ratio(methods, terms, spans, offsets):
+    """
+    每笔借款每一年的还本比例（占借款金额）
+
+    参数:
+    methods: 还款方式列表
+    terms: 借款周期（年），形状 (n,)
+    spans: 结束年份 - 开始年份，形状 (n,)
+    offsets: 各年份相对开始年份的偏移，形状 (n, 年份数)
+    返回:
+    形状 (n, 年份数) 的数组，未知还款方式整行为 0
+    """
+    kinds = [REPAYMENT_METHODS.get(method, (None, 0)) for method in methods]
+    is_maturity = np.array([kind == "maturity" for kind, _ in kinds])[:, None]
+    is_equal = np.array([kind == "equal" for kind, _ in kinds])[:, None]
+    last_n = np.array([n for _, n in kinds], dtype=float)[:, None]
+
+    terms = terms[:, None]
+    spans = spans[:, None]
+
+    ratio = np.zeros(offsets.shape)
+    ratio = np.where(is_maturity & (offsets == spans), 1.0, ratio)
+    safe_terms = np.where(terms > 0, terms, 1)
+    ratio = np.where(is_equal & (terms > 0) & (offsets >= 0) & (offsets < terms), 1.0 / safe_terms, ratio)
+    # 后 n 年：公式从 开始列 + (结束年份-开始年份-n) 起连续写 n 列
+    safe_n = np.where(last_n > 0, last_n, 1)
+    ratio = np.where((last_n > 0) & (offsets >= spans - last_n) & (offsets < spans), 1.0 / safe_n, ratio)
+    return ratio
+
+
+def compute_schedules(amounts, start_years, end_years, terms, rates, methods, all_years,
+                      start_months=None, draws=None, repay_fee_rate=0.0, issue_fee_rate=0.0):
+    """
+    一次计算全部借款的还本付息计划
+
+    参数:
+    amounts: 借款金额（万元）
+    start_years / end_years: 开始、结束年份
+    terms: 借款周期（年）
+    rates: 借款利率
+    methods: 还款方式（repay_method_cal 中的 7 种）
+    all_years: 表头年份列表
+    start_months: 开始月份，默认 1 月；用于半年付息和建设期应付利息
+    draws: 每年提款额（对应表C.2），形状 (n, 年份数)；默认开始年份一次提清
+    repay_fee_rate: 债券还本付息兑付手续费率（A财务假设）
+    issue_fee_rate: 债券发行手续费率 + 发行登记服务费率（A财务假设）
+    返回:
+    {列名: 形状 (n, 年份数) 的数组}，列名见 SCHEDULE_COLUMNS；
+    除还本（与公式一样按还款方式写入对应年份）外，借款区间以外的年份为 0
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    start_years = np.asarray(start_years, dtype=int)
+    end_years = np.asarray(end_years, dtype=int)
+    terms = np.asarray(terms, dtype=float)
+    rates = np.asarray(rates, dtype=float)[:, None]
+    years = np.asarray(all_years, dtype=int)
+    if start_months is None:
+        start_months = np.ones(len(amounts))
+    start_months = np.asarray(start_months, dtype=float)[:, None]
+
+    spans = end_years - start_years
+    offsets = years[None, :] - start_years[:, None]
+    in_term = (offsets >= 0) & (offsets <= spans[:, None])
+    first_year = offsets == 0
+    last_year = offsets == spans[:, None]
+
+    if draws is None:
+        draws = np.where(first_year, amounts[:, None], 0.0)
+    draws = np.where(in_term, np.asarray(draws, dtype=float), 0.0)
+
+    principal = principal_ratio(methods, terms, spans, offsets) * amounts[:, None]
+
+    # 期末 = 期初 + 当年提款 - 还本，期初 = 上一年期末
+    net = np.where(in_term, draws - principal, 0.0)
+    closing = np.cumsum(net, axis=1)
+    opening = np.where(in_term, closing - net, 0.0)
+    closing = np.where(in_term, closing, 0.0)
+
+    # 付息 = (期末 + 还本) * 利率；借款周期 >= 10 年时半年一付：
+    # 上半年开始的首年和最后一年只付半年，下半年开始的首年不付息
+    long_term = (terms >= 10)[:, None]
+    first_half = start_months <= 6
+    factor = np.where(in_term, 1.0, 0.0)
+    factor = np.where(long_term & first_half & (first_year | last_year), 0.5, factor)
+    factor = np.where(long_term & ~first_half & first_year, 0.0, factor)
+    interest = (closing + principal) * rates * factor
+
+    payment = np.where(in_term, principal + interest, 0.0)
+
+    # 应付利息：首年按月折算，最后一年只计开始月份之前的月数
+    yearly_interest = amounts[:, None] * rates
+    accrued = np.where(first_year, (12 - start_months + 1) * yearly_interest / 12, yearly_interest)
+    accrued = np.where(last_year, (start_months - 1) * yearly_interest / 12, accrued)
+    accrued = np.where(in_term, accrued, 0.0)
+
+    return {
+        '期初借款余额': opening,
+        '还本': principal,
+        '付息': interest,
+        '期末借款余额': closing,
+        '当期还本付息': payment,
+        '还本付息兑付手续费': payment * repay_fee_rate,
+        '债券发行及服务费': draws * issue_fee_rate,
+        '应付利息': accrued,
+    }
@@ -1,13 +1,98 @@
+import os
 from openpyxl import load_workbook as original_load_workbook
 
+from xlsm_splice import capture_baseline, save_spliced, splice_workbook
+
+
+class WorkbookSession:
+    """
+    工作簿会话：模板只解析一次，所有阶段共享同一个内存中的 Workbook，最后统一保存一次
+
+    用法:
+        session = WorkbookSession(output_path)
+        loan_fill(session)            # 原来传文件路径的地方直接传 session
+        ...
+        session.save()                # 只重写有变化的工作表（见 xlsm_splice）
+
+    session 实现了 __fspath__，os.path / pandas 等按路径读取的地方仍然可以使用（读到的是磁盘上的文件）
+    """
+
+    def __init__(self, file_path, wb=None):
+        self.file_path = os.fspath(file_path)
+        # wb: 已经加载好的同一份工作簿（如 template_snapshot.load_template 从快照恢复的），不再重新解析文件
+        self.wb = wb if wb is not None else original_load_workbook(self.file_path, keep_vba=True, keep_links=True)
+        self.dirty = False
+        # 每次记录修改时递增，依赖工作簿内容的缓存（如标签索引）据此判断是否失效
+        self.generation = 0
+        # 模板分析结果（template_cache.TemplateLayout），设置后 find_cell 对模板锚点直接取缓存的坐标
+        self.template_layout = None
+        # 加载时各表的指纹，保存时只重写有变化的工作表，控件、宏等部件原样保留（见 xlsm_splice）
+        self.baseline = capture_baseline(self.wb)
+
+    def __fspath__(self):
+        return self.file_path
+
+    def __str__(self):
+        return self.file_path
+
+    def __repr__(self):
+        return f"WorkbookSession({self.file_path!r})"
+
+    def mark_dirty(self):
+        """记录有未保存的修改（各阶段原来的 wb.save 都会落到这里）"""
+        self.dirty = True
+        self.generation += 1
+
+    def save(self, file_path=None):
+        """把内存中的工作簿写回磁盘（以原文件为底稿拼接保存），整个流程只需要在最后调用一次"""
+        save_path = os.fspath(file_path) if file_path else self.file_path
+        save_spliced(self, self.baseline, save_path)
+        return save_path
+
+
+def mark_modified(target):
+    """
+    记录 target（WorkbookSession）的内存工作簿已被直接改写、还没有 save_workbook；其他类型忽略
+    依赖工作表内容的缓存（findAndSet 的标签索引、已用区域、年份轴）据此失效
+    """
+    if isinstance(target, WorkbookSession):
+        target.mark_dirty()
+
 
 def load_workbook(filename, read_only=False, keep_vba=True,
                   data_only=False, keep_links=True):
-    """默认保留 VBA 宏的 load_workbook 版本"""
-    return original_load_workbook(
+    """
+    默认保留 VBA 宏的 load_workbook 版本
+
+    filename 为 WorkbookSession 时直接返回会话中已加载的工作簿，不再重新解析文件。
+    此时 read_only / data_only 参数不生效：返回的是公式模式的工作簿，
+    需要"数据模式"语义的调用方应把公式单元格当作没有缓存值（与 openpyxl 保存过的文件一致）。
+    """
+    if isinstance(filename, WorkbookSession):
+        return filename.wb
+    wb = original_load_workbook(
         filename,
         read_only=read_only,
         keep_vba=keep_vba,
         data_only=data_only,
         keep_links=keep_links
     )
+    if keep_vba and not read_only and not data_only:
+        # 记录来源文件和各表指纹，save_workbook 以来源文件为底稿拼接保存
+        wb.splice_source = (os.path.abspath(os.fspath(filename)), capture_baseline(wb))
+    return wb
+
+
+def save_workbook(wb, filename):
+    """
+    保存工作簿；filename 为 WorkbookSession 时只记录修改，由会话在最后统一保存
+    由 load_workbook 从文件加载的工作簿以来源文件为底稿拼接保存（见 xlsm_splice），其他工作簿整体保存
+    """
+    if isinstance(filename, WorkbookSession):
+        filename.mark_dirty()
+        return
+    source = getattr(wb, "splice_source", None)
+    if source is not None and os.path.exists(source[0]):
+        splice_workbook(wb, source[0], source[1], filename)
+        return
+    wb.save(filename)
@@ -1,115 +1,56 @@
 from circulate_formula import ExcelFormulaGenerator
 from copy_formula import expand_excel_header, find_last_used_column, ExcelAutoFiller, find_last_used_row, copy_cell_style
 from openpyxl.utils import get_column_letter, column_index_from_string
-from findAndSet import find_cell, find_all_cells
+from findAndSet import find_cell, get_year_axis
 import openpyxl
-from loan_assignment import right_n_cells, excel_date_to_year, down_n_cells, up_n_cells
+from loan_assignment import up_n_cells
 from openpyxl.styles import PatternFill, Font, Border, Side, Alignment, Protection
-from loan_assignment import struct_years, to_absolute_address
-from openpyxl_vba import load_workbook
+from loan_assignment import to_absolute_address
+from openpyxl_vba import load_workbook, save_workbook
+from table_spec import fill_table
+from project_calendar import get_project_calendar
 
 
 
 def struct_years_all(file_path, table_b_sheet):
     """
     获取所有建设期的开始年份和结束年份
-    :param input_path:
-    :param target_year:
-    :return:
+    :param file_path: 文件路径或 WorkbookSession
+    :param table_b_sheet: B项目信息表的名称
+    :return: ([{'start_year': 开始年份, 'end_year': 完成年份}, ...], 各建设期运营期(年)所在单元格地址列表)
     """
-
-    # 建设期的时间范围
-    start_value = "建设开始年月"
-    end_value = "建设完成年月"
-    # 加载工作簿
-    wb = load_workbook(file_path)
-    ws = wb[table_b_sheet]
-
-    start_years_address = find_all_cells(file_path, start_value, table_b_sheet)  # [(row1, col1), (row2, col2), ...]
-    end_years_address = find_all_cells(file_path, end_value, table_b_sheet)  # [(row1, col1), (row2, col2), ...]
-    # 建设期开始年月单元格地址列表
-    start = []
-    start_years = []
-    # 建设期完成年月单元格地址列表
-    end = []
-    end_years = []
-    for start_year_address in start_years_address:
-        start.append(right_n_cells(start_year_address[1] + str(start_year_address[0]), 2))
-    for end_year_address in end_years_address:
-        end.append(right_n_cells(end_year_address[1] + str(end_year_address[0]), 2))
-
-    # 求出每个 建设期 的 运营期(年)
-    operating_period = []
-    for i in range(len(end)):
-        operating_period.append(down_n_cells(end[i], 3))
-    # 根据单元格地址求出其值所代表的年份
-    print("start:", start)
-    print("end:", end)
-    # 遍历所有单元格地址
-    for cell_address in start:
-        # 获取单元格值
-        cell = ws[cell_address]
-        start_years.append(cell.value)
-
-    for cell_address in end:
-        # 获取单元格值
-        cell = ws[cell_address]
-        end_years.append(cell.value)
-
-    start_years = excel_date_to_year(start_years)
-    end_years = excel_date_to_year(end_years)
-
-    print("start_years:", start_years)
-    print("end_years:", end_years)
-
-    results = []
-
-    for i in range(len(start_years)):
-        result = {
-            'start_year':start_years[i],
-            'end_year':end_years[i]
-        }
-        results.append(result)
-
-    return results, operating_period
+    calendar = get_project_calendar(file_path, table_b_sheet)
+    return [dict(period) for period in calendar.construction], list(calendar.operating_period_cells)
 
 def operation_years(file_path, table_B_sheet):
     """
     找出运营期最早开始的年份
-    :param file_path:
-    :param table_B_sheet:
-    :return:
+    :param file_path: 文件路径或 WorkbookSession
+    :param table_B_sheet: B项目信息表的名称
+    :return: 最早的运营开始年份
     """
-    # 运营期开始的最早时间
-    start_value = "运营开始年月"
-    # 加载工作簿
-    wb = load_workbook(file_path)
-    ws = wb[table_B_sheet]
-
-    start_years_address = find_all_cells(file_path, start_value, table_B_sheet)  # [(row1, col1), (row2, col2), ...]
-
-    # 运营期开始年月单元格地址列表
-    start = []
-    start_years = []
-    # 运营期开始年月单元格地址列表
-    for start_year_address in start_years_address:
-        start.append(right_n_cells(start_year_address[1] + str(start_year_address[0]), 2))
-    # 根据单元格地址求出其值所代表的年份
-    print("start:", start)
-    # 遍历所有单元格地址
-    for cell_address in start:
-        # 获取单元格值
-        cell = ws[cell_address]
-        start_years.append(cell.value)
-
-    start_years = excel_date_to_year(start_years)
-
-    print("start_years:", start_years)
-
-    # 找出最早的年份
-    min_year = min(start_years)
-
-    return min_year
+    return get_project_calendar(file_path, table_B_sheet).operation_start
+
+
+# D.2表：1.1建设投资 对应D.3的"总计"行；1.2建设期利息 对应c表的 n.5+n.6，只填充建设期；
+#        2.2债务资金 对应C.2的"合计"行；C列合计为本行 D 列到 last_col 的和
+TABLE_D2_SPEC = {
+    "sheet": "D.2项目总投资使用计划与资金筹措表",
+    "anchors": {
+        "D3_total": {"sheet": "D.3建设投资分年计划表", "last_row": True, "col": "E"},
+        "c_n5": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D"},
+        "c_n6": {"sheet": "c借款还本付息计划表", "last_row": True, "col": "D", "row_offset": -1},
+        "C2_total": {"sheet": "C.2项目每年借款信息", "label": "合计", "col_offset": 1},
+        "row_first": {"cell": "D3"},
+        "row_last": {"row": 3, "col": "last_col"},
+    },
+    "formulas": [
+        {"target": "D4", "template": "=({D3_total})", "count_offset": 1},                # 1.1 建设投资
+        {"target": "D5", "template": "=({c_n5}+{c_n6})", "count": "construction"},      # 1.2 建设期利息
+        {"target": "D12", "template": "=({C2_total})", "count_offset": 1},              # 2.2 债务资金
+        {"target": "C3", "template": "=(SUM({row_first}:{row_last}))", "count": 14, "direction": "down"},  # 合计
+    ],
+}
 
 
 def table_D2(input_path, sheet_name, last_col):
@@ -122,160 +63,20 @@ def table_D2(input_path, sheet_name, last_col):
     :param last_col: D.2表扩充表头后的最后一列
     :return:
     """
+    fill_table(input_path, dict(TABLE_D2_SPEC, sheet=sheet_name), last_col)
 
-    # 1.1建设投资 第一个地址
-    target_address = "D4"
-
-    # D.3表 总计 的第一个地址
-    table_D3_sheet = "D.3建设投资分年计划表"
-    r = find_last_used_row(input_path, table_D3_sheet)
-    start_address = "E" + str(r)
-
-    # 循环次数
-    loop_num = column_index_from_string(last_col) - column_index_from_string("D") + 1
-
-    # 建设期期间
-    table_B_sheet = "B项目信息"
-    start_year, end_year = struct_years(input_path, table_B_sheet)
-
-    # 建设期循环次数
-    struct_loop = end_year - start_year + 1
-
-    # 1.2建设期利息 第一个地址
-    struct_target = "D5"
-
-    # 找到表c的 n.5 和 n.6
-    table_c_sheet = "c借款还本付息计划表"
-    c_last_r = find_last_used_row(input_path, table_c_sheet)
-    c_address1 = "D" + str(c_last_r)
-    c_address2 = "D" + str(c_last_r - 1)
-
-    # 2.2债务资金 第一个地址
-    target_address2 = "D12"
-
-    # C.2 表 合计 的第一个地址
-    table_C2_sheet = "C.2项目每年借款信息"
-    value = "合计"
-    r3, c3 = find_cell(input_path, value, table_C2_sheet)
-    c3 = get_column_letter(column_index_from_string(c3)+1)
-    C2_start_address = c3 + str(r3)
-
-    # D.2 合计
-    sum_address = "C3"
-    sum_address1 = "D3"
-    sum_address2 = last_col + str(3)
-    sum_loop = 14
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    config = [
-        # 1.1 建设投资
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_D3_sheet, "cell": start_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 1.2 建设期利息
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": c_address1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": c_address2}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": struct_target  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": struct_loop,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-        # 2.2债务资金
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_C2_sheet, "cell": C2_start_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address2  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 合计
-        {
-            "operation": "custom",
-            "formula_template": "=(SUM({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": '', "cell": sum_address1},  # A表的y (向右移动)
-                "B_val": {"sheet": '', "cell": sum_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": sum_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": sum_loop,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 1, "col_shift": 0},  # 每次向下移动一行
-                    "B_val": {"row_shift": 1, "col_shift": 0}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 1, "col_shift": 0}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
 
-    formula_generator.generate_formulas(config)
+# D.4表：1.1 应收账款 = F表 年度合计（含税）/ 周转次数（$D$4）
+TABLE_D4_SPEC = {
+    "sheet": "D.4流动资金估算表",
+    "anchors": {
+        "F_tax_total": {"sheet": "F项目收入", "label": "年度合计（含税）", "col_offset": 2},
+    },
+    "formulas": [
+        {"target": "E4", "template": "=({F_tax_total}/$D$4)"},
+    ],
+    "count_offset": 0,
+}
 
 
 def table_D4(input_path, sheet_name, last_col):
@@ -287,58 +88,30 @@ def table_D4(input_path, sheet_name, last_col):
     :param sheet_name:
     :return:
     """
-
-    # 最早开始的运营期
-    # table_B_sheet = "B项目信息"
-    # start_year = operation_years(input_path, table_B_sheet)
-    #
-    # _, c = find_cell(input_path, start_year, sheet_name)
-
-    # 1.1 应收账款
-    table_F_sheet = "F项目收入"
-    table_F_value = "年度合计（含税）"
-    r, c = find_cell(input_path, table_F_value, table_F_sheet)
-    c = get_column_letter(column_index_from_string(c)+2)
-    table_F_address = c + str(r)
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string("E")
-
-    config = [
-        # 营业收入（不含增值税）
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}/$D$4)",
-            "params": {
-                "A_val": {"sheet": table_F_sheet, "cell": table_F_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "E4"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        }
-    ]
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    formula_generator.generate_formulas(config)
+    fill_table(input_path, dict(TABLE_D4_SPEC, sheet=sheet_name), last_col)
+    print("done")
 
 
-    print("done")
+# E表：7折旧费、8摊销费 对应E.2、E.3的"折旧额合计"行；
+#      9利息支出 对应c表的 n.4+n.6，从建设期结束后一年开始填充(建设期的利息算在折旧里)
+TABLE_E_SPEC = {
+    "sheet": "E总成本费用估算表",
+    "anchors": {
+        "E2_depreciation": {"sheet": "E.2固定资产折旧费估算表", "label": "折旧额合计", "col": "F"},
+        "E3_amortization": {"sheet": "E.3无形资产和其他资产摊销费估算表", "label": "折旧额合计", "col": "F"},
+        "c_service_fee": {"sheet": "c借款还本付息计划表", "year": "construction_end", "year_offset": 1,
+                          "last_row": True},
+        "c_interest": {"sheet": "c借款还本付息计划表", "year": "construction_end", "year_offset": 1,
+                       "last_row": True, "row_offset": -2},
+    },
+    "formulas": [
+        {"target": "C12", "template": "=({E2_depreciation})"},   # 折旧费
+        {"target": "C13", "template": "=({E3_amortization})"},   # 摊销费
+        {"target": {"year": "construction_end", "year_offset": 1, "row": 14},
+         "template": "=({c_service_fee}+{c_interest})", "count_from": "C"},   # 利息支出
+    ],
+    "count_offset": 1,
+}
 
 
 # "5.2 其他管理费用"，未完成
@@ -352,130 +125,10 @@ def table_E(input_path, sheet_name, last_col):
     :param sheet_name:
     :return:
     """
-
-    # 7 折旧费
-    table_E2_sheet = "E.2固定资产折旧费估算表"
-    table_E2_value = "折旧额合计"
-    r, _ = find_cell(input_path, table_E2_value, table_E2_sheet)
-    table_E2_address = "F" + str(r)
-
-    # 8 摊销费
-    table_E3_sheet = "E.3无形资产和其他资产摊销费估算表"
-    table_E3_value = "折旧额合计"
-    r, _ = find_cell(input_path, table_E3_value, table_E3_sheet)
-    table_E3_address = "F" + str(r)
-
-    # 9 利息支出
-    # 建设期 结束时间
-    table_B_sheet = "B项目信息"
-    table_c_sheet = "c借款还本付息计划表"
-    _, end_year = struct_years(input_path, table_B_sheet)
-    # 利息支出 起始位置
-    _, c = find_cell(input_path, end_year + 1, sheet_name)
-    target_address = c + str(14)
-    # 表c 还本付息兑付手续费 和 应付利息 的起始位置
-    _, c = find_cell(input_path, end_year + 1, table_c_sheet)
-    r = find_last_used_row(input_path, table_c_sheet)
-    table_c_address1 = c + str(r)
-    table_c_address2 = c + str(r - 2)
-
-
-    # 循环次数
-    loop_num = column_index_from_string(last_col) - column_index_from_string("C") + 1
-
-
-    config = [
-        # 折旧费
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E2_sheet, "cell": table_E2_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "C12"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 摊销费
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_E3_sheet, "cell": table_E3_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "C13"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 利息支出
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val})",
-            "params": {
-                "A_val": {"sheet": table_c_sheet, "cell": table_c_address1},  # A表的y (向右移动)
-                "B_val": {"sheet": table_c_sheet, "cell": table_c_address2},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": target_address  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-    ]
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    formula_generator.generate_formulas(config)
-
-
+    fill_table(input_path, dict(TABLE_E_SPEC, sheet=sheet_name), last_col)
     print("done")
 
 
-
 def table_E2(input_path, sheet_name, last_col):
     """
     表E.2填充，C列公式，对E.4的引用要包含对应的建设年份;
@@ -530,7 +183,7 @@ def table_E2(input_path, sheet_name, last_col):
         r1 = r2 + i
         result = results[i]
         formula = generate_formula(input_path, result['start_year'], result['end_year'], tax=False)
-        temp_r, temp_c = find_cell(input_path, result['end_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['end_year'])
         end_year_address = temp_c + str(temp_r)
         end_year_address = to_absolute_address(end_year_address)
 
@@ -577,7 +230,7 @@ def table_E2(input_path, sheet_name, last_col):
     for i in range(len(results)):
 
         result = results[i]
-        temp_r, temp_c = find_cell(input_path, result['end_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['end_year'])
         end_year_address = temp_c + str(temp_r)
         end_year_address = to_absolute_address(end_year_address)
 
@@ -614,7 +267,7 @@ def table_E2(input_path, sheet_name, last_col):
         ws.cell(row=current_row, column=col_idx).value = f"=SUM({annual_c + str(r2)}:{annual_c + str(r1)})"
 
     # 保存修改后的文件
-    wb.save(input_path)
+    save_workbook(wb, input_path)
     print(f"文件已更新: {input_path}")
 
     return len(results)
@@ -650,21 +303,20 @@ def generate_formula(input_path, start_year, end_year, tax=True):
     r_list_c.append(r-1)
 
     # 处理E.4建设投资税后金额表
+    # 税后列的表头为 "2025\n（税后）" 形式
+    year_suffix = None if tax else "\n（税后）"
+    axis_E4 = get_year_axis(input_path, table_E4_sheet)
     for year in range(start_year, end_year + 1):
-
-        if tax:
-            year_value = year
-        else:
-            year_value = str(year)+"\n（税后）"
-        _, c = find_cell(input_path, year_value, table_E4_sheet)
+        c = axis_E4.column(year, year_suffix)
         for row in r_list_E4:
             ref_list.append(f"{table_E4_sheet}!{c}{row}")
 
     # 处理c借款还本付息计划表
+    axis_c = get_year_axis(input_path, table_c_sheet)
     for year in range(start_year, end_year + 1):
 
         # year_value = str(year)
-        _, c = find_cell(input_path, year, table_c_sheet)
+        c = axis_c.column(year)
         for row in r_list_c:  # 注意行顺序：先47后46
             ref_list.append(f"{table_c_sheet}!{c}{row}")
 
@@ -695,13 +347,12 @@ def generate_formula_E3(input_path, start_year, end_year, tax=True):
         r_list_E3.append(r)
 
     # 处理E.4建设投资税后金额表
+    # 税后列的表头为 "2025\n（税后）" 形式
+    table_E4_sheet = "E.4建设投资税后金额表"
+    year_suffix = None if tax else "\n（税后）"
+    axis_E4 = get_year_axis(input_path, table_E4_sheet)
     for year in range(start_year, end_year + 1):
-        table_E4_sheet = "E.4建设投资税后金额表"
-        if tax:
-            year_value = year
-        else:
-            year_value = str(year)+"\n（税后）"
-        _, c = find_cell(input_path, year_value, table_E4_sheet)
+        c = axis_E4.column(year, year_suffix)
         for row in r_list_E3:
             ref_list.append(f"{table_E4_sheet}!{c}{row}")
 
@@ -775,11 +426,11 @@ def table_E3(input_path, sheet_name, last_col):
 
         # 求出当前 建设期的完成年份
         result = results[period-1]
-        temp_r, temp_c = find_cell(input_path, result['start_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['start_year'])
         start_year_address = temp_c + str(temp_r)
         start_year_address = to_absolute_address(start_year_address)
 
-        temp_r, temp_c = find_cell(input_path, result['end_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['end_year'])
         end_year_address = temp_c + str(temp_r)
         end_year_address = to_absolute_address(end_year_address)
 
@@ -963,11 +614,11 @@ def table_E3(input_path, sheet_name, last_col):
 
         # 求出当前 建设期的完成年份
         result = results[period-1]
-        temp_r, temp_c = find_cell(input_path, result['start_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['start_year'])
         start_year_address = temp_c + str(temp_r)
         start_year_address = to_absolute_address(start_year_address)
 
-        temp_r, temp_c = find_cell(input_path, result['end_year'], sheet_name)
+        temp_r, temp_c = get_year_axis(input_path, sheet_name).locate(result['end_year'])
         end_year_address = temp_c + str(temp_r)
         end_year_address = to_absolute_address(end_year_address)
 
@@ -1173,7 +824,7 @@ def table_E3(input_path, sheet_name, last_col):
     # apply_basic_formatting(ws, header_row, current_row, len(header_values))
 
     # 保存修改后的文件
-    wb.save(input_path)
+    save_workbook(wb, input_path)
     print(f"文件已重新创建: {input_path}")
 
 
@@ -1230,6 +881,21 @@ def apply_basic_formatting(ws, header_row, last_row, num_columns):
         ws.column_dimensions[get_column_letter(col)].width = adjusted_width
 
 
+# F表：年度合计（含税）/（不含税）分别累加上面各分项的 含税 / 不含税 值（分项个数不定）
+TABLE_F_SPEC = {
+    "sheet": "F项目收入",
+    "anchors": {
+        "tax_items": {"label": "含税", "all": True, "col_offset": 1},
+        "no_tax_items": {"label": "不含税", "all": True, "col_offset": 1},
+    },
+    "formulas": [
+        {"target": {"label": "年度合计（含税）", "col_offset": 2}, "template": "=({tax_items})"},
+        {"target": {"label": "年度合计（不含税）", "col_offset": 2}, "template": "=({no_tax_items})"},
+    ],
+    "count_offset": 0,
+}
+
+
 def table_F(input_path, sheet_name, last_col):
     """
     表F 的填充，5和6年度合计，分别累加上面分项的含税和不含税值。
@@ -1238,89 +904,42 @@ def table_F(input_path, sheet_name, last_col):
     :param sheet_name:
     :return:
     """
-
-    # 所有 含税 的单元格地址
-    tax_value = "含税"
-    # 年度合计（含税） 单元格地址
-    tax_target_value = "年度合计（含税）"
-    table_F_tool(input_path, sheet_name, last_col, tax_value, tax_target_value)
-    print("年度合计（含税）计算完成")
-
-    # 所有 不含税 的单元格地址
-    no_tax_value = "不含税"
-    # 年度合计（不含税） 单元格地址
-    no_tax_target_value = "年度合计（不含税）"
-    table_F_tool(input_path, sheet_name, last_col, no_tax_value, no_tax_target_value)
-    print("年度合计（不含税）计算完成")
-
-
-def table_F_tool(input_path, sheet_name,last_col, value, target_value):
-    """
-    表F填充的工具，用于生成单元格公式参数量不定的情况。
-    :param input_path:
-    :param sheet_name:
-    :param last_col:
-    :param value:
-    :param target_value:
-    :return:
-    """
-
-    tax_address = find_all_cells(input_path, value, sheet_name)
-    all_tax_address = []
-    for i in range(len(tax_address)):
-        temp_address = tax_address[i]
-        c = get_column_letter(column_index_from_string(temp_address[1]) + 1)
-        r = temp_address[0]
-        all_tax_address.append(c+str(r))
-
-    r, c = find_cell(input_path, target_value, sheet_name)
-    c = get_column_letter(column_index_from_string(c)+2)
-    tax_target_address = c + str(r)
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string(c)
-
-
-    # 1. 生成参数名 B_val, C_val, D_val ...
-    param_names = [f"{chr(66 + i)}_val" for i in range(len(all_tax_address))]
-    # 2. 生成 params 区块
-    params = {
-        name: {"sheet": "", "cell": cell}
-        for name, cell in zip(param_names, all_tax_address)
-    }
-    # 3. 生成公式模板  =({B_val}+{C_val}+...)
-    template = "=(" + "+".join([f"{{{p}}}" for p in param_names]) + ")"
-
-    params_offsets = {
-        name: {"row_shift": 0, "col_shift": 1}
-        for name in param_names
-    }
-
-    loop_config = {
-        "count": loop_num,  # 循环3次
-
-        # 参数独立偏移设置
-        "param_offsets": params_offsets,
-
-        # 目标单元格偏移设置
-        "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-    }
-
-    summary_config = [{
-        "operation": "custom",
-        "formula_template": template,
-        "params": params,
-        "target": {"sheet": sheet_name, "cell": tax_target_address},
-        "loop": loop_config
-    }]
-
-    print("summary_config:", summary_config)
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    formula_generator.generate_formulas(summary_config)
+    fill_table(input_path, dict(TABLE_F_SPEC, sheet=sheet_name), last_col)
+    print("年度合计（含税）、年度合计（不含税）计算完成")
+
+
+# G表：D3 对应G.1中增值税列最后一行（建设投资进项税额），E3 起为未抵扣的进项税额；
+#      当期进项税额、当期销项税额为下面各子项之和，当期应缴增值税、城建税及教育费附加从第二年起计算
+TABLE_G_SPEC = {
+    "sheet": "G.税金及附加测算表",
+    "anchors": {
+        "G1_vat": {"sheet": "G.1进项增值税率-建设投资", "label": "增值税（万元）", "last_row": True},
+        "investment_tax": {"cell": "D3"},
+        "carried_tax": {"cell": "E3"},
+        "input_tax": {"label": "当期进项税额", "col_offset": 2},
+        "input_tax_next": {"label": "当期进项税额", "col_offset": 3},
+        "input_first": {"label": "当期进项税额", "col_offset": 2, "row_offset": 1},
+        "output_tax": {"label": "当期销项税额", "col_offset": 2},
+        "output_tax_next": {"label": "当期销项税额", "col_offset": 3},
+        "input_last": {"label": "当期销项税额", "col_offset": 2, "row_offset": -1},
+        "output_first": {"label": "当期销项税额", "col_offset": 2, "row_offset": 1},
+        "vat": {"label": "当期应缴增值税", "col_offset": 2},
+        "vat_next": {"label": "当期应缴增值税", "col_offset": 3},
+        "output_last": {"label": "当期应缴增值税", "col_offset": 2, "row_offset": -1},
+    },
+    "formulas": [
+        {"target": "D3", "template": "=({G1_vat})", "count": 1},
+        {"target": "E3", "template": "=(IF({vat}=0,ABS({output_tax}-{input_tax}-{investment_tax}),0))"},
+        {"target": {"label": "当期进项税额", "col_offset": 2}, "template": "=(SUM({input_first}:{input_last}))"},
+        {"target": {"label": "当期销项税额", "col_offset": 2}, "template": "=(SUM({output_first}:{output_last}))"},
+        {"target": {"label": "当期应缴增值税", "col_offset": 3},
+         "template": "=(MAX({output_tax_next}-{input_tax_next}-{carried_tax},0))"},
+        {"target": {"label": "城建税及教育费附加", "col_offset": 3},
+         "template": "=({vat_next}*(A财务假设!$D$6+A财务假设!$D$7+A财务假设!$D$8))"},
+        {"target": {"label": "合计", "col_offset": 2}, "template": "=({vat}+{vat})"},
+    ],
+    "count_offset": 0,
+}
 
 
 def table_G(input_path, sheet_name, last_col):
@@ -1332,236 +951,7 @@ def table_G(input_path, sheet_name, last_col):
     :param last_col:
     :return:
     """
-
-    table_G1 = "G.1进项增值税率-建设投资"
-    value = "增值税（万元）"
-    _, c = find_cell(input_path, value, table_G1)
-    r = find_last_used_row(input_path, table_G1)
-    G1_address = c + str(r)
-
-    # 当期进项税额 第一个单元格地址
-    value1 = "当期进项税额"
-    r1, c1 = find_cell(input_path, value1, sheet_name)
-    c1 = get_column_letter(column_index_from_string(c1)+2)
-    address1 = c1 + str(r1)
-
-    # 当期销项税额 第一个单元格地址
-    value1 = "当期销项税额"
-    r1, c1 = find_cell(input_path, value1, sheet_name)
-    c1 = get_column_letter(column_index_from_string(c1)+2)
-    address2 = c1 + str(r1)
-
-    # 当期应缴增值税  第一个单元格地址
-    value1 = "当期应缴增值税"
-    r1, c1 = find_cell(input_path, value1, sheet_name)
-    c1 = get_column_letter(column_index_from_string(c1)+2)
-    address3 = c1 + str(r1)
-
-    # 城建税及教育费附加  第一个单元格地址
-    value2 = "城建税及教育费附加"
-    r1, c1 = find_cell(input_path, value2, sheet_name)
-    c1 = get_column_letter(column_index_from_string(c1)+2)
-    address4 = c1 + str(r1)
-
-    # 合计  第一个单元格地址
-    value1 = "合计"
-    r1, c1 = find_cell(input_path, value1, sheet_name)
-    c1 = get_column_letter(column_index_from_string(c1) + 2)
-    address5 = c1 + str(r1)
-
-    loop_num = column_index_from_string(last_col) - column_index_from_string(c1)
-
-
-    formula_generator = ExcelFormulaGenerator(
-        data_file=input_path,  # 包含所有数据的单一文件
-        output_file=input_path  # 输出到同一个文件
-    )
-
-    config = [
-        # "D3"
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val})",
-            "params": {
-                "A_val": {"sheet": table_G1, "cell": G1_address},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "D3"  # 目标起始位置 (向右移动)
-            }
-        },
-        # "E3" 及之后
-        {
-            "operation": "custom",
-            "formula_template": "=(IF({A_val}=0,ABS({B_val}-{C_val}-{D_val}),0))",
-            "params": {
-                "A_val": {"sheet": "", "cell": address3},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": address2},  # A表的y (向右移动)
-                "C_val": {"sheet": "", "cell": address1},  # A表的y (向右移动)
-                "D_val": {"sheet": "", "cell": "D3"}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": "E3"  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num-1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "C_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "D_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 当期进项税额
-        {
-            "operation": "custom",
-            "formula_template": "=(SUM({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": down_n_cells(address1, 1)},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": up_n_cells(address2, 1)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": address1  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 当期销项税额
-        {
-            "operation": "custom",
-            "formula_template": "=(SUM({A_val}:{B_val}))",
-            "params": {
-                "A_val": {"sheet": "", "cell": down_n_cells(address2, 1)},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": up_n_cells(address3, 1)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": address2  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 当期应缴增值税
-        {
-            "operation": "custom",
-            "formula_template": "=(MAX({A_val}-{B_val}-{C_val},0))",
-            "params": {
-                "A_val": {"sheet": "", "cell": right_n_cells(address2, 1)},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": right_n_cells(address1, 1)},  # A表的y (向右移动)
-                "C_val": {"sheet": "", "cell": "E3"}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": right_n_cells(address3, 1)  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num - 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "C_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 城建税及教育费附加
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}*(A财务假设!$D$6+A财务假设!$D$7+A财务假设!$D$8))",
-            "params": {
-                "A_val": {"sheet": "", "cell": right_n_cells(address3, 1)}  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": right_n_cells(address4, 1)  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num - 1,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-        # 合计
-        {
-            "operation": "custom",
-            "formula_template": "=({A_val}+{B_val})",
-            "params": {
-                "A_val": {"sheet": "", "cell": address3},  # A表的y (向右移动)
-                "B_val": {"sheet": "", "cell": address3},  # A表的y (向右移动)
-
-            },
-            "target": {
-                "sheet": sheet_name,  # 结果工作表
-                "cell": address5  # 目标起始位置 (向右移动)
-            },
-            "loop": {
-                "count": loop_num,  # 循环3次
-
-                # 参数独立偏移设置
-                "param_offsets": {
-                    "A_val": {"row_shift": 0, "col_shift": 1},  # 每次向下移动一行
-                    "B_val": {"row_shift": 0, "col_shift": 1}  # 每次向下移动一行
-                },
-
-                # 目标单元格偏移设置
-                "target_offset": {"row_shift": 0, "col_shift": 1}  # 每次向右移动一列且向下移动一行
-            }
-        },
-
-
-    ]
-
-    formula_generator.generate_formulas(config)
-
+    fill_table(input_path, dict(TABLE_G_SPEC, sheet=sheet_name), last_col)
 
 
 def table_format(input_path, sheet_name):
@@ -1590,7 +980,7 @@ def table_format(input_path, sheet_name):
             cell.alignment = alignment_center
             cell.border = border
 
-    wb.save(input_path)
+    save_workbook(wb, input_path)
     wb.close()
 
 
@@ -1639,7 +1029,7 @@ def copy_one(input_path, target_year):
         elif sheet_name == "E总成本费用估算表":
             table_E(input_path, sheet_name, start_col)
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
@@ -1647,8 +1037,7 @@ def copy_one(input_path, target_year):
 
         last_row = find_last_used_row(input_path, sheet_name)
 
-        for i in range(r + 1, last_row + 1):
-            filler.auto_fill(f"{start_col}{i}", f"{start_col_plus}{i}:{c}{i}")
+        filler.fill_rows(start_col, start_col_plus, c, r + 1, last_row + 1)
 
         if sheet_name == "D.2项目总投资使用计划与资金筹措表":
             table_D2(input_path, sheet_name, c)
@@ -1702,15 +1091,14 @@ def copy_two(input_path, target_year):
             print(f"\n错误: {str(e)}")
             print("操作未完成，请检查输入参数是否正确")
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
 
         last_row = find_last_used_row(input_path, sheet_name) + 2
 
-        for i in range(r + 1, last_row):
-            filler.auto_fill(f"{start_col_minus}{i}", f"{start_col}{i}:{c}{i}")
+        filler.fill_rows(start_col_minus, start_col, c, r + 1, last_row)
 
         # 增加 "合计" 项
         c2 = column_index_from_string(c) + 1
@@ -1718,7 +1106,7 @@ def copy_two(input_path, target_year):
         ws = wb[sheet_name]
         ws.cell(row=r, column=c2).value = "合计"
         ws.cell(row=r+1, column=c2).value = "/"
-        wb.save(input_path)
+        save_workbook(wb, input_path)
 
         # "合计" 列的公式起始地址
         sum_start_row = r + 2
@@ -1783,7 +1171,7 @@ def copy_two(input_path, target_year):
             target_cell = ws[target_cell_address]
             copy_cell_style(source_cell, target_cell)
 
-        wb.save(input_path)
+        save_workbook(wb, input_path)
         wb.close()
 
 
@@ -1840,7 +1228,7 @@ def copy_three(input_path, target_year):
         elif sheet_name == "E.3无形资产和其他资产摊销费估算表":
             table_E3(input_path, sheet_name, start_col)
 
-        r, c = find_cell(input_path, target_year, sheet_name)
+        r, c = get_year_axis(input_path, sheet_name).locate(target_year)
 
         filler = ExcelAutoFiller(input_path)
         filler.set_active_sheet(sheet_name)
@@ -1848,8 +1236,7 @@ def copy_three(input_path, target_year):
 
         last_row = find_last_used_row(input_path, sheet_name)
 
-        for i in range(r + 1, last_row + 1):
-            filler.auto_fill(f"{start_col}{i}", f"{start_col_plus}{i}:{c}{i}")
+        filler.fill_rows(start_col, start_col_plus, c, r + 1, last_row + 1)
 
         # 补充 建设期 项
         if sheet_name == "E.2固定资产折旧费估算表":
@@ -1867,7 +1254,7 @@ def copy_three(input_path, target_year):
                 end_addess_E2 = up_n_cells(end_addess_E2, 1)
                 ws[target_address_E2] = f"=SUM({start_address_E2}:{end_addess_E2})"
 
-            wb.save(input_path)
+            save_workbook(wb, input_path)
 
 
 
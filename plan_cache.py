@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from loan_calculate import LoanRepaymentSystem, read_financing_info
+from other_table import struct_years_all, operation_years
+from write_plan import PLAN_VERSION, WritePlan
+
+"""
+
+写入计划缓存
+同一模板、借款结构（笔数、类别、起止年份、还款方式等）、建设期/运营期和年份范围都相同的项目，
+各阶段生成的公式、样式、表头完全相同，只有输入数据不同。第一次处理时把写入计划（见 write_plan）按
+(模板结构哈希, 项目结构) 保存，之后同一结构的项目直接套用计划，不再运行 loan_fill 和各阶段的查找、生成
+
+计划用 pickle 保存，默认放在用户目录下（~/.cache/excel_write_plans），不要指向其他人可写的目录
+
+用法:
+    key = plan_key(session, session.template_layout.template_hash)
+    plan = load_cached_plan(key)          # 没有时返回 None
+    ...
+    store_plan(key, capture_plan(template_wb, session.wb))
+
+"""
+
+DEFAULT_PLAN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "excel_write_plans")
+
+LOAN_SHEET = "C.1项目融资信息"
+PROJECT_SHEET = "B项目信息"
+
+
+def project_shape(file_path):
+    """
+    决定生成结果结构的项目信息：各笔借款的结构、各建设期的起止年份、运营期开始年份、表头年份范围
+    金额、利率、费用等数值不包含在内（公式引用的是它们所在的单元格）
+    """
+    system = LoanRepaymentSystem()
+    for loan_data in read_financing_info(file_path, LOAN_SHEET):
+        system.add_loan(loan_data)
+    years = system.calculate_years_range()
+    construction, _ = struct_years_all(file_path, PROJECT_SHEET)
+    return {
+        "loans": [[loan.loan_id, loan.name, loan.loan_type, loan.start_year, loan.end_year, loan.start_month,
+                   loan.term, loan.repayment_method, loan.first_interest_month] for loan in system.loans],
+        "construction": [[period["start_year"], period["end_year"]] for period in construction],
+        "operation_start": operation_years(file_path, PROJECT_SHEET),
+        "horizon": [years[0], years[-1]] if years else None,
+    }
+
+
+def plan_key(file_path, template_hash):
+    """缓存键：写入计划格式版本 + 模板结构哈希 + 项目结构"""
+    data = {"version": PLAN_VERSION, "template": template_hash, "shape": project_shape(file_path)}
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_cached_plan(key, cache_dir=None):
+    """读取缓存的写入计划，没有或格式已变化时返回 None"""
+    path = os.path.join(cache_dir or DEFAULT_PLAN_CACHE_DIR, f"{key}.pickle")
+    if not os.path.exists(path):
+        return None
+    try:
+        return WritePlan.load(path)
+    except Exception as e:
+        print(f"写入计划缓存读取失败，重新生成: {e}")
+        return None
+
+
+def store_plan(key, plan, cache_dir=None):
+    """保存写入计划（先写临时文件再替换，并行的多个进程不会读到写了一半的计划）"""
+    cache_dir = cache_dir or DEFAULT_PLAN_CACHE_DIR
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        os.close(fd)
+        plan.save(temp_path)
+        os.replace(temp_path, os.path.join(cache_dir, f"{key}.pickle"))
+    except OSError as e:
+        print(f"写入计划缓存写入失败: {e}")
@@ -0,0 +1,171 @@
+import datetime
+
+from openpyxl.utils import get_column_letter, column_index_from_string
+
+from findAndSet import find_all_cells
+from formula_evaluator import FormulaEvaluator, read_cached_rows
+from openpyxl_vba import WorkbookSession, load_workbook
+
+"""
+
+项目日历
+建设期、运营期的起止年份原来由 struct_years / struct_years_all / operation_years 各自加载工作簿、
+在 B项目信息 中查找"建设开始年月"等标签再换算年份，各表生成时反复调用。这里一次读出并保存在会话上，
+同一个任务中各阶段共用；loan_fill 算出借款年份和最后一年后补充到日历中
+
+用法:
+    session = WorkbookSession(output_path)
+    session.project_calendar = ProjectCalendar.from_workbook(session)
+    ...
+    calendar = get_project_calendar(session)   # 各阶段取用，未登记时现场读取
+
+"""
+
+PROJECT_SHEET = "B项目信息"
+
+# 标签右侧第 2 格是日期；"建设完成年月"下方第 3 格是该建设期对应的运营期(年)
+DATE_OFFSET = 2
+OPERATING_PERIOD_OFFSET = 3
+
+
+def _serial_to_year(serial):
+    """Excel 日期序列号（1899-12-30 起的天数）→ 年份；日期格式的单元格直接取年份，其他返回 None"""
+    if isinstance(serial, (datetime.datetime, datetime.date)):
+        return serial.year
+    if isinstance(serial, bool) or not isinstance(serial, (int, float)):
+        return None
+    return (datetime.datetime(1899, 12, 30) + datetime.timedelta(days=serial)).year
+
+
+def _date_values(file_path, ws, cells):
+    """
+    各日期单元格的序列号 {(行号, 列号): 值}
+    公式单元格（如 运营开始年月 =D5+31）在公式模式下读到的是公式文本，改取文件中的缓存值；
+    没有缓存值（openpyxl 保存后未计算）时只计算这些单元格及其引用的公式，算不出时保留原值
+    """
+    values = {(row, col): ws.cell(row=row, column=col).value for row, col in cells}
+    formulas = [key for key, value in values.items() if isinstance(value, str) and value.startswith("=")]
+    if not formulas:
+        return values
+
+    cached = {}
+    for row, row_values in read_cached_rows(file_path, ws.title):
+        for col, value in row_values.items():
+            if (row, col) in values:
+                cached[(row, col)] = value
+    missing = []
+    for key in formulas:
+        value = cached.get(key)
+        if isinstance(value, (int, float)):
+            values[key] = value
+        else:
+            missing.append((ws.title, *key))
+    if not missing:
+        return values
+
+    try:
+        computed = FormulaEvaluator(ws.parent).evaluate_cells(missing)
+    except Exception as e:
+        print(f"{ws.title} 日期公式计算失败，保留公式原文: {e}")
+        return values
+    for (_, row, col), value in computed.items():
+        if isinstance(value, (int, float)):
+            values[(row, col)] = value
+        else:
+            print(f"{ws.title}!{get_column_letter(col)}{row} 的公式没有算出日期（{value!r}），保留公式原文")
+    return values
+
+
+class ProjectCalendar:
+    """
+    项目的年份信息
+
+    construction: 各建设期 [{"start_year": 开始年份, "end_year": 完成年份}, ...]
+    operating_period_cells: 各建设期对应的运营期(年)所在单元格地址（如 "G9"），公式中引用
+    operating_years: 各建设期的运营期(年)
+    operation_start: 最早的运营开始年份（int；没有可用的运营开始日期时为 None）
+    loan_years: 各笔借款的 (开始年份, 结束年份)，loan_fill 之后才有
+    last_year: 表头的最后一年，loan_fill 之后才有
+    """
+
+    def __init__(self, construction, operating_period_cells, operating_years, operation_start,
+                 sheet_name=PROJECT_SHEET):
+        self.sheet_name = sheet_name
+        self.construction = construction
+        self.operating_period_cells = operating_period_cells
+        self.operating_years = operating_years
+        self.operation_start = operation_start
+        self.loan_years = []
+        self.last_year = None
+
+    @classmethod
+    def from_workbook(cls, file_path, table_b_sheet=PROJECT_SHEET):
+        """从 B项目信息 一次读出全部建设期、运营期日期"""
+        ws = load_workbook(file_path)[table_b_sheet]
+
+        def dates_right_of(label):
+            cells = []
+            for row, col in find_all_cells(file_path, label, table_b_sheet):
+                cells.append((row, column_index_from_string(col) + DATE_OFFSET))
+            return cells
+
+        starts = dates_right_of("建设开始年月")
+        ends = dates_right_of("建设完成年月")
+        operation_starts = dates_right_of("运营开始年月")
+
+        dates = _date_values(file_path, ws, starts + ends + operation_starts)
+        construction = [{"start_year": _serial_to_year(dates[start]), "end_year": _serial_to_year(dates[end])}
+                        for start, end in zip(starts, ends)]
+        for cell in starts + ends:
+            if _serial_to_year(dates[cell]) is None:
+                raise ValueError(f"{table_b_sheet}!{get_column_letter(cell[1])}{cell[0]} 不是建设期日期"
+                                 f"（{dates[cell]!r}），请检查建设开始/完成年月")
+        operating_period_cells = [f"{get_column_letter(col)}{row + OPERATING_PERIOD_OFFSET}" for row, col in ends]
+        operating_years = [ws[address].value for address in operating_period_cells]
+        operation_years = [_serial_to_year(dates[cell]) for cell in operation_starts]
+        for (row, col), year in zip(operation_starts, operation_years):
+            if year is None:
+                print(f"运营开始年月 {get_column_letter(col)}{row} 不是日期（{dates[(row, col)]!r}），忽略")
+        operation_years = [year for year in operation_years if year is not None]
+
+        calendar = cls(construction, operating_period_cells, operating_years,
+                       min(operation_years) if operation_years else None, table_b_sheet)
+        print("建设期:", construction)
+        print("运营期开始年份:", calendar.operation_start)
+        return calendar
+
+    @property
+    def construction_start(self):
+        """最早的建设开始年份"""
+        return min(period["start_year"] for period in self.construction)
+
+    @property
+    def construction_end(self):
+        """最晚的建设完成年份"""
+        return max(period["end_year"] for period in self.construction)
+
+    def set_loans(self, loans, last_year):
+        """记录各笔借款的起止年份和表头的最后一年（loan_fill 调用）"""
+        self.loan_years = [(loan.start_year, loan.end_year) for loan in loans]
+        self.last_year = last_year
+
+    @property
+    def years(self):
+        """完整的年份轴：最早的建设/借款开始年份到最后一年；loan_fill 之前为空"""
+        if self.last_year is None:
+            return []
+        first_year = min([self.construction_start] + [start for start, _ in self.loan_years])
+        return list(range(first_year, self.last_year + 1))
+
+
+def get_project_calendar(file_path, table_b_sheet=PROJECT_SHEET):
+    """
+    会话上登记的项目日历；没有时读取一次，会话会把结果保存下来供后续阶段使用
+    file_path 为文件路径时每次重新读取（文件可能已被修改）
+    """
+    calendar = getattr(file_path, "project_calendar", None)
+    if calendar is None or calendar.sheet_name != table_b_sheet:
+        calendar = ProjectCalendar.from_workbook(file_path, table_b_sheet)
+        if isinstance(file_path, WorkbookSession):
+            file_path.project_calendar = calendar
+    return calendar
@@ -0,0 +1,186 @@
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from excel_modifier_simple import modify_excel_file
+from formula_evaluator import recalculate_workbook
+from openpyxl_vba import WorkbookSession
+from what_if import KEY_OUTPUTS, WhatIfModel, resolve_cell
+from xlsm_splice import package_parts, save_spliced
+
+"""
+
+情景扫描（敏感性分析）
+一个基础模板 + 一组假设参数的取值网格，批量计算每个情景的关键指标。
+模板只生成一次；每个工作进程只加载、建图一次生成好的工作簿，之后每个情景只重算受影响的公式（见 what_if），
+需要重新生成表格的情景（如改变建设期年份，公式无法体现）才在进程内完整运行 modify_excel_file
+
+用法:
+    results = sweep(
+        "财务分析套表自做模板编程用ver6.xlsm",
+        {("A财务假设", "债券还本付息兑付手续费率"): [0.00005, 0.0001],
+         "C.1项目融资信息!H4": [0.02, 0.03, 0.04]},
+        materialize=[0],          # 只为第 0 个情景输出 .xlsm
+        output_dir="输出报表",
+    )
+
+"""
+
+# 默认指标：利息备付率、偿债备付率、a.1/a.2 净现金流量，以及表c借款总结的期末借款余额
+SWEEP_OUTPUTS = KEY_OUTPUTS + [("c借款还本付息计划表", "期末借款余额", -1)]
+
+# 工作进程内的模型（每个进程加载一次）
+_worker_model = None
+_worker_options = {}
+
+
+def build_grid(grid):
+    """
+    把参数网格展开成情景列表
+    参数:
+        grid: {输入位置: [取值, ...]}（取笛卡尔积），或已经展开好的 [{输入位置: 值}, ...]
+    返回:
+        [{输入位置: 值}, ...]
+    """
+    if isinstance(grid, dict):
+        targets = list(grid)
+        return [dict(zip(targets, values)) for values in itertools.product(*(grid[t] for t in targets))]
+    return [dict(scenario) for scenario in grid]
+
+
+def _init_worker(base_path, template_path, outputs, rebuild):
+    global _worker_model, _worker_options
+    _worker_model = WhatIfModel(base_path, outputs)
+    _worker_options = {"base_path": base_path, "template_path": template_path,
+                       "outputs": outputs, "rebuild": rebuild}
+
+
+def _needs_rebuild(model, cells):
+    """输入单元格没有被任何公式引用时，只能重新生成表格才能反映它的变化"""
+    evaluator = model.evaluator
+    return any(cell not in evaluator.dependents and cell not in evaluator.formulas for cell in cells)
+
+
+def _check_parts(expected, file_path):
+    """保存后的文件必须保留原文件的全部部件（A财务假设 的表单控件、绘图、宏等）"""
+    missing = sorted(expected - package_parts(file_path))
+    if missing:
+        raise RuntimeError(f"{file_path} 缺少部件: {', '.join(missing)}")
+
+
+def _write_inputs(file_path, overrides):
+    """
+    把情景的输入值写进工作簿（按标签查找的位置在该工作簿中解析）
+    以原文件为底稿拼接保存（见 xlsm_splice），只重写输入所在的工作表，控件和宏原样保留
+    """
+    expected = package_parts(file_path)
+    session = WorkbookSession(file_path)
+    for target, value in overrides.items():
+        sheet_name, row, col = resolve_cell(session.wb, target)
+        session.wb[sheet_name].cell(row=row, column=col).value = value
+    save_spliced(session, session.baseline)
+    _check_parts(expected, file_path)
+
+
+def _rebuild_scenario(index, overrides, output_path):
+    """完整运行一次 modify_excel_file 计算情景，返回指标值"""
+    work_dir = tempfile.mkdtemp(prefix=f"sweep_{index}_")
+    try:
+        input_path = os.path.join(work_dir, "input" + os.path.splitext(_worker_options["template_path"])[1])
+        result_path = output_path or os.path.join(work_dir, "output" + os.path.splitext(input_path)[1])
+        shutil.copy2(_worker_options["template_path"], input_path)
+        _write_inputs(input_path, overrides)
+        # openpyxl 保存后公式没有缓存值，而 modify_excel_file 按计算结果读取建设期等参数，先补上
+        recalculate_workbook(input_path)
+        success, message = modify_excel_file(input_path, result_path)
+        if not success:
+            raise RuntimeError(message)
+        _check_parts(package_parts(input_path), result_path)
+        return WhatIfModel(result_path, _worker_options["outputs"]).values()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_scenario(task):
+    index, overrides, output_path = task
+    result = {"index": index, "overrides": overrides, "outputs": None, "file": None, "rebuilt": False,
+              "error": None}
+    try:
+        cells = {_worker_model.resolve(target): value for target, value in overrides.items()}
+        if _worker_options["rebuild"] or _needs_rebuild(_worker_model, cells):
+            result["rebuilt"] = True
+            result["outputs"] = _rebuild_scenario(index, overrides, output_path)
+        else:
+            result["outputs"] = _worker_model.run(overrides, changed_only=False)
+            if output_path:
+                # 在生成好的工作簿上改输入值，再写入计算结果
+                shutil.copy2(_worker_options["base_path"], output_path)
+                _write_inputs(output_path, overrides)
+                recalculate_workbook(output_path)
+        if output_path:
+            result["file"] = output_path
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def sweep(template_path, grid, processes=None, outputs=None, materialize=None, output_dir=None,
+          base_path=None, rebuild=False):
+    """
+    批量计算情景
+
+    参数:
+        template_path: 基础模板（与 modify_excel_file 的输入相同）
+        grid: 参数网格，见 build_grid；输入位置的写法见 what_if.resolve_cell
+        processes: 进程数，默认 CPU 核数
+        outputs: 关注的指标，默认 SWEEP_OUTPUTS
+        materialize: 需要输出 .xlsm 的情景序号列表，默认不输出
+        output_dir: 输出目录（materialize 时使用，默认模板所在目录）
+        base_path: 已经由该模板生成好的工作簿；不传时先运行一次 modify_excel_file 生成
+        rebuild: True 时每个情景都完整运行 modify_excel_file（输入会改变表格结构时使用）
+    返回:
+        按情景顺序的结果列表，每项为
+        {"index", "overrides", "outputs": {(工作表, 项目名称): {年份: 值}}, "file", "rebuilt", "error"}
+    """
+    scenarios = build_grid(grid)
+    outputs = outputs or SWEEP_OUTPUTS
+    output_dir = output_dir or os.path.dirname(os.path.abspath(template_path))
+    materialize = set(materialize or [])
+    extension = os.path.splitext(template_path)[1]
+    base_name = os.path.splitext(os.path.basename(template_path))[0]
+
+    temp_dir = None
+    if base_path is None:
+        temp_dir = tempfile.mkdtemp(prefix="sweep_base_")
+        base_path = os.path.join(temp_dir, "base" + extension)
+        print("正在生成基础工作簿...")
+        success, message = modify_excel_file(template_path, base_path)
+        if not success:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise RuntimeError(message)
+
+    tasks = []
+    for index, overrides in enumerate(scenarios):
+        output_path = None
+        if index in materialize:
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, f"{base_name}_情景{index}{extension}")
+        tasks.append((index, overrides, output_path))
+
+    print(f"共 {len(tasks)} 个情景")
+    chunksize = max(1, len(tasks) // (4 * (processes or os.cpu_count() or 1)))
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(base_path, template_path, outputs, rebuild)) as executor:
+            results = list(executor.map(_run_scenario, tasks, chunksize=chunksize))
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    failed = [r for r in results if r["error"]]
+    for r in failed:
+        print(f"情景 {r['index']} 计算失败: {r['error']}")
+    print(f"情景计算完成：成功 {len(results) - len(failed)} 个，失败 {len(failed)} 个")
+    return results
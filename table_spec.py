@@ -0,0 +1,205 @@
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from circulate_formula import ExcelFormulaGenerator, _compile_template, _render_template
+from findAndSet import find_cell, find_all_cells, get_sheet_bounds, get_year_axis
+from formula_translator import parse_cell, shift_reference_series
+from openpyxl_vba import load_workbook, save_workbook
+from project_calendar import get_project_calendar
+
+"""
+
+声明式表格规格
+把"按年份横向展开的公式表"描述成数据：引用哪些锚点（其他表中按名称或最后一行找到的单元格）、
+每一行的公式模式、从哪一列开始写、写多少年；编译器一次解析全部锚点，展开成扁平的写入计划
+[(表名, 行号, 列号, 公式), ...]，再统一写入工作簿。写入计划是普通的元组列表，可以缓存、比较
+
+规格格式:
+    {
+        "sheet": 目标工作表,
+        "anchors": {
+            锚点名: {"sheet": 表名, "label": 名称, "col_offset": 0, "row_offset": 0},   # 名称所在单元格偏移
+            锚点名: {"sheet": 表名, "label": 名称, "col": "D"},                         # 名称所在行的 D 列
+            锚点名: {"sheet": 表名, "label": 名称, "occurrence": -1},                   # 名称最后一次出现的位置
+            锚点名: {"sheet": 表名, "label": 名称, "last_row": True},                   # 名称所在列的最后一行
+            锚点名: {"sheet": 表名, "label": 名称, "all": True},                        # 名称出现的全部位置，用 + 连接
+            锚点名: {"sheet": 表名, "last_row": True, "col": "D", "row_offset": -7},    # 最后一行向上 7 行的 D 列
+            锚点名: {"sheet": 表名, "last_column": True, "row_offset": -3},             # 最后一列（行同 last_row）
+            锚点名: {"sheet": 表名, "year": "construction_end", "year_offset": 1, "row": 14},  # 年份表头所在列
+            锚点名: {"cell": "D7"},                                                    # 固定单元格
+            锚点名: {"row": 15, "col": "last_col"},                                    # last_col 参数所在列
+        },
+        "formulas": [
+            {"target": "B4", "template": "=({锚点名}-{锚点名})"},   # 锚点和目标每年向右移动一列
+            {"target": {"label": 名称, "col_offset": 2}, ...},     # 目标也可以是锚点（默认在目标工作表中查找）
+            {"target": "C3", ..., "count": 14, "direction": "down"},   # 固定写 14 行，每次向下移动一行
+            {"target": ..., "count": "construction"},                 # 写建设期年数
+            {"target": ..., "count_from": "C"},                       # 年数按 C 列（或某个锚点所在列）计算
+        ],
+        "count_offset": -1,   # 写入年数 = last_col 列号 - 起始列号 + count_offset，每行可单独给出
+    }
+
+锚点不写 "sheet" 时在目标工作表中查找，公式中不加表名前缀；
+"year" 取项目日历中的 construction_start / construction_end（最早建设开始 / 最晚建设完成年份）
+
+"""
+
+
+def _lookup(lookups, key, compute):
+    """同一次编译内相同的查找只做一次"""
+    if key not in lookups:
+        lookups[key] = compute()
+    return lookups[key]
+
+
+def _anchor_positions(file_path, anchor, sheet_name, lookups):
+    """锚点的起点 [(行号, 列号), ...]；不按名称、单元格定位时为 [(None, None)]，行列完全由其他字段给出"""
+    if "cell" in anchor:
+        cell = parse_cell(anchor["cell"])
+        return [(cell.row, cell.col)]
+    if "label" not in anchor:
+        return [(None, None)]
+
+    label = anchor["label"]
+    if anchor.get("all") or "occurrence" in anchor:
+        found = _lookup(lookups, ("all", sheet_name, label), lambda: find_all_cells(file_path, label, sheet_name))
+        positions = [(row, column_index_from_string(col)) for row, col in found]
+        if anchor.get("all"):
+            return positions
+        occurrence = anchor["occurrence"]
+        return positions[occurrence:][:1] if occurrence < 0 else positions[occurrence:occurrence + 1]
+
+    row, col = _lookup(lookups, ("label", sheet_name, label), lambda: find_cell(file_path, label, sheet_name))
+    return [] if row is None else [(row, column_index_from_string(col))]
+
+
+def resolve_anchor(file_path, anchor, lookups, default_sheet=None, last_col=None):
+    """
+    锚点 → 单元格地址（如 "D35"）；"all" 锚点返回地址列表；找不到时返回 None
+    lookups: 同一次编译内共用的查找结果 {(类型, 表名, 名称): 结果}，相同的查找只做一次
+    default_sheet: 锚点没有 "sheet" 时查找的工作表
+    last_col: 编译参数 last_col，锚点的 "col" 为 "last_col" 时使用
+    """
+    sheet_name = anchor.get("sheet", default_sheet)
+    row_offset = anchor.get("row_offset", 0)
+    col_offset = anchor.get("col_offset", 0)
+
+    addresses = []
+    for row, col in _anchor_positions(file_path, anchor, sheet_name, lookups):
+        if "row" in anchor:
+            row = anchor["row"]
+        elif anchor.get("last_row") or row is None:
+            row = _lookup(lookups, ("last_row", sheet_name, None),
+                          lambda: get_sheet_bounds(file_path, sheet_name).last_row)
+
+        if "year" in anchor:
+            calendar = _lookup(lookups, ("calendar", None, None), lambda: get_project_calendar(file_path))
+            year = getattr(calendar, anchor["year"]) + anchor.get("year_offset", 0)
+            col = _lookup(lookups, ("year", sheet_name, year),
+                          lambda: get_year_axis(file_path, sheet_name).column_index(year))
+            if not col:
+                return None
+        elif anchor.get("last_column"):
+            col = _lookup(lookups, ("last_column", sheet_name, None),
+                          lambda: get_sheet_bounds(file_path, sheet_name).last_column)
+        elif "col" in anchor:
+            col = column_index_from_string(last_col if anchor["col"] == "last_col" else anchor["col"])
+
+        addresses.append(f"{get_column_letter(col + col_offset)}{row + row_offset}")
+
+    if not addresses:
+        return None
+    return addresses if anchor.get("all") else addresses[0]
+
+
+def _row_count(file_path, spec, row_spec, target, anchors, last_col, lookups):
+    """一行公式要写的年数（或行数）"""
+    count = row_spec.get("count")
+    if count == "construction":
+        calendar = _lookup(lookups, ("calendar", None, None), lambda: get_project_calendar(file_path))
+        return calendar.construction_end - calendar.construction_start + 1
+    if count is not None:
+        return count
+
+    count_from = row_spec.get("count_from")
+    if count_from is None:
+        start_col = target.col
+    elif count_from in anchors:
+        start_col = parse_cell(anchors[count_from][1][0]).col
+    else:
+        start_col = column_index_from_string(count_from)
+    return (column_index_from_string(last_col) - start_col
+            + row_spec.get("count_offset", spec.get("count_offset", 0)))
+
+
+def compile_table(file_path, spec, last_col, lookups=None):
+    """
+    把一个表格规格编译成写入计划 [(表名, 行号, 列号, 公式), ...]
+
+    参数:
+        file_path: 文件路径或 WorkbookSession（锚点在其中查找）
+        spec: 表格规格，格式见模块说明
+        last_col: 目标表扩展表头前的最后一列（与原 table_* 函数的 last_col 相同）
+        lookups: 可选，多个表共用的锚点查找结果
+    """
+    lookups = {} if lookups is None else lookups
+    sheet_name = spec["sheet"]
+    # 只解析公式中用到的锚点，多个表可以共用一组锚点定义
+    used = set()
+    for row_spec in spec["formulas"]:
+        used.update(field for _, field in _compile_template(row_spec["template"]) if field is not None)
+        used.add(row_spec.get("count_from"))
+    anchors = {}
+    for name, anchor in spec.get("anchors", {}).items():
+        if name not in used:
+            continue
+        address = resolve_anchor(file_path, anchor, lookups, sheet_name, last_col)
+        if address is None:
+            print(f"{sheet_name}: 未找到锚点 {name} ({anchor.get('sheet', sheet_name)}!{anchor.get('label')})")
+            continue
+        prefix = ExcelFormulaGenerator._sheet_prefix(anchor.get("sheet", ""))
+        anchors[name] = (prefix, address if isinstance(address, list) else [address])
+
+    plan = []
+    for row_spec in spec["formulas"]:
+        target = row_spec["target"]
+        if isinstance(target, dict):
+            target = resolve_anchor(file_path, target, lookups, sheet_name, last_col)
+            if target is None:
+                print(f"{sheet_name}: 未找到目标 {row_spec['target']}，跳过")
+                continue
+        target = parse_cell(target)
+        count = _row_count(file_path, spec, row_spec, target, anchors, last_col, lookups)
+        if count <= 0:
+            continue
+        template = _compile_template(row_spec["template"])
+        names = [field for _, field in template if field is not None]
+        missing = [name for name in names if name not in anchors]
+        if missing:
+            print(f"{sheet_name}!{row_spec['target']}: 缺少锚点 {missing}，跳过")
+            continue
+        row_step, col_step = (1, 0) if row_spec.get("direction") == "down" else (0, 1)
+        # "all" 锚点的每个地址各自平移，同一年的引用用 + 连接
+        series = {}
+        for name in set(names):
+            prefix, addresses = anchors[name]
+            shifted = [shift_reference_series(address, row_step, col_step, count, shift_absolute=True)
+                       for address in addresses]
+            series[name] = ["+".join(prefix + refs[i] for refs in shifted) for i in range(count)]
+        for i in range(count):
+            formula = _render_template(template, {name: refs[i] for name, refs in series.items()})
+            plan.append((sheet_name, target.row + i * row_step, target.col + i * col_step, formula))
+    return plan
+
+
+def apply_plan(file_path, plan):
+    """按 表 → 行 → 列 的顺序把写入计划写进工作簿并保存（WorkbookSession 只记录修改）"""
+    wb = load_workbook(file_path)
+    for sheet_name, row, col, value in sorted(plan, key=lambda item: item[:3]):
+        wb[sheet_name].cell(row=row, column=col).value = value
+    save_workbook(wb, file_path)
+    return len(plan)
+
+
+def fill_table(file_path, spec, last_col):
+    """编译一个表格规格并写入"""
+    return apply_plan(file_path, compile_table(file_path, spec, last_col))
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from findAndSet import SheetLabelIndex
+from openpyxl_vba import load_workbook
+
+"""
+
+模板分析缓存
+各阶段在模板中按名称查找的固定位置（锚点，如 a.1 的"回收固定资产余值"行、C.1/C.2 的"序号"表头行、
+A财务假设 的"债券还本付息兑付手续费率"行、D.3 的"工程类费用/硬件类/..."行）只需要在模板第一次使用时扫描一次；
+结果按模板结构单元格的哈希保存在磁盘上，之后同一结构的模板直接读取
+
+只记录各阶段不会写入的名称（模板中固定不变的锚点），find_cell 取缓存的第一个坐标；
+find_all_cells 仍然使用实时的标签索引，任务中写入的同名单元格都能找到
+
+结构单元格：每个工作表前两列（序号、名称列）和前 4 行（标题、表头）中的文本单元格。
+项目数据（金额、年份、日期、公式）不参与哈希，填写不同项目数据的同一模板共用一份缓存
+
+用法:
+    session = WorkbookSession(output_path)
+    session.template_layout = load_template_layout(session)   # find_cell 优先使用缓存的锚点
+
+"""
+
+# 格式变化时递增，旧缓存自动失效
+LAYOUT_VERSION = 2
+
+# 各阶段查找的锚点：{工作表: [名称, ...]}，只能列出各阶段不会写入的名称
+TEMPLATE_ANCHORS = {
+    "A财务假设": ["序号", "参考值", "债券还本付息兑付手续费率", "债券发行手续费率", "债券发行登记服务费率",
+              "5年期及以上债券发行手续费为发行额的0.08%"],
+    "C.1项目融资信息": ["序号", "借款金额\n（万元）"],
+    "C.2项目每年借款信息": ["序号"],
+    "D.3建设投资分年计划表": ["序号", "工程类费用", "硬件类", "软件类", "安全类", "数据类", "工程建设其他费用", "预备费"],
+    "D.4流动资金估算表": ["流动资金（1-2）"],
+    "a.1财务现金流量表": ["序号", "回收固定资产余值", "回收流动资金"],
+    "a.2项目资本金现金流量表": ["序号", "回收固定资产余值", "回收流动资金"],
+}
+
+STRUCTURE_COLUMNS = 2
+STRUCTURE_ROWS = 4
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "excel_template_cache")
+
+# 进程内缓存：哈希 → TemplateLayout
+_layouts = {}
+
+
+class TemplateLayout:
+    """
+    模板分析结果
+
+    sheets: {表名: {"anchors": {名称: [(行号, 列号), ...]}}}
+    """
+
+    def __init__(self, template_hash, sheets):
+        self.template_hash = template_hash
+        self.sheets = sheets
+
+    def find_all(self, sheet_name, value):
+        """锚点的全部坐标 [(行号, 列号), ...]；不是已记录的锚点时返回 None"""
+        sheet = self.sheets.get(sheet_name)
+        if sheet is None or not isinstance(value, str):
+            return None
+        return sheet["anchors"].get(value)
+
+    def to_dict(self):
+        return {"version": LAYOUT_VERSION, "hash": self.template_hash, "sheets": self.sheets}
+
+    @classmethod
+    def from_dict(cls, data):
+        sheets = {}
+        for name, sheet in data["sheets"].items():
+            sheet = dict(sheet)
+            sheet["anchors"] = {label: [tuple(coord) for coord in coords]
+                                for label, coords in sheet["anchors"].items()}
+            sheets[name] = sheet
+        return cls(data["hash"], sheets)
+
+
+def structural_hash(wb):
+    """模板结构的哈希：工作表名称顺序 + 各表结构单元格（位置和文本）"""
+    digest = hashlib.sha1()
+    for ws in wb.worksheets:
+        digest.update(f"\x00sheet\x00{ws.title}".encode("utf-8"))
+        for (row, col), cell in sorted(ws._cells.items()):
+            if (col <= STRUCTURE_COLUMNS or row <= STRUCTURE_ROWS) and isinstance(cell.value, str) \
+                    and cell.data_type != 'f':
+                digest.update(f"\x00{row},{col}\x00{cell.value}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compile_template(wb, template_hash=None, anchors=None):
+    """扫描模板，提取锚点坐标"""
+    anchors = anchors or TEMPLATE_ANCHORS
+    sheets = {}
+    for sheet_name, labels in anchors.items():
+        if sheet_name not in wb.sheetnames:
+            continue
+        ws = wb[sheet_name]
+        index = SheetLabelIndex(ws)
+        sheets[sheet_name] = {
+            "anchors": {label: index.find_all(label) for label in labels if index.find_all(label)},
+        }
+    return TemplateLayout(template_hash or structural_hash(wb), sheets)
+
+
+def load_template_layout(file_path, cache_dir=None):
+    """
+    读取模板的分析结果，缓存中没有时扫描模板并写入缓存
+
+    参数:
+        file_path: 模板路径或 WorkbookSession（会话中已加载的工作簿不会重新解析）
+        cache_dir: 缓存目录，默认系统临时目录下的 excel_template_cache
+    """
+    wb = load_workbook(file_path)
+    template_hash = structural_hash(wb)
+    if template_hash in _layouts:
+        return _layouts[template_hash]
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    cache_path = os.path.join(cache_dir, f"{template_hash}.json")
+    layout = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == LAYOUT_VERSION:
+                layout = TemplateLayout.from_dict(data)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"模板分析缓存读取失败，重新分析: {e}")
+
+    if layout is None:
+        layout = compile_template(wb, template_hash)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # 先写临时文件再替换，并行的多个进程不会读到写了一半的缓存
+            fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(layout.to_dict(), f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"模板分析缓存写入失败: {e}")
+
+    _layouts[template_hash] = layout
+    return layout
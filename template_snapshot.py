@@ -0,0 +1,114 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import openpyxl
+from openpyxl import load_workbook as original_load_workbook
+
+"""
+
+模板快照
+keep_vba=True 加载 .xlsm 需要完整解析每个工作表、样式表和 VBA 部件的 XML；
+第一次加载后把解析好的 Workbook（连同 vbaProject.bin、控件等原样保留的部件）序列化成二进制快照，
+之后批量处理的工作进程、界面或服务直接恢复快照，不再解析 XML。
+模板文件被修改（修改时间或大小变化）或 openpyxl 版本变化后快照自动失效，重新解析
+
+快照用 pickle 保存，只能读取本机自己写入的快照：默认放在用户目录下（~/.cache/excel_template_snapshots），
+不要指向其他人可写的目录
+
+用法:
+    wb = load_template("财务分析套表自做模板编程用ver6.xlsm")
+    session = WorkbookSession(output_path, wb=wb)
+
+"""
+
+SNAPSHOT_VERSION = 1
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "excel_template_snapshots")
+
+
+def _stamp(path):
+    """快照的有效性标记：模板的路径、修改时间、大小，以及快照格式和 openpyxl 版本"""
+    st = os.stat(path)
+    return {
+        "version": SNAPSHOT_VERSION,
+        "openpyxl": openpyxl.__version__,
+        "path": path,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+    }
+
+
+def snapshot_path(file_path, snapshot_dir=None):
+    """模板对应的快照文件路径（按模板的绝对路径命名）"""
+    path = os.path.abspath(os.fspath(file_path))
+    name = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    return os.path.join(snapshot_dir or DEFAULT_SNAPSHOT_DIR, f"{name}.pickle")
+
+
+def save_snapshot(wb, file_path, snapshot_dir=None):
+    """
+    把刚从 file_path 加载的工作簿写成快照
+
+    vba_archive 是内存中的 zip 文件，不能直接序列化，单独保存其中每个部件的字节
+    """
+    path = os.path.abspath(os.fspath(file_path))
+    target = snapshot_path(path, snapshot_dir)
+    vba_archive = wb.vba_archive
+    vba_files = {name: vba_archive.read(name) for name in vba_archive.namelist()} if vba_archive else None
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    try:
+        wb.vba_archive = None
+        with os.fdopen(fd, "wb") as f:
+            # 先写标记，读取时不需要反序列化整个工作簿就能判断是否失效
+            pickle.dump(_stamp(path), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((wb, vba_files), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, target)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        wb.vba_archive = vba_archive
+    return target
+
+
+def load_snapshot(file_path, snapshot_dir=None):
+    """读取模板的快照，没有快照或已失效时返回 None"""
+    path = os.path.abspath(os.fspath(file_path))
+    source = snapshot_path(path, snapshot_dir)
+    if not os.path.exists(source):
+        return None
+    try:
+        with open(source, "rb") as f:
+            if pickle.load(f) != _stamp(path):
+                return None
+            wb, vba_files = pickle.load(f)
+    except Exception as e:
+        print(f"模板快照读取失败，重新解析模板: {e}")
+        return None
+    if vba_files is not None:
+        wb.vba_archive = ZipFile(BytesIO(), 'a', ZIP_DEFLATED)
+        for name, data in vba_files.items():
+            wb.vba_archive.writestr(name, data)
+    return wb
+
+
+def load_template(file_path, snapshot_dir=None):
+    """
+    加载模板（保留 VBA 宏和外部链接），优先从快照恢复；没有有效快照时解析模板并写入快照
+    每次调用都返回一个新的 Workbook，可以直接修改
+    """
+    wb = load_snapshot(file_path, snapshot_dir)
+    if wb is not None:
+        return wb
+    wb = original_load_workbook(os.fspath(file_path), keep_vba=True, keep_links=True)
+    try:
+        save_snapshot(wb, file_path, snapshot_dir)
+    except Exception as e:
+        print(f"模板快照写入失败: {e}")
+    return wb
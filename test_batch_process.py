@@ -0,0 +1,65 @@
+import json
+import os
+
+from openpyxl import Workbook
+
+import batch_process
+from loan_calculate import loan_fill
+
+"""
+
+批量处理的失败路径：单个文件失败（包括生成步骤调用 exit()）只记为该文件失败，汇总照常写出，命令行返回非零
+
+"""
+
+
+def _empty_workbook(path):
+    wb = Workbook()
+    wb.active.title = "C.1项目融资信息"
+    wb.save(path)
+    return str(path)
+
+
+def test_loan_fill_raises_without_financing_data(tmp_path):
+    path = _empty_workbook(tmp_path / "empty.xlsx")
+    try:
+        loan_fill(path)
+    except ValueError as e:
+        assert "融资信息" in str(e)
+    else:
+        raise AssertionError("没有融资信息时应抛出 ValueError")
+
+
+def test_process_one_records_exit_as_failed(tmp_path, monkeypatch):
+    def exiting(*args, **kwargs):
+        exit()
+
+    monkeypatch.setattr(batch_process, "modify_excel_file", exiting)
+    input_path = _empty_workbook(tmp_path / "a.xlsx")
+    output_path = str(tmp_path / "a_处理结果.xlsm")
+    result = batch_process.process_one(input_path, output_path, quiet=True)
+    assert result["status"] == "failed"
+    assert not os.path.exists(output_path)
+
+
+def test_process_one_records_missing_input(tmp_path):
+    result = batch_process.process_one(str(tmp_path / "missing.xlsm"), str(tmp_path / "out.xlsm"))
+    assert result["status"] == "failed"
+    assert result["message"] == "输入文件不存在"
+
+
+def test_main_writes_summary_and_fails(tmp_path):
+    source = tmp_path / "in"
+    source.mkdir()
+    _empty_workbook(source / "a.xlsx")
+    output_dir = tmp_path / "out"
+
+    code = batch_process.main([str(source), "-o", str(output_dir), "-j", "1", "-q"])
+
+    assert code == 1
+    with open(output_dir / "batch_summary.json", encoding="utf-8") as f:
+        summary = json.load(f)
+    assert summary["total"] == 1
+    assert summary["failed"] == 1
+    assert summary["jobs"][0]["status"] == "failed"
+    assert not os.path.exists(output_dir / "a_处理结果.xlsm")
@@ -0,0 +1,79 @@
+from openpyxl import Workbook
+from openpyxl.cell.cell import Cell
+
+from circulate_formula import ExcelFormulaGenerator
+from copy_formula import ExcelAutoFiller
+from findAndSet import find_all_cells, find_cell, get_year_axis
+from formula_evaluator import recalculate_workbook
+from openpyxl_vba import WorkbookSession
+
+"""
+
+findAndSet 的查找：读取文件时公式表头按缓存值查找；会话中经 ExcelAutoFiller / ExcelFormulaGenerator 改写后索引失效
+
+"""
+
+
+def _workbook(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "S"
+    ws["A2"] = "序号"
+    ws["B2"] = "项目"
+    # 表头年份是公式（如 E.4 表头引用 D.3 表），第一年是常量
+    ws["C2"] = 2025
+    ws["D2"] = "=C2+1"
+    ws["E2"] = "=D2+1"
+    ws["A3"] = "借款1"
+    wb.save(path)
+    return str(path)
+
+
+def test_formula_headers_found_by_cached_value(tmp_path):
+    path = _workbook(tmp_path / "headers.xlsx")
+    recalculate_workbook(path)
+
+    assert find_cell(path, 2025, "S") == (2, "C")
+    assert find_cell(path, 2026, "S") == (2, "D")
+    assert find_all_cells(path, 2027, "S") == [(2, "E")]
+    assert get_year_axis(path, "S").locate(2027) == (2, "E")
+    # 公式文本仍可查找
+    assert find_cell(path, "=C2+1", "S") == (2, "D")
+
+
+def test_formula_headers_without_cached_values(tmp_path):
+    # openpyxl 保存后没有缓存值，与 data_only 读取一样找不到
+    path = _workbook(tmp_path / "plain.xlsx")
+    assert find_cell(path, 2026, "S") == (None, None)
+    assert get_year_axis(path, "S").locate(2026) == (None, None)
+
+
+def test_auto_fill_without_save_invalidates_labels(tmp_path):
+    session = WorkbookSession(_workbook(tmp_path / "session.xlsx"))
+    assert find_cell(session, "借款1", "S") == (3, "A")
+
+    filler = ExcelAutoFiller(session)
+    filler.set_active_sheet("S")
+    filler.auto_fill("B2", "A3", save=False)
+
+    assert find_cell(session, "借款1", "S") == (None, None)
+    assert find_all_cells(session, "项目", "S") == [(2, "B"), (3, "A")]
+
+
+def test_formula_generator_without_save_invalidates_labels(tmp_path):
+    session = WorkbookSession(_workbook(tmp_path / "generator.xlsx"))
+    assert find_cell(session, "借款1", "S") == (3, "A")
+
+    generator = ExcelFormulaGenerator(session, autosave=False)
+    generator.generate_formulas([{
+        "operation": "custom",
+        "formula_template": "=({A_val})",
+        "params": {"A_val": {"sheet": "", "cell": "C2"}},
+        "target": {"sheet": "S", "cell": "A3"},
+    }])
+
+    assert find_cell(session, "借款1", "S") == (None, None)
+
+
+def test_cell_writes_are_not_patched():
+    assert Cell._bind_value.__module__ == "openpyxl.cell.cell"
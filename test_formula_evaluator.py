@@ -0,0 +1,63 @@
+from openpyxl import Workbook
+
+from formula_evaluator import FormulaEvaluator, VALUE
+
+"""
+
+formula_evaluator 的边界情况：空单元格、0~1 之间的日期序列号、单元格计算失败
+
+"""
+
+
+def _evaluate(formulas, values=None):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "S"
+    for address, value in (values or {}).items():
+        ws[address] = value
+    for address, formula in formulas.items():
+        ws[address] = formula
+    return FormulaEvaluator(wb).evaluate()
+
+
+def test_date_parts_of_blank_cell():
+    # 空单元格按序列号 0 处理，Excel 返回 1900-01-00
+    values = _evaluate({"A1": "=YEAR(B1)", "A2": "=MONTH(B1)", "A3": "=DAY(B1)"})
+    assert values[("S", 1, 1)] == 1900
+    assert values[("S", 2, 1)] == 1
+    assert values[("S", 3, 1)] == 0
+
+
+def test_date_parts_of_fraction():
+    values = _evaluate({"A1": "=MONTH(0.5)", "A2": "=YEAR(0.99)"})
+    assert values[("S", 1, 1)] == 1
+    assert values[("S", 2, 1)] == 1900
+
+
+def test_date_parts_of_serial():
+    # 45658 = 2025-01-01，46053.75 = 2026-01-31 18:00
+    values = _evaluate({"A1": "=YEAR(B1)", "A2": "=MONTH(B2)", "A3": "=DAY(B2)"},
+                       {"B1": 45658, "B2": 46053.75})
+    assert values[("S", 1, 1)] == 2025
+    assert values[("S", 2, 1)] == 1
+    assert values[("S", 3, 1)] == 31
+
+
+def test_negative_serial_is_error():
+    values = _evaluate({"A1": "=YEAR(-1)"})
+    assert values[("S", 1, 1)].code == "#NUM!"
+
+
+def test_blank_arithmetic():
+    values = _evaluate({"A1": "=B1+1", "A2": "=B1*2", "A3": "=SUM(B1:B3)", "A4": "=B1"})
+    assert values[("S", 1, 1)] == 1
+    assert values[("S", 2, 1)] == 0
+    assert values[("S", 3, 1)] == 0
+    assert values[("S", 4, 1)] == 0
+
+
+def test_failed_cell_does_not_abort_evaluate():
+    # 单个单元格出错只得到 #VALUE!，其他单元格照常计算
+    values = _evaluate({"A1": '=YEAR("abc")', "A2": "=1+1"})
+    assert values[("S", 1, 1)].code == VALUE.code
+    assert values[("S", 2, 1)] == 2
@@ -0,0 +1,98 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import loan_calculate
+from formula_evaluator import recalculate_workbook
+from loan_calculate import loan_fill
+from loan_schedule import REPAYMENT_METHODS, compute_schedules
+from openpyxl_vba import load_workbook
+
+"""
+
+向量化的还本付息计划（loan_schedule.compute_schedules）与 write_loan / repay_method_cal 写入表c的公式核对
+7 种还款方式各生成一次表c，用公式计算器算出各笔借款的明细行，与 compute_schedules 的结果逐格比较
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+C1_SHEET = "C.1项目融资信息"
+
+# 模板 C.1 表第 4~7 行是 4 笔借款：E 开始时间，G 借款周期（年），I 还款方式
+MARCH_2027 = 46447
+# 每种还款方式的借款周期：后 n 年还本要求借款周期不少于 n 年；其他方式混合 10 年以下（按年付息）和 10 年以上（半年付息）
+TERMS = {
+    "到期一次性还清": [20, 5, 15, 3],
+    "贷款期内本期等额本金还款": [20, 5, 15, 3],
+    "贷款期内本期等额本息还款": [20, 5, 15, 3],
+    "后五年每年还本20%": [20, 5, 15, 8],
+    "后十年每年还本10%": [20, 10, 15, 12],
+    "后二十年每年还本5%": [20, 20, 25, 20],
+    "自定义还款": [20, 5, 15, 3],
+}
+
+
+def _prepare(tmp_path, method):
+    path = str(tmp_path / "loan.xlsm")
+    shutil.copy(TEMPLATE, path)
+    wb = load_workbook(path)
+    ws = wb[C1_SHEET]
+    for row, term in zip(range(4, 8), TERMS[method]):
+        ws[f"G{row}"] = term
+        ws[f"I{row}"] = method
+    # 第 3 笔借款改为上半年开始，覆盖半年付息首年、最后一年各付半年的情况
+    ws["E6"] = MARCH_2027
+    wb.save(path)
+    # read_financing_info 读取缓存值，先写入公式结果
+    recalculate_workbook(path)
+    return path
+
+
+@pytest.mark.parametrize("method", list(REPAYMENT_METHODS))
+def test_schedule_matches_formulas(tmp_path, monkeypatch, method):
+    checks = []
+    check_schedules = loan_calculate.LoanRepaymentSystem.check_schedules
+
+    def recording(self, *args, **kwargs):
+        checks.append(check_schedules(self, *args, **kwargs))
+        return checks[-1]
+
+    monkeypatch.setattr(loan_calculate.LoanRepaymentSystem, "check_schedules", recording)
+    loan_fill(_prepare(tmp_path, method))
+
+    assert checks == [[]]
+
+
+def test_maturity_schedule():
+    # 100 万元、3 年期、利率 10%，2025 年 1 月一次提清，到期一次性还清
+    values = compute_schedules([100], [2025], [2028], [3], [0.1], ["到期一次性还清"], range(2024, 2030))
+    np.testing.assert_allclose(values["还本"][0], [0, 0, 0, 0, 100, 0])
+    np.testing.assert_allclose(values["期初借款余额"][0], [0, 0, 100, 100, 100, 0])
+    np.testing.assert_allclose(values["期末借款余额"][0], [0, 100, 100, 100, 0, 0])
+    np.testing.assert_allclose(values["付息"][0], [0, 10, 10, 10, 10, 0])
+    np.testing.assert_allclose(values["当期还本付息"][0], [0, 10, 10, 10, 110, 0])
+
+
+def test_output_rows_from_arrays():
+    system = loan_calculate.LoanRepaymentSystem()
+    system.add_loan({'序号': 1, '借款名称': '借款1', '借款类别': '', '借款金额（万元）': 100, '开始时间': 45658,
+                     '结束时间': 46753, '借款周期（年）': 3, '借款利率': 0.1, '还款方式': '到期一次性还清',
+                     '首年计息月份': 45658, '债券发行费（万元）': 0, '债券发行登记服务费（万元）': 0,
+                     '债券还本付息兑付手续费（万元）': 0})
+    years = system.calculate_years_range()
+    values = system.compute_schedules(years)
+    loan = system.loans[0]
+
+    rows = loan.output_rows(years, {column: array[0] for column, array in values.items()})
+    assert rows[0][:2] == [1, '借款1']
+    labels = {row[1]: row for row in rows[1:]}
+    assert labels["其中：还本"][2:] == [100.0, 0.0, 0.0, 0.0, 100.0]
+    assert labels["付息"][2] == pytest.approx(40.0)
+    # 余额合计列为 0
+    assert labels["期末借款余额"][2] == 0.0
+
+    # 旧接口 get_output_table 仍按 DataFrame 输出同样的内容
+    table = loan.get_output_table(years)
+    assert table.values.tolist() == rows
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from formula_evaluator import recalculate_workbook
+from openpyxl_vba import load_workbook
+from plan_cache import load_cached_plan, plan_key, store_plan
+from write_plan import WritePlan
+
+"""
+
+写入计划缓存的键：只有借款结构、建设期/运营期、年份范围或模板变化时才换键，金额等数值变化沿用同一计划
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+TEMPLATE_HASH = "template"
+
+
+def _variant(tmp_path, name, edits=None):
+    """模板副本，edits 为 {(表名, 单元格): 值}；修改后写入公式计算结果（读取借款信息、日期用的是缓存值）"""
+    path = str(tmp_path / f"{name}.xlsm")
+    wb = load_workbook(TEMPLATE)
+    for (sheet, address), value in (edits or {}).items():
+        wb[sheet][address] = value
+    wb.save(path)
+    recalculate_workbook(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def base_key(tmp_path_factory):
+    return plan_key(_variant(tmp_path_factory.mktemp("base"), "base"), TEMPLATE_HASH)
+
+
+def test_same_structure_same_key(tmp_path, base_key):
+    # 借款金额、利率是公式引用的输入数据，不影响生成结构
+    path = _variant(tmp_path, "amount", {("C.1项目融资信息", "D4"): 999, ("C.1项目融资信息", "D5"): 1})
+    assert plan_key(path, TEMPLATE_HASH) == base_key
+
+
+@pytest.mark.parametrize("edits", [
+    # 还款方式
+    {("C.1项目融资信息", "I5"): "后五年每年还本20%"},
+    # 借款周期 → 结束年份和表头年份范围
+    {("C.1项目融资信息", "G7"): 25},
+    # 开始时间（同一年内换到上半年，付息公式不同）
+    {("C.1项目融资信息", "E4"): 45748},
+    # 建设分期二的开始年份（2027-01 → 2028-01）
+    {("B项目信息", "D10"): 46753},
+    # 运营开始年份（=D5+31 → 2028-01）
+    {("B项目信息", "D7"): 46753},
+], ids=["method", "term", "start_month", "construction", "operation"])
+def test_structure_change_misses(tmp_path, base_key, edits):
+    path = _variant(tmp_path, "changed", edits)
+    assert plan_key(path, TEMPLATE_HASH) != base_key
+
+
+def test_template_change_misses(tmp_path, base_key):
+    path = _variant(tmp_path, "template")
+    assert plan_key(path, TEMPLATE_HASH) == base_key
+    assert plan_key(path, "other-template") != base_key
+
+
+def test_store_and_load_plan(tmp_path):
+    plan = WritePlan()
+    plan.meta["last_year"] = 2048
+    store_plan("key", plan, str(tmp_path))
+    assert load_cached_plan("key", str(tmp_path)).meta == {"last_year": 2048}
+    assert load_cached_plan("missing", str(tmp_path)) is None
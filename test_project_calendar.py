@@ -0,0 +1,41 @@
+import os
+
+from openpyxl import Workbook
+
+from formula_evaluator import FormulaEvaluator
+from openpyxl_vba import load_workbook
+from project_calendar import ProjectCalendar
+
+"""
+
+项目日历：文件没有缓存值时只计算日期单元格依赖的公式
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+
+
+def test_evaluate_cells_only_computes_precedents():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "S"
+    ws["A1"] = 45658
+    ws["A2"] = "=A1+31"
+    ws["A3"] = "=YEAR(A2)"
+    ws["B1"] = "=1/0"
+    evaluator = FormulaEvaluator(wb)
+    assert evaluator.evaluate_cells([("S", 3, 1)]) == {("S", 3, 1): 2025}
+    assert ("S", 1, 2) not in evaluator.values
+
+
+def test_calendar_without_cached_values(tmp_path):
+    expected = ProjectCalendar.from_workbook(TEMPLATE)
+
+    # openpyxl 直接保存的文件公式单元格没有缓存值
+    stripped = str(tmp_path / "stripped.xlsm")
+    load_workbook(TEMPLATE).save(stripped)
+    calendar = ProjectCalendar.from_workbook(stripped)
+
+    assert calendar.construction == expected.construction
+    assert calendar.operating_years == expected.operating_years
+    assert calendar.operation_start == expected.operation_start
@@ -0,0 +1,55 @@
+import os
+
+from openpyxl import load_workbook as original_load_workbook
+
+from formula_evaluator import values_match
+from scenario_sweep import SWEEP_OUTPUTS, build_grid, sweep
+from what_if import WhatIfModel
+from xlsm_splice import package_parts
+
+"""
+
+情景扫描：参数网格展开、各情景的指标与单独计算一致、输出的 .xlsm 保留全部部件、单个情景失败不影响其他情景
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+FEE_RATE = ("A财务假设", "债券还本付息兑付手续费率")
+
+
+def test_build_grid():
+    scenarios = build_grid({"A!B1": [1, 2], "A!B2": [3, 4, 5]})
+    assert len(scenarios) == 6
+    assert scenarios[0] == {"A!B1": 1, "A!B2": 3}
+    assert scenarios[-1] == {"A!B1": 2, "A!B2": 5}
+    assert build_grid([{"A!B1": 1}]) == [{"A!B1": 1}]
+
+
+def test_sweep(tmp_path):
+    # base_path 直接用模板（已经是生成好的表格），跳过 modify_excel_file
+    grid = [{FEE_RATE: 0.01}, {FEE_RATE: 0.02}, {"不存在的表!A1": 1}]
+    results = sweep(TEMPLATE, grid, processes=1, base_path=TEMPLATE, materialize=[1], output_dir=str(tmp_path))
+
+    assert [r["index"] for r in results] == [0, 1, 2]
+    model = WhatIfModel(TEMPLATE, SWEEP_OUTPUTS)
+    for result, overrides in zip(results[:2], grid):
+        assert result["error"] is None and not result["rebuilt"]
+        expected = model.run(overrides, changed_only=False)
+        for key, values in expected.items():
+            for year, value in values.items():
+                assert values_match(value, result["outputs"][key][year]), (key, year)
+    assert results[0]["outputs"] != results[1]["outputs"]
+
+    # 只输出第 1 个情景，控件、宏等部件都在，输入值和公式缓存值已写入
+    assert results[0]["file"] is None
+    output = results[1]["file"]
+    assert os.listdir(tmp_path) == [os.path.basename(output)]
+    assert package_parts(output) == package_parts(TEMPLATE)
+    assert original_load_workbook(output)["A财务假设"]["D18"].value == 0.02
+    cached = original_load_workbook(output, data_only=True)
+    for key, cells in model.outputs.items():
+        for year, (sheet_name, row, col) in cells.items():
+            assert values_match(cached[sheet_name].cell(row=row, column=col).value,
+                                results[1]["outputs"][key][year]), (key, year)
+
+    assert results[2]["error"] and results[2]["outputs"] is None
@@ -0,0 +1,94 @@
+from openpyxl import Workbook
+from openpyxl import load_workbook as original_load_workbook
+
+from openpyxl_vba import WorkbookSession
+from table_spec import compile_table, fill_table, resolve_anchor
+
+"""
+
+表格规格编译：各类锚点的定位、按年份横向/向下展开、缺少锚点时跳过，以及写入计划写进工作簿
+
+"""
+
+SPEC = {
+    "sheet": "目标",
+    "anchors": {
+        "total": {"sheet": "源", "last_row": True, "col": "D"},
+        "subsidy": {"sheet": "源", "label": "补贴收入", "col": "D"},
+        "subsidies": {"sheet": "源", "label": "补贴收入", "col": "D", "all": True},
+        "last_subsidy": {"sheet": "源", "label": "补贴收入", "col": "D", "occurrence": -1},
+        "first": {"cell": "A1"},
+        "unused": {"sheet": "不存在的表", "label": "不会查找"},
+    },
+    "formulas": [
+        {"target": "B4", "template": "=({total}-{subsidy})"},
+        {"target": "B5", "template": "=({subsidies})", "count": 2},
+        {"target": {"label": "合计", "col_offset": 1}, "template": "=({last_subsidy})", "count_from": "C"},
+        {"target": "A7", "template": "={first}*2", "count": 3, "direction": "down"},
+        {"target": "B10", "template": "=({missing})"},
+        {"target": {"label": "不存在"}, "template": "=({total})"},
+    ],
+    "count_offset": -1,
+}
+
+
+def _workbook(tmp_path, name="spec"):
+    wb = Workbook()
+    source = wb.active
+    source.title = "源"
+    for row, label in enumerate(["项目", "收入", "补贴收入", "补贴收入", "合计"], start=1):
+        source.cell(row=row, column=1, value=label)
+        for col in range(4, 8):
+            source.cell(row=row, column=col, value=row * col)
+    target = wb.create_sheet("目标")
+    target["A3"] = "合计"
+    path = str(tmp_path / f"{name}.xlsx")
+    wb.save(path)
+    return path
+
+
+def test_resolve_anchor(tmp_path):
+    path = _workbook(tmp_path)
+    lookups = {}
+    anchors = SPEC["anchors"]
+    assert resolve_anchor(path, anchors["total"], lookups) == "D5"
+    assert resolve_anchor(path, anchors["subsidy"], lookups) == "D3"
+    assert resolve_anchor(path, anchors["subsidies"], lookups) == ["D3", "D4"]
+    assert resolve_anchor(path, anchors["last_subsidy"], lookups) == "D4"
+    assert resolve_anchor(path, {"row": 2, "col": "last_col"}, lookups, last_col="F") == "F2"
+    assert resolve_anchor(path, {"sheet": "源", "label": "不存在"}, lookups) is None
+    # 同一次编译内相同的查找只做一次
+    assert ("label", "源", "补贴收入") in lookups and ("last_row", "源", None) in lookups
+
+
+def test_compile_table(tmp_path):
+    path = _workbook(tmp_path)
+    plan = compile_table(path, SPEC, "E")
+    assert plan == [
+        # 年数 = E - B + count_offset(-1) = 2
+        ("目标", 4, 2, "=('源'!D5-'源'!D3)"),
+        ("目标", 4, 3, "=('源'!E5-'源'!E3)"),
+        ("目标", 5, 2, "=('源'!D3+'源'!D4)"),
+        ("目标", 5, 3, "=('源'!E3+'源'!E4)"),
+        # 目标为"合计"右侧一列（B3），年数按 C 列计算 = 1
+        ("目标", 3, 2, "=('源'!D4)"),
+        ("目标", 7, 1, "=A1*2"),
+        ("目标", 8, 1, "=A2*2"),
+        ("目标", 9, 1, "=A3*2"),
+    ]
+
+
+def test_fill_table(tmp_path):
+    path = _workbook(tmp_path)
+    plan = compile_table(path, SPEC, "E")
+    assert fill_table(path, SPEC, "E") == len(plan)
+    ws = original_load_workbook(path)["目标"]
+    for _, row, col, formula in plan:
+        assert ws.cell(row=row, column=col).value == formula
+
+    # WorkbookSession 只记录修改，写入的内容在内存中的工作簿里
+    session = WorkbookSession(_workbook(tmp_path, "session"))
+    generation = session.generation
+    fill_table(session, SPEC, "E")
+    assert session.generation > generation and session.dirty
+    assert session.wb["目标"]["C5"].value == "=('源'!E3+'源'!E4)"
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from formula_evaluator import FormulaEvaluator, values_match
+from openpyxl_vba import load_workbook
+from what_if import WhatIfModel
+
+"""
+
+假设分析：增量重算的结果与整体重新计算一致，情景计算后恢复原状态
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+FEE_RATE = ("A财务假设", "债券还本付息兑付手续费率")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return WhatIfModel(TEMPLATE)
+
+
+def test_resolve_forms(model):
+    cell = model.resolve(FEE_RATE)
+    assert cell == ("A财务假设", 18, 4)
+    assert model.resolve("A财务假设!D18") == cell
+    assert model.resolve("'A财务假设'!$D$18") == cell
+    assert model.resolve(("A财务假设", "D18")) == cell
+    assert model.resolve(("A财务假设", 18, 4)) == cell
+    with pytest.raises(ValueError):
+        model.resolve("D18")
+
+
+def test_run_matches_full_evaluation(model):
+    scenario = model.run({FEE_RATE: 0.01}, changed_only=False)
+
+    wb = load_workbook(TEMPLATE)
+    wb["A财务假设"]["D18"] = 0.01
+    full = FormulaEvaluator(wb).evaluate()
+    for key, cells in model.outputs.items():
+        for year, cell in cells.items():
+            assert values_match(full[cell], scenario[key][year]), (key, year)
+
+
+def test_run_restores_state(model):
+    before = model.values()
+    changes = model.run({FEE_RATE: 0.01})
+    assert changes
+    for key, diff in changes.items():
+        for year, (old, new) in diff.items():
+            assert values_match(old, before[key][year])
+            assert not values_match(old, new)
+    assert model.values() == before
+
+
+def test_unchanged_input_reports_nothing(model):
+    value = model.wb["A财务假设"]["D18"].value
+    assert model.run({FEE_RATE: value}) == {}
+    outputs = [("c借款还本付息计划表", "利息备付率（%）")]
+    result = model.run({FEE_RATE: 0.01}, outputs=outputs)
+    assert list(result) == outputs
@@ -0,0 +1,89 @@
+import os
+import shutil
+
+import pytest
+from openpyxl import load_workbook as original_load_workbook
+from openpyxl.worksheet.formula import ArrayFormula
+
+import plan_cache
+from excel_modifier_simple import modify_excel_file, plan_excel_file
+from write_plan import WritePlan, diff_plans
+
+"""
+
+写入计划：dry run 不改动输入文件，套用计划得到的工作簿与完整运行各阶段的结果相同
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+
+
+def _value(cell):
+    # 数组公式对象不能直接比较
+    if isinstance(cell.value, ArrayFormula):
+        return cell.value.ref, cell.value.text
+    return cell.value
+
+
+def _snapshot(file_path):
+    """各表的 {(行, 列): 值}（公式为文本）、合并区域，以及工作表顺序"""
+    wb = original_load_workbook(file_path)
+    sheets = {}
+    for ws in wb.worksheets:
+        cells = {key: _value(cell) for key, cell in ws._cells.items() if cell.value is not None}
+        sheets[ws.title] = (cells, sorted(str(r) for r in ws.merged_cells.ranges))
+    return wb.sheetnames, sheets
+
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp("plan")
+    input_path = str(work_dir / "input.xlsm")
+    shutil.copy2(TEMPLATE, input_path)
+    with open(input_path, "rb") as f:
+        original = f.read()
+    success, plan = plan_excel_file(input_path)
+    assert success, plan
+    with open(input_path, "rb") as f:
+        assert f.read() == original   # dry run 不写输入文件
+
+    output_path = str(work_dir / "full.xlsm")
+    success, message = modify_excel_file(input_path, output_path)
+    assert success, message
+    return input_path, plan, _snapshot(output_path)
+
+
+def test_plan_meta(generated):
+    _, plan, _ = generated
+    assert len(plan) > 0
+    assert plan.meta["last_year"] == 2048
+    assert plan.meta["template_hash"]
+
+
+def test_apply_plan_matches_full_run(generated, tmp_path):
+    input_path, plan, expected = generated
+    output_path = str(tmp_path / "planned.xlsm")
+    success, message = modify_excel_file(input_path, output_path, plan=plan)
+    assert success, message
+    assert _snapshot(output_path) == expected
+
+
+def test_plan_save_and_load(generated, tmp_path):
+    _, plan, _ = generated
+    path = str(tmp_path / "plan.pickle")
+    plan.save(path)
+    loaded = WritePlan.load(path)
+    assert len(loaded) == len(plan) and loaded.meta == plan.meta
+    assert diff_plans(plan, loaded) == {"added": {}, "removed": {}, "changed": {}}
+
+
+def test_plan_cache_hit(generated, tmp_path, monkeypatch):
+    input_path, _, expected = generated
+    monkeypatch.setattr(plan_cache, "DEFAULT_PLAN_CACHE_DIR", str(tmp_path / "cache"))
+    first = str(tmp_path / "first.xlsm")
+    second = str(tmp_path / "second.xlsm")
+    assert modify_excel_file(input_path, first, use_plan_cache=True)[0]
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    assert modify_excel_file(input_path, second, use_plan_cache=True)[0]
+    assert _snapshot(first) == expected
+    assert _snapshot(second) == expected
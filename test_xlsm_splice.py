@@ -0,0 +1,75 @@
+import os
+import zipfile
+
+from openpyxl import load_workbook as original_load_workbook
+
+from openpyxl_vba import WorkbookSession, load_workbook, save_workbook
+from xlsm_splice import package_parts, sheet_parts
+
+"""
+
+拼接保存的往返：改写单元格后保存，vbaProject.bin、控件、绘图等部件原样保留，修改的值可以读回
+
+"""
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "财务分析套表自做模板编程用校验测试（8.27版）.xlsm")
+# 带表单控件的工作表
+CONTROL_SHEET = "A财务假设"
+KEPT_PREFIXES = ("xl/vbaProject.bin", "xl/activeX/", "xl/ctrlProps/", "xl/drawings/", "xl/media/",
+                 "xl/comments", "xl/externalLinks/", "xl/sharedStrings.xml", "xl/worksheets/_rels/")
+
+
+def _read_parts(file_path):
+    with zipfile.ZipFile(file_path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}, sheet_parts(archive)
+
+
+def _check_round_trip(out, changed_sheet, cell, value):
+    source, source_sheets = _read_parts(TEMPLATE)
+    saved, saved_sheets = _read_parts(out)
+
+    assert package_parts(out) == package_parts(TEMPLATE)
+    assert saved_sheets == source_sheets
+    for name, data in source.items():
+        if name.startswith(KEPT_PREFIXES):
+            assert saved[name] == data, name
+    # 没有修改的工作表逐字节复制
+    for title, part in source_sheets.items():
+        if title != changed_sheet:
+            assert saved[part] == source[part], title
+    # 修改的工作表只重写单元格部分，控件和绘图的引用还在
+    xml = saved[source_sheets[changed_sheet]].decode("utf-8")
+    original = source[source_sheets[changed_sheet]].decode("utf-8")
+    assert xml != original
+    for tag in ("<controls", "<legacyDrawing"):
+        assert tag in original and tag in xml, tag
+
+    wb = original_load_workbook(out, keep_vba=True)
+    assert wb[changed_sheet][cell].value == value
+
+
+def test_session_round_trip(tmp_path):
+    out = str(tmp_path / "session.xlsm")
+    session = WorkbookSession(TEMPLATE)
+    ws = session.wb[CONTROL_SHEET]
+    ws["Z200"] = "拼接保存"
+    save_workbook(session.wb, session)
+    session.save(out)
+    _check_round_trip(out, CONTROL_SHEET, "Z200", "拼接保存")
+
+
+def test_file_round_trip(tmp_path):
+    # openpyxl_vba.load_workbook / save_workbook 从文件加载再保存，同样以来源文件为底稿
+    out = str(tmp_path / "file.xlsm")
+    wb = load_workbook(TEMPLATE)
+    wb[CONTROL_SHEET]["Z200"] = 12.5
+    save_workbook(wb, out)
+    _check_round_trip(out, CONTROL_SHEET, "Z200", 12.5)
+
+
+def test_unchanged_save_copies_every_part(tmp_path):
+    out = str(tmp_path / "unchanged.xlsm")
+    WorkbookSession(TEMPLATE).save(out)
+    source, _ = _read_parts(TEMPLATE)
+    saved, _ = _read_parts(out)
+    assert saved == source
@@ -0,0 +1,144 @@
+import re
+
+from openpyxl.utils import column_index_from_string
+
+from findAndSet import SheetLabelIndex, YearAxis
+from formula_evaluator import FormulaEvaluator, values_match
+from openpyxl_vba import load_workbook
+
+"""
+
+假设分析（what-if）
+生成好的工作簿只加载、建图、计算一次；之后每次给出若干输入单元格的新值（如 A财务假设 中的利率、费率，D.4 中的周转天数），
+只重算受影响的下游公式，返回关键指标的变化，不需要重新跑 modify_excel_file 或打开 Excel
+
+用法:
+    model = WhatIfModel("输出.xlsm")
+    model.run({"A财务假设!D18": 0.0001})
+    model.run({("A财务假设", "债券还本付息兑付手续费率"): 0.0001})   # 按 名称 找到同一行的参考值单元格
+
+"""
+
+# 默认关注的指标：(工作表, 项目名称[, 第几次出现])，取该行各年份列的值
+KEY_OUTPUTS = [
+    ("c借款还本付息计划表", "利息备付率（%）"),
+    ("c借款还本付息计划表", "偿债备付率（%）"),
+    ("a.1财务现金流量表", "所得税前净现金流量（1-2）"),
+    ("a.1财务现金流量表", "所得税后净现金流量（3-5）"),
+    ("a.2项目资本金现金流量表", "净现金流量"),
+]
+
+_ADDRESS_PATTERN = re.compile(r"^(?:'?(?P<sheet>.+?)'?!)?\$?(?P<col>[A-Za-z]{1,3})\$?(?P<row>\d+)$")
+
+
+def resolve_cell(wb, target, label_index=None):
+    """
+    把输入位置转成 (表名, 行, 列)，支持:
+        "A财务假设!D18"、("A财务假设", "D18")、("A财务假设", 18, 4)、
+        ("A财务假设", "债券还本付息兑付手续费率") —— 名称所在行的"参考值"列
+    label_index: 可选，表名 → SheetLabelIndex 的函数（复用已建好的索引）
+    """
+    if isinstance(target, str):
+        match = _ADDRESS_PATTERN.match(target)
+        if not match or not match.group("sheet"):
+            raise ValueError(f"无法识别的单元格地址: {target}")
+        return match.group("sheet"), int(match.group("row")), column_index_from_string(match.group("col").upper())
+    if len(target) == 3:
+        return tuple(target)
+    sheet_name, address = target
+    match = _ADDRESS_PATTERN.match(address)
+    if match and not match.group("sheet"):
+        return sheet_name, int(match.group("row")), column_index_from_string(match.group("col").upper())
+    index = label_index(sheet_name) if label_index else SheetLabelIndex(wb[sheet_name])
+    row, _ = index.find_first(address)
+    _, value_col = index.find_first("参考值")
+    if row is None or value_col is None:
+        raise ValueError(f"在 {sheet_name} 中未找到: {address}")
+    return sheet_name, row, value_col
+
+
+class WhatIfModel:
+    """
+    基于公式依赖图的假设分析模型
+
+    参数:
+        file_path: 生成好的工作簿路径或 WorkbookSession
+        outputs: 关注的指标 [(工作表, 项目名称[, 第几次出现]), ...]，默认 KEY_OUTPUTS
+    """
+
+    def __init__(self, file_path, outputs=None):
+        self.wb = load_workbook(file_path)
+        self.evaluator = FormulaEvaluator(self.wb)
+        self.evaluator.evaluate()
+        self._label_indexes = {}
+        self.outputs = {}
+        for output in (outputs or KEY_OUTPUTS):
+            cells = self.output_cells(*output)
+            if cells:
+                self.outputs[tuple(output)] = cells
+            else:
+                print(f"未找到指标: {output}")
+
+    def _label_index(self, sheet_name):
+        if sheet_name not in self._label_indexes:
+            self._label_indexes[sheet_name] = SheetLabelIndex(self.wb[sheet_name])
+        return self._label_indexes[sheet_name]
+
+    def output_cells(self, sheet_name, label, occurrence=0):
+        """
+        指标所在行的各年份单元格 {年份: (表名, 行, 列)}
+        occurrence: 同名项目出现多次时取第几个，-1 为最后一个（如表c中"借款总结"下的期末借款余额）
+        """
+        if sheet_name not in self.wb.sheetnames:
+            return {}
+        coords = self._label_index(sheet_name).find_all(label)
+        try:
+            row, _ = coords[occurrence]
+        except IndexError:
+            return {}
+        ws = self.wb[sheet_name]
+        axis = YearAxis(ws)
+        cells = {}
+        for col in range(1, ws.max_column + 1):
+            year = axis.year(col)
+            if year is not None and year not in cells:
+                cells[year] = (sheet_name, row, col)
+        return cells
+
+    def resolve(self, target):
+        """把输入位置转成 (表名, 行, 列)，写法见 resolve_cell"""
+        return resolve_cell(self.wb, target, self._label_index)
+
+    def values(self, outputs=None):
+        """当前状态下各指标的值 {(工作表, 项目名称): {年份: 值}}"""
+        result = {}
+        for key in (outputs or self.outputs):
+            result[key] = {year: self.evaluator.cell_value(*cell) for year, cell in self.outputs[key].items()}
+        return result
+
+    def run(self, overrides, outputs=None, changed_only=True):
+        """
+        计算一个情景：替换输入单元格的值，重算下游公式后恢复原状态
+
+        参数:
+            overrides: {输入位置: 新值}，输入位置的写法见 resolve
+            outputs: 只返回这些指标，默认全部
+            changed_only: True 时只返回有变化的年份 {年份: (原值, 新值)}，数值按相对误差比较，
+                          重算顺序不同带来的浮点误差不算变化；False 时返回情景下的全部值 {年份: 值}
+        返回:
+            {(工作表, 项目名称): {...}}
+        """
+        cells = {self.resolve(target): value for target, value in overrides.items()}
+        changes = self.evaluator.recalculate(cells)
+        try:
+            if not changed_only:
+                return self.values(outputs)
+            result = {}
+            for key in (outputs or self.outputs):
+                diff = {year: changes[cell] for year, cell in self.outputs[key].items()
+                        if cell in changes and not values_match(*changes[cell])}
+                if diff:
+                    result[key] = diff
+            return result
+        finally:
+            self.evaluator.restore(changes)
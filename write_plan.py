@@ -0,0 +1,281 @@
+import pickle
+from array import array
+from copy import copy
+
+from openpyxl.cell.cell import Cell, MergedCell
+
+"""
+
+写入计划
+把一次生成对工作簿的全部修改记录成紧凑的列式计划：每个单元格写入一行（表、行、列、值/公式、样式号），
+外加每个表的合并单元格、列宽/行高，以及新建、删除的工作表。计划可以保存、比较（不同模板版本之间），
+也可以套用到另一个工作簿上，一次按 表 → 行 → 列 的顺序写完
+
+扩展表头时，新列中的常量（如"融资利率"行的利率、"/"）是从同一行左侧复制来的项目数据。这类条目记为
+"取自同一行第几列"，套用时读取目标工作簿中该单元格的值，计划可以套用到数据不同、结构相同的其他项目上
+
+各阶段会读取自己刚写入的内容（扩展后的表头、最后一行等），所以计划通过"在内存中的副本上运行各阶段，
+再与原模板比较"得到，生成过程中不写磁盘
+
+"""
+
+PLAN_VERSION = 2
+
+
+def _style_key(cell):
+    # 新建且未设置过样式的单元格 _style 为 None，与默认样式相同
+    return tuple(cell._style) if cell._style else (0,) * 9
+
+
+def _style_objects(cell):
+    """单元格样式的可移植形式，套用到其他工作簿时由 openpyxl 在目标工作簿的样式表中查找或追加"""
+    # cell.font 等返回的是只读代理，复制出样式对象本身才能序列化
+    return (copy(cell.font), copy(cell.fill), copy(cell.border), cell.number_format,
+            copy(cell.protection), copy(cell.alignment))
+
+
+class WritePlan:
+    """
+    列式写入计划
+
+    sheet_ids / rows / cols / styles 为等长数组，values 为等长列表；
+    sheet_ids 是 sheet_names 的下标，styles 是 style_table 的下标
+    """
+
+    def __init__(self):
+        self.sheet_names = []
+        self.sheet_ids = array('H')
+        self.rows = array('I')
+        self.cols = array('H')
+        self.values = []
+        self.styles = array('I')
+        self.style_table = []
+        self.sources = {}        # {条目下标: 列号}，值取自目标工作簿同一行该列的条目
+        self.merged = {}         # {表名: [合并区域, ...]}，只记录与模板不同的表
+        self.column_widths = {}  # {表名: {列字母: 宽度}}
+        self.row_heights = {}    # {表名: {行号: 高度}}
+        self.new_sheets = []     # 模板中没有、生成时新建的表
+        self.removed_sheets = []
+        self.sheet_order = []    # 生成后的工作表顺序
+        self.meta = {}           # 调用方附加的信息（如模板哈希、最后一年）
+        self._sheet_index = {}
+        self._style_index = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def _sheet_id(self, sheet_name):
+        if sheet_name not in self._sheet_index:
+            self._sheet_index[sheet_name] = len(self.sheet_names)
+            self.sheet_names.append(sheet_name)
+        return self._sheet_index[sheet_name]
+
+    def _style_id(self, cell):
+        key = _style_key(cell)
+        if key not in self._style_index:
+            self._style_index[key] = len(self.style_table)
+            self.style_table.append(_style_objects(cell))
+        return self._style_index[key]
+
+    def add(self, sheet_name, row, col, value, style_cell, source_col=None):
+        """记录一个单元格写入，样式取自 style_cell；source_col 不为空时值取自同一行该列"""
+        if source_col is not None:
+            self.sources[len(self.values)] = source_col
+        self.sheet_ids.append(self._sheet_id(sheet_name))
+        self.rows.append(row)
+        self.cols.append(col)
+        self.values.append(value)
+        self.styles.append(self._style_id(style_cell))
+
+    def entries(self):
+        """逐条返回 (表名, 行号, 列号, 值, 样式号)"""
+        for i in range(len(self.values)):
+            yield self.sheet_names[self.sheet_ids[i]], self.rows[i], self.cols[i], self.values[i], self.styles[i]
+
+    def formulas(self):
+        """计划中写入公式的单元格 {(表名, 行号, 列号): 公式}，用于比较两个计划"""
+        return {(sheet, row, col): value for sheet, row, col, value, _ in self.entries()
+                if isinstance(value, str) and value.startswith("=")}
+
+    def save(self, file_path):
+        state = dict(self.__dict__)
+        state.pop("_sheet_index")
+        state.pop("_style_index")
+        with open(file_path, "wb") as f:
+            pickle.dump((PLAN_VERSION, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_path):
+        """读取计划；格式版本不同时返回 None"""
+        with open(file_path, "rb") as f:
+            version, state = pickle.load(f)
+        if version != PLAN_VERSION:
+            return None
+        plan = cls()
+        plan.__dict__.update(state)
+        plan._sheet_index = {name: i for i, name in enumerate(plan.sheet_names)}
+        return plan
+
+
+def _row_values(cells):
+    """{行号: [(列号, 值), ...]}，只包含常量单元格"""
+    rows = {}
+    for (row, col), cell in sorted(cells.items()):
+        value = cell.value
+        if value is None or isinstance(cell, MergedCell) or (isinstance(value, str) and value.startswith("=")):
+            continue
+        rows.setdefault(row, []).append((col, value))
+    return rows
+
+
+def _source_col(row_values, col, value):
+    """同一行中 col 左侧最近的、值（及类型）相同的模板单元格列号，没有时返回 None"""
+    if value is None or (isinstance(value, str) and value.startswith("=")):
+        return None
+    for source_col, source_value in reversed(row_values):
+        if source_col < col and type(source_value) is type(value) and source_value == value:
+            return source_col
+    return None
+
+
+def capture_plan(template_wb, result_wb):
+    """
+    比较原模板和生成后的工作簿，得到写入计划
+
+    template_wb: 生成前的工作簿（与 result_wb 从同一个文件加载，样式表的下标一致）
+    result_wb: 运行各阶段后的工作簿
+    """
+    plan = WritePlan()
+    plan.sheet_order = list(result_wb.sheetnames)
+    plan.removed_sheets = [name for name in template_wb.sheetnames if name not in result_wb.sheetnames]
+
+    for ws in result_wb.worksheets:
+        if ws.title in template_wb.sheetnames:
+            template_ws = template_wb[ws.title]
+            template_cells = template_ws._cells
+        else:
+            template_ws = None
+            template_cells = {}
+            plan.new_sheets.append(ws.title)
+        template_rows = _row_values(template_cells)
+
+        cells = ws._cells
+        for key in sorted(set(cells) | set(template_cells)):
+            cell = cells.get(key)
+            old = template_cells.get(key)
+            if isinstance(cell, MergedCell):
+                continue  # 合并区域内的单元格由合并操作生成
+            if cell is None:
+                # 生成过程中被删除的单元格（如整行删除）
+                if old.value is not None or old.has_style:
+                    plan.add(ws.title, key[0], key[1], None, Cell(ws))
+                continue
+            if old is not None and not isinstance(old, MergedCell) \
+                    and old.value == cell.value and type(old.value) is type(cell.value) \
+                    and old._style == cell._style:
+                continue
+            source_col = _source_col(template_rows.get(key[0], ()), key[1], cell.value)
+            plan.add(ws.title, key[0], key[1], cell.value, cell, source_col)
+
+        merged = sorted(str(r) for r in ws.merged_cells.ranges)
+        if template_ws is None or merged != sorted(str(r) for r in template_ws.merged_cells.ranges):
+            plan.merged[ws.title] = merged
+
+        widths = {}
+        for letter, dim in ws.column_dimensions.items():
+            old_dim = template_ws.column_dimensions.get(letter) if template_ws is not None else None
+            if old_dim is None or old_dim.width != dim.width:
+                widths[letter] = dim.width
+        if widths:
+            plan.column_widths[ws.title] = widths
+
+        heights = {}
+        for row, dim in ws.row_dimensions.items():
+            old_dim = template_ws.row_dimensions.get(row) if template_ws is not None else None
+            if old_dim is None or old_dim.height != dim.height:
+                heights[row] = dim.height
+        if heights:
+            plan.row_heights[ws.title] = heights
+
+    return plan
+
+
+def apply_plan(wb, plan):
+    """
+    把写入计划套用到工作簿（不保存）：新建工作表 → 拆分需要重建的合并区域 → 按 表 → 行 → 列 写入单元格和样式
+    → 重建合并区域、列宽、行高 → 删除工作表、恢复工作表顺序
+    返回写入的单元格数
+    """
+    for name in plan.new_sheets:
+        if name not in wb.sheetnames:
+            wb.create_sheet(title=name)
+
+    for name in plan.merged:
+        ws = wb[name]
+        for merged_range in list(ws.merged_cells.ranges):
+            ws.unmerge_cells(str(merged_range))
+
+    styles = plan.style_table
+    order = sorted(range(len(plan.values)), key=lambda i: (plan.sheet_ids[i], plan.rows[i], plan.cols[i]))
+    sheets = [wb[name] for name in plan.sheet_names]
+    # 复制来的常量在写入前读取，读到的是目标工作簿自己的项目数据
+    sourced = {i: sheets[plan.sheet_ids[i]].cell(row=plan.rows[i], column=col).value
+               for i, col in plan.sources.items()}
+    applied_styles = {}
+    for i in order:
+        ws = sheets[plan.sheet_ids[i]]
+        cell = ws.cell(row=plan.rows[i], column=plan.cols[i])
+        cell.value = sourced[i] if i in sourced else plan.values[i]
+        style_id = plan.styles[i]
+        style = applied_styles.get(style_id)
+        if style is None:
+            # 第一次使用某个样式时套用样式对象，之后直接复用在本工作簿中的样式下标
+            font, fill, border, number_format, protection, alignment = styles[style_id]
+            cell.font = font
+            cell.fill = fill
+            cell.border = border
+            cell.number_format = number_format
+            cell.protection = protection
+            cell.alignment = alignment
+            applied_styles[style_id] = cell._style
+        else:
+            cell._style = style.__copy__()
+
+    for name, ranges in plan.merged.items():
+        ws = wb[name]
+        for merged_range in ranges:
+            ws.merge_cells(merged_range)
+
+    for name, widths in plan.column_widths.items():
+        ws = wb[name]
+        for letter, width in widths.items():
+            ws.column_dimensions[letter].width = width
+
+    for name, heights in plan.row_heights.items():
+        ws = wb[name]
+        for row, height in heights.items():
+            ws.row_dimensions[row].height = height
+
+    for name in plan.removed_sheets:
+        if name in wb.sheetnames:
+            wb.remove(wb[name])
+    if plan.sheet_order and wb.sheetnames != plan.sheet_order:
+        wb._sheets = [wb[name] for name in plan.sheet_order if name in wb.sheetnames] + \
+                     [ws for ws in wb._sheets if ws.title not in plan.sheet_order]
+
+    return len(order)
+
+
+def diff_plans(old, new):
+    """
+    比较两个计划中的公式（如两个模板版本生成的计划）
+    返回 {"added": {...}, "removed": {...}, "changed": {(表名, 行号, 列号): (旧公式, 新公式)}}
+    """
+    old_formulas = old.formulas()
+    new_formulas = new.formulas()
+    return {
+        "added": {key: value for key, value in new_formulas.items() if key not in old_formulas},
+        "removed": {key: value for key, value in old_formulas.items() if key not in new_formulas},
+        "changed": {key: (old_formulas[key], value) for key, value in new_formulas.items()
+                    if key in old_formulas and old_formulas[key] != value},
+    }
@@ -0,0 +1,235 @@
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+from io import BytesIO
+from xml.etree import ElementTree
+
+from openpyxl.cell.cell import MergedCell
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.xml.functions import tostring
+
+"""
+
+工作表 XML 拼接保存
+openpyxl 保存 .xlsm 时会重新生成全部工作表，A财务假设 上的表单控件（<controls>、<legacyDrawing>）、
+图片等 openpyxl 不认识的内容随之丢失，原来只能再用 win32com 打开 Excel 把控件复制回去。
+这里以原文件为底稿：只有内容发生变化的工作表重新生成 <sheetData>、<mergeCells>、<cols>、<dimension>，
+拼回原来的工作表 XML（控件、批注、条件格式、页面设置等其余元素不动）；没有变化的工作表、vbaProject.bin、
+vmlDrawing、ctrlProps、sharedStrings 等部件逐字节复制。只有出现新样式时才重新写 styles.xml
+
+openpyxl 生成的单元格使用内联字符串（inlineStr），不引用 sharedStrings.xml，原来的共享字符串表不需要改动。
+工作表有新增、删除或顺序变化时拼接不适用，改为 openpyxl 整体保存
+
+openpyxl_vba 中保留宏的保存都经过这里：WorkbookSession 加载时记录基线，session.save() 拼接保存；
+openpyxl_vba.load_workbook 从文件加载的工作簿同样记录基线，save_workbook 保存时拼接
+
+用法:
+    session = WorkbookSession(output_path)    # 加载时记录各表的指纹（session.baseline）
+    ...
+    session.save()                            # 即 save_spliced(session, session.baseline)
+
+"""
+
+# 工作表 XML 中各元素的先后顺序（只列出定位需要的部分）
+_BEFORE_DIMENSION = ["sheetPr"]
+_BEFORE_COLS = ["sheetPr", "dimension", "sheetViews", "sheetFormatPr"]
+_BEFORE_MERGE_CELLS = ["sheetData", "sheetCalcPr", "sheetProtection", "protectedRanges", "scenarios",
+                       "autoFilter", "sortState", "dataConsolidate", "customSheetViews"]
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_CALC_PR = re.compile(r"<calcPr\b[^>]*?/?>")
+_FULL_CALC = re.compile(r'\s+fullCalcOnLoad="[^"]*"')
+
+
+def _element_pattern(tag):
+    return re.compile(rf"<{tag}\b[^>]*?/>|<{tag}\b[^>]*>.*?</{tag}>", re.DOTALL)
+
+
+def sheet_parts(archive):
+    """{工作表名: 压缩包内的工作表 XML 路径}"""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {}
+    for rel in rels.iter(f"{{{_PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        targets[rel.get("Id")] = target
+    parts = {}
+    for sheet in workbook.iter(f"{{{_MAIN_NS}}}sheet"):
+        rel_id = sheet.get(f"{{{_REL_NS}}}id")
+        if rel_id in targets:
+            parts[sheet.get("name")] = targets[rel_id]
+    return parts
+
+
+def sheet_fingerprint(ws):
+    """工作表内容的指纹：单元格的值和样式、合并区域、列宽、行高"""
+    cells = tuple((key, None if isinstance(cell, MergedCell) else cell._value, cell.data_type,
+                   tuple(cell._style) if cell._style else None)
+                  for key, cell in ws._cells.items())
+    merged = tuple(str(r) for r in ws.merged_cells.ranges)
+    columns = tuple((key, dim.width, dim.hidden, dim.min, dim.max) for key, dim in ws.column_dimensions.items())
+    rows = tuple((key, dim.height, dim.hidden) for key, dim in ws.row_dimensions.items())
+    return hash((cells, merged, columns, rows))
+
+
+def _style_counts(wb):
+    """各样式表的长度，有新样式时其中至少一项会增加"""
+    return (len(wb._cell_styles), len(wb._fonts), len(wb._fills), len(wb._borders), len(wb._number_formats),
+            len(wb._alignments), len(wb._protections), len(wb._differential_styles.styles), len(wb._named_styles))
+
+
+def capture_baseline(wb):
+    """
+    记录工作簿当前（与磁盘上的文件一致）的状态，保存时据此判断哪些工作表需要重新生成
+    返回 {"sheets": [(表名, 指纹), ...], "styles": 样式表长度}
+    """
+    return {"sheets": [(ws.title, sheet_fingerprint(ws)) for ws in wb.worksheets], "styles": _style_counts(wb)}
+
+
+def _replace_element(xml, tag, new, preceding):
+    """
+    用 new 替换 xml 中的 <tag> 元素；原来没有时插在 preceding 中最后一个存在的元素之后
+    new 为空时删除原有元素
+    """
+    pattern = _element_pattern(tag)
+    match = pattern.search(xml)
+    if match:
+        return xml[:match.start()] + new + xml[match.end():]
+    if not new:
+        return xml
+    position = None
+    for name in preceding:
+        found = None
+        for found in _element_pattern(name).finditer(xml):
+            pass
+        if found:
+            position = found.end()
+    if position is None:
+        # 没有任何前置元素：紧跟在 <worksheet ...> 开始标签之后
+        position = re.search(r"<worksheet\b[^>]*>", xml).end()
+    return xml[:position] + new + xml[position:]
+
+
+def _serialize_sheet(ws):
+    """用 openpyxl 生成工作表 XML"""
+    writer = WorksheetWriter(ws, out=BytesIO())
+    writer.write()
+    return writer.read().decode("utf-8")
+
+
+def _splice_sheet(original, generated):
+    """把 openpyxl 生成的单元格、合并区域、列宽、已用区域拼进原工作表 XML"""
+    def part(tag):
+        match = _element_pattern(tag).search(generated)
+        return match.group(0) if match else ""
+
+    xml = _replace_element(original, "sheetData", part("sheetData"), _BEFORE_COLS + ["cols"])
+    xml = _replace_element(xml, "dimension", part("dimension"), _BEFORE_DIMENSION)
+    xml = _replace_element(xml, "cols", part("cols"), _BEFORE_COLS)
+    xml = _replace_element(xml, "mergeCells", part("mergeCells"), _BEFORE_MERGE_CELLS)
+    return xml
+
+
+def save_spliced(session, baseline, file_path=None):
+    """
+    以会话的原文件为底稿保存工作簿，只重写内容有变化的工作表
+    参数:
+        session: WorkbookSession（磁盘上的文件与 capture_baseline 时的工作簿一致）
+        baseline: capture_baseline 的结果，保存回原文件后更新为当前状态，可以继续修改再保存
+        file_path: 保存路径，默认覆盖会话的文件
+    返回:
+        重新生成的工作表名称列表；整体保存时返回 None
+    """
+    changed = splice_workbook(session.wb, session.file_path, baseline, file_path)
+    session.dirty = False
+    return changed
+
+
+def splice_workbook(wb, source_path, baseline, file_path=None):
+    """
+    以 source_path 为底稿保存 wb（wb 由该文件加载，baseline 为加载时 capture_baseline 的结果）
+    保存到其他路径时底稿不变，baseline 不更新
+    """
+    save_path = os.fspath(file_path) if file_path else source_path
+    in_place = os.path.abspath(save_path) == os.path.abspath(source_path)
+    baseline_sheets = dict(baseline["sheets"])
+
+    if [name for name, _ in baseline["sheets"]] != wb.sheetnames:
+        print("工作表有新增、删除或顺序变化，整体保存")
+        wb.save(save_path)
+        if in_place:
+            baseline.update(capture_baseline(wb))
+        return None
+
+    fingerprints = {ws.title: sheet_fingerprint(ws) for ws in wb.worksheets}
+    changed = [name for name in wb.sheetnames if fingerprints[name] != baseline_sheets[name]]
+
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(save_path)[1],
+                                     dir=os.path.dirname(os.path.abspath(save_path)))
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(source_path) as source, zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as target:
+            parts = sheet_parts(source)
+            # 先生成工作表：单元格用到的新样式在这一步才加入样式表
+            sheets = {parts[name]: _splice_sheet(source.read(parts[name]).decode("utf-8"), _serialize_sheet(wb[name]))
+                      for name in changed}
+            styles = None
+            if _style_counts(wb) != baseline["styles"]:
+                styles = tostring(write_stylesheet(wb))
+
+            for item in source.infolist():
+                if item.filename == "xl/calcChain.xml" and changed:
+                    continue  # 计算链引用的单元格可能已变化，由 Excel 重建
+                data = source.read(item.filename)
+                if item.filename in sheets:
+                    data = sheets[item.filename].encode("utf-8")
+                elif item.filename == "xl/styles.xml" and styles is not None:
+                    data = styles
+                elif item.filename == "xl/workbook.xml" and changed:
+                    data = _set_full_calc(data.decode("utf-8")).encode("utf-8")
+                elif item.filename == "[Content_Types].xml" and changed:
+                    data = re.sub(r'<Override[^>]*PartName="/xl/calcChain.xml"[^>]*/>', "",
+                                  data.decode("utf-8")).encode("utf-8")
+                elif item.filename == "xl/_rels/workbook.xml.rels" and changed:
+                    data = re.sub(r'<Relationship[^>]*Target="[^"]*calcChain.xml"[^>]*/>', "",
+                                  data.decode("utf-8")).encode("utf-8")
+                target.writestr(item, data)
+        os.replace(temp_path, save_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if in_place:
+        baseline["sheets"] = [(name, fingerprints[name]) for name in wb.sheetnames]
+        baseline["styles"] = _style_counts(wb)
+    print(f"工作簿已保存: {save_path}（重新生成 {len(changed)}/{len(wb.sheetnames)} 个工作表）")
+    return changed
+
+
+def package_parts(file_path):
+    """
+    文件中的部件名称集合，用于确认保存后控件、绘图、宏等部件都还在
+    calcChain.xml 在单元格变化后有意删除，不计在内
+    """
+    with zipfile.ZipFile(os.fspath(file_path)) as archive:
+        return {name for name in archive.namelist() if name != "xl/calcChain.xml"}
+
+
+def _set_full_calc(xml):
+    """打开文件时让 Excel 重新计算全部公式（与 openpyxl 保存的文件一致）"""
+    match = _CALC_PR.search(xml)
+    if match is None:
+        return xml
+    element = _FULL_CALC.sub("", match.group(0))
+    element = element[:-2] + ' fullCalcOnLoad="1"/>' if element.endswith("/>") else element[:-1] + ' fullCalcOnLoad="1">'
+    return xml[:match.start()] + element + xml[match.end():]